@@ -0,0 +1,96 @@
+"""
+DAO round trips and wall time needed to renew many SymbolGetterPackageDao instances, one by one versus in one
+RenewalManager tick; the in-memory DAO sleeps for a fixed latency on every round trip
+
+Usage:
+    PYTHONPATH=src python benchmarks/bench_packageDao.py [num_base_names] [getters_per_base_name] [latency_ms]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import hotswapping
+
+
+class InMemoryDao(hotswapping.DaoI):
+
+    def __init__(self, root, latency):
+        self.root = root
+        self.latency = latency
+        self.versions = dict()
+        self.round_trips = 0
+
+    def _round_trip(self):
+        self.round_trips += 1
+        time.sleep(self.latency)
+
+    def get_all(self, base_name, **kwargs):
+        self._round_trip()
+        return ['{}-{}'.format(base_name, v) for v in self.versions.get(base_name, list())]
+
+    def resolve(self, packages):
+        self._round_trip()
+        return [os.path.join(self.root, n, v, '{}.py'.format(n)) for n, v in (self.split(p) for p in packages)]
+
+    def split(self, package):
+        return tuple(package.rsplit('-', 1))
+
+    def compare_packages(self, lhs, rhs):
+        return hotswapping.NewerSemanticVersion.compare_versions(self.split(lhs)[1], self.split(rhs)[1])
+
+    def publish(self, base_name, version):
+        dir_ = os.path.join(self.root, base_name, version)
+        os.makedirs(dir_)
+        with open(os.path.join(dir_, '{}.py'.format(base_name)), 'w') as f:
+            f.write('VERSION = {!r}\n'.format(version))
+        self.versions.setdefault(base_name, list()).append(version)
+
+
+def create_getters(dao, num_base_names, getters_per_base_name, reloader=None):
+    getters = list()
+    for i in xrange(num_base_names):
+        base_name = 'hotswapping_bench_pkg{}'.format(i)
+        dao.publish(base_name, '1.0.0')
+        for _ in xrange(getters_per_base_name):
+            getter = hotswapping.SymbolGetterPackageDao('{}-1.0.0'.format(base_name), dao, max_age=-1,
+                                                        reloader=reloader)
+            getters.append(getter)
+        dao.publish(base_name, '1.1.0')
+    return getters
+
+
+def run(num_base_names, getters_per_base_name, latency, batched):
+    root = tempfile.mkdtemp()
+    try:
+        dao = InMemoryDao(root, latency)
+        manager = hotswapping.RenewalManager() if batched else None
+        getters = create_getters(dao, num_base_names, getters_per_base_name, reloader=manager)
+        dao.round_trips = 0
+        start = time.time()
+        if batched:
+            num_swapped = manager.tick()
+        else:
+            num_swapped = sum(1 for getter in getters if getter.refresh())
+        elapsed = time.time() - start
+        assert num_swapped == len(getters), num_swapped
+        return dao.round_trips, elapsed
+    finally:
+        shutil.rmtree(root)
+
+
+def main():
+    num_base_names = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    getters_per_base_name = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    latency = (float(sys.argv[3]) if len(sys.argv) > 3 else 2.0) / 1000.0
+    print('{} getters over {} base names, {:.1f} ms per round trip'.format(
+        num_base_names * getters_per_base_name, num_base_names, latency * 1000))
+    for label, batched in (('one by one', False), ('batched', True)):
+        round_trips, elapsed = run(num_base_names, getters_per_base_name, latency, batched)
+        print('{:<12} {:>6d} round trips {:>10.1f} ms'.format(label, round_trips, elapsed * 1000))
+
+
+if __name__ == '__main__':
+    main()
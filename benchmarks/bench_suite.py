@@ -0,0 +1,222 @@
+"""
+Benchmarks of the swap lifecycle on synthetic versioned trees, written as JSON so that the results of two runs can
+be compared:
+
+- lookup: a steady-state SymbolGetter call
+- renew_up_to_date / renew_new_version: renew() when the module is the newest version, and when it is not
+- load / unload: importing and dropping a module with its submodules, with a large sys.modules
+- search_cold / search_warm: NewerSemanticVersion.search() against the number of version directories, without and
+  with the directory index
+- package_search / package_search_cached: NewerPackageVersion.search() through a DAO with a round-trip latency,
+  directly and through CachingDao
+
+Usage:
+    PYTHONPATH=src python benchmarks/bench_suite.py [--quick] [--output results.json]
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import timeit
+import types
+
+import hotswapping
+
+
+def version_names(num_versions):
+    return ['1.{}.{}'.format(i // 100, i % 100) for i in xrange(num_versions)]
+
+
+def create_tree(root, name, num_versions, num_submodules):
+    """
+    root/<name>/<version>/<name>.py importing <name>_sub<i>.py from the same directory
+
+    Returns:
+        list: paths of the top-level module, oldest version first
+    """
+    paths = list()
+    for version in version_names(num_versions):
+        dir_ = os.path.join(root, name, version)
+        os.makedirs(dir_)
+        lines = ['import {}_sub{}'.format(name, i) for i in xrange(num_submodules)]
+        lines.append('VERSION = {!r}'.format(version))
+        lines.append('def symbol():\n    return VERSION')
+        with open(os.path.join(dir_, '{}.py'.format(name)), 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        for i in xrange(num_submodules):
+            with open(os.path.join(dir_, '{}_sub{}.py'.format(name, i)), 'w') as f:
+                f.write('VALUE = {}\n'.format(i))
+        paths.append(os.path.join(dir_, '{}.py'.format(name)))
+    return paths
+
+
+def populate_sys_modules(num_modules):
+    names = list()
+    for i in xrange(num_modules):
+        name = 'hotswapping_bench_suite_synthetic_{}'.format(i)
+        mod_ = types.ModuleType(name)
+        mod_.__file__ = '/synthetic/pkg_{}/{}.py'.format(i, name)
+        sys.modules[name] = mod_
+        names.append(name)
+    return names
+
+
+def measure(func, iterations, setup=None, inner=1):
+    """
+
+    Args:
+        func (function): receives what setup returns
+        iterations (int):
+        setup (function): optional, not timed
+        inner (int): calls of func per timed sample
+
+    Returns:
+        dict: seconds per call
+    """
+    samples = list()
+    for _ in xrange(iterations):
+        arg = setup() if setup is not None else None
+        start = timeit.default_timer()
+        for _ in xrange(inner):
+            func(arg)
+        samples.append((timeit.default_timer() - start) / inner)
+    samples.sort()
+    return dict(unit='s', iterations=iterations * inner, min=samples[0], median=samples[len(samples) // 2],
+                mean=sum(samples) / len(samples), max=samples[-1])
+
+
+class LatentDao(hotswapping.DaoI):
+
+    def __init__(self, root, latency):
+        self.root = root
+        self.latency = latency
+        self.versions = dict()
+
+    def get_all(self, base_name, **kwargs):
+        time.sleep(self.latency)
+        return ['{}-{}'.format(base_name, v) for v in self.versions.get(base_name, list())]
+
+    def resolve(self, packages):
+        time.sleep(self.latency)
+        return [os.path.join(self.root, n, v, '{}.py'.format(n)) for n, v in (self.split(p) for p in packages)]
+
+    def split(self, package):
+        return tuple(package.rsplit('-', 1))
+
+    def compare_packages(self, lhs, rhs):
+        return hotswapping.NewerSemanticVersion.compare_versions(self.split(lhs)[1], self.split(rhs)[1])
+
+
+def bench_lookup(paths, params):
+    getter = hotswapping.SymbolGetter(paths[-1], max_age=3600)
+    getter('symbol')
+    return measure(lambda _: getter('symbol'), params['iterations'], inner=params['inner'])
+
+
+def bench_renew(paths, params):
+    search_rule = hotswapping.NewerSemanticVersion(check_existence=True)
+    timer_rule = hotswapping.MaxAge(-1)
+    up_to_date = hotswapping.create_descriptor_from_fs(paths[-1])
+    return dict(
+        renew_up_to_date=measure(lambda _: hotswapping.renew(up_to_date, search_rule, timer_rule),
+                                 params['iterations'], inner=params['inner'] // 10),
+        renew_new_version=measure(lambda m: hotswapping.renew(m, search_rule, timer_rule), params['iterations'],
+                                  setup=lambda: hotswapping.create_descriptor_from_fs(paths[0])),
+    )
+
+
+def bench_load_unload(paths, params):
+    names = populate_sys_modules(params['sys_modules'])
+    try:
+        ms = list()
+
+        def _load(_):
+            m = hotswapping.create_descriptor_from_fs(paths[-1])
+            hotswapping.load(m)
+            ms.append(m)
+
+        load = measure(_load, params['iterations'], setup=lambda: ms and hotswapping.unload(ms.pop()))
+        unload = measure(lambda m: hotswapping.unload(m), params['iterations'], setup=lambda: (_load(None), ms.pop())[1])
+        for m in ms:
+            hotswapping.unload(m)
+        return dict(load=load, unload=unload)
+    finally:
+        for name in names:
+            del sys.modules[name]
+
+
+def bench_search(root, params):
+    results = list()
+    for num_versions in params['directory_sizes']:
+        paths = create_tree(root, 'hsbench_search_{}'.format(num_versions), num_versions, 0)
+        m = hotswapping.create_descriptor_from_fs(paths[0])
+        warm = hotswapping.NewerSemanticVersion(check_existence=True)
+        warm.search(m)
+        results.append(dict(
+            num_versions=num_versions,
+            search_cold=measure(lambda _: hotswapping.NewerSemanticVersion(check_existence=True).search(m),
+                                params['iterations']),
+            search_warm=measure(lambda _: warm.search(m), params['iterations'], inner=params['inner'] // 10),
+        ))
+    return results
+
+
+def bench_package_search(root, params):
+    dao = LatentDao(root, params['latency'])
+    dao.versions['hsbench_pkg'] = version_names(params['package_versions'])
+    m = hotswapping.ModuleDescriptor()
+    m.version_meta = dict(base_name='hsbench_pkg', version='1.0.0', package='hsbench_pkg-1.0.0')
+    direct = hotswapping.NewerPackageVersion(dao)
+    cached = hotswapping.NewerPackageVersion(hotswapping.CachingDao(dao))
+    cached.search(m)
+    return dict(
+        package_search=measure(lambda _: direct.search(m), params['iterations']),
+        package_search_cached=measure(lambda _: cached.search(m), params['iterations'], inner=params['inner'] // 10),
+    )
+
+
+def run(params):
+    root = tempfile.mkdtemp()
+    try:
+        paths = create_tree(root, 'hsbench_module', params['num_versions'], params['num_submodules'])
+        results = dict(lookup=bench_lookup(paths, params))
+        results.update(bench_renew(paths, params))
+        results.update(bench_load_unload(paths, params))
+        results['search'] = bench_search(root, params)
+        results.update(bench_package_search(root, params))
+        return results
+    finally:
+        shutil.rmtree(root)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--quick', action='store_true', help='fewer iterations and smaller trees')
+    parser.add_argument('--output', help='write the JSON results to this file instead of stdout')
+    args = parser.parse_args()
+    params = dict(iterations=200, inner=1000, num_versions=20, num_submodules=20, sys_modules=20000,
+                  directory_sizes=[10, 100, 1000], latency=0.002, package_versions=50)
+    if args.quick:
+        params.update(iterations=20, inner=100, sys_modules=2000, directory_sizes=[10, 100], latency=0.0005)
+    report = dict(
+        timestamp=time.time(),
+        python=platform.python_version(),
+        platform=platform.platform(),
+        params=params,
+        results=run(params),
+    )
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
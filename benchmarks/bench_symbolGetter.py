@@ -0,0 +1,58 @@
+"""
+Calls per second of a symbol lookup through SymbolGetter, compared to resolving the symbol with load() on every call
+(which is what get_all used to do)
+
+Usage:
+    PYTHONPATH=src python benchmarks/bench_symbolGetter.py [num_calls]
+"""
+
+import os
+import sys
+import time
+
+import hotswapping
+
+
+MODULE_PATH = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), '..', 'tests', 'testdata', '2.1.0', 'foobar.py')
+)
+
+
+def calls_per_second(func, num_calls):
+    start = time.time()
+    for _ in xrange(num_calls):
+        func()
+    return num_calls / (time.time() - start)
+
+
+def bench_load_every_call(num_calls):
+    m = hotswapping.create_descriptor_from_fs(MODULE_PATH)
+    search_rule = hotswapping.NewerSemanticVersion(check_existence=True)
+    timer_rule = hotswapping.MaxAge(3600)
+
+    def _():
+        hotswapping.renew(m, search_rule, timer_rule)
+        return getattr(hotswapping.load(m), 'Doer', None)
+
+    try:
+        return calls_per_second(_, num_calls)
+    finally:
+        hotswapping.unload(m)
+
+
+def bench_symbol_getter(num_calls):
+    getter = hotswapping.SymbolGetter(MODULE_PATH, max_age=3600)
+    return calls_per_second(lambda: getter('Doer'), num_calls)
+
+
+def main():
+    num_calls = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    before = bench_load_every_call(num_calls)
+    after = bench_symbol_getter(num_calls)
+    print('load() every call:    {:>12.0f} calls/s'.format(before))
+    print('SymbolGetter cached:  {:>12.0f} calls/s'.format(after))
+    print('speedup:              {:>12.1f}x'.format(after / before))
+
+
+if __name__ == '__main__':
+    main()
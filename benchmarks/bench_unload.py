@@ -0,0 +1,63 @@
+"""
+Latency of unload() with a large sys.modules, comparing the modules recorded by load() against the full scan
+
+Usage:
+    PYTHONPATH=src python benchmarks/bench_unload.py [num_synthetic_modules] [num_rounds]
+"""
+
+import os
+import sys
+import time
+import types
+
+import hotswapping
+
+
+MODULE_PATH = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), '..', 'tests', 'testdata', '2.1.0', 'foobar.py')
+)
+
+
+def populate(num_modules):
+    names = list()
+    for i in xrange(num_modules):
+        name = 'hotswapping_bench_synthetic_{}'.format(i)
+        mod_ = types.ModuleType(name)
+        mod_.__file__ = '/synthetic/pkg_{}/{}.py'.format(i, name)
+        sys.modules[name] = mod_
+        names.append(name)
+    return names
+
+
+def time_unload(num_rounds, indexed):
+    elapsed = 0.0
+    for _ in xrange(num_rounds):
+        m = hotswapping.create_descriptor_from_fs(MODULE_PATH)
+        hotswapping.load(m)
+        if not indexed:
+            m.loaded_modules = None
+        start = time.time()
+        num_removed = hotswapping.unload(m)
+        elapsed += time.time() - start
+        assert num_removed == 4, num_removed
+    return elapsed / num_rounds
+
+
+def main():
+    num_modules = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    num_rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    names = populate(num_modules)
+    try:
+        scan = time_unload(num_rounds, indexed=False)
+        indexed = time_unload(num_rounds, indexed=True)
+    finally:
+        for name in names:
+            del sys.modules[name]
+    print('sys.modules size:  {:>10d}'.format(len(sys.modules) + num_modules))
+    print('unload, scan:      {:>10.3f} ms'.format(scan * 1000))
+    print('unload, indexed:   {:>10.3f} ms'.format(indexed * 1000))
+    print('speedup:           {:>10.1f}x'.format(scan / indexed))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,33 @@
 
+import __builtin__
+import bisect
+import collections
+import copy
+import ctypes
+import ctypes.util
+import fcntl
+import functools
+import hashlib
+import imp
 import importlib
+import itertools
+import json
+import marshal
+import mmap
 import os
+import random
 import re
+import select
 import stat
+import struct
 import sys
+import threading
 import time
 import types
+import weakref
+import zlib
+
+from hotswapping import inotify
 
 
 class ModuleDescriptor(object):
@@ -20,6 +42,19 @@ class ModuleDescriptor(object):
         # it is also update to them to decide whether a module descriptor holds enough metadata for searching
         self.version_meta = None
 
+        # populated by load(): the sys.modules keys its import introduced; None means unknown, in which case unload()
+        # falls back to scanning the whole sys.modules
+        self.loaded_modules = None
+
+        # populated by load(m, isolated=True): the name of the synthetic package the module is imported into
+        self.namespace = None
+
+        # populated by load() along with loaded_modules, keyed by module name (relative to the namespace, if any):
+        # (path relative to the module directory, sha1 digest, size, mtime, file) of each module's source, and the
+        # names of the loaded modules each module imports; see stage(incremental=True)
+        self.sources = None
+        self.dependencies = None
+
 
 def create_descriptor_from_fs(path):
     """
@@ -51,16 +86,40 @@ def create_descriptor_from_package_dao(package, dao, fs_creator=None, **kwargs):
         ModuleDescriptor: guaranteed to carry version_meta
     """
 
+    return create_descriptors_from_package_dao([package], dao, fs_creator=fs_creator, **kwargs)[0]
+
+
+def create_descriptors_from_package_dao(packages, dao, fs_creator=None, **kwargs):
+    """
+    Resolve all the packages in one DaoI.resolve() call; if the dao does not resolve them all, they are resolved one
+    by one so that a package the dao can not resolve does not fail the others
+
+    Args:
+        packages (list): full names of packages, including the versions
+        dao (DaoI): a data accessor to retrieve package information
+        fs_creator (function): default to create_descriptor_from_fs
+    Returns:
+        list: a ModuleDescriptor (guaranteed to carry version_meta) or None, for each package
+    """
+
     if fs_creator is None:
         fs_creator = create_descriptor_from_fs
-    paths = dao.resolve([package])
-    if len(paths) != 1:
-        return None
-    m = fs_creator(paths[0])
-    if m:
-        result = dao.split(package)
-        m.version_meta = dict(base_name=result[0], version=result[1], package=package)
-    return m
+    if not packages:
+        return list()
+    paths = dao.resolve(list(packages))
+    if len(paths) != len(packages):
+        if len(packages) == 1:
+            return [None]
+        return [create_descriptors_from_package_dao([package], dao, fs_creator=fs_creator, **kwargs)[0]
+                for package in packages]
+    ret = list()
+    for package, path in zip(packages, paths):
+        m = fs_creator(path)
+        if m:
+            result = dao.split(package)
+            m.version_meta = dict(base_name=result[0], version=result[1], package=package)
+        ret.append(m)
+    return ret
 
 
 class DaoI(object):
@@ -123,6 +182,170 @@ class DaoI(object):
         raise NotImplementedError()
 
 
+class LruCache(object):
+    """
+    A bounded mapping that evicts the least recently used entry; entries optionally expire <ttl> seconds after being
+    stored. Not thread safe
+    """
+
+    def __init__(self, max_size=1024, ttl=None):
+        """
+
+        Args:
+            max_size (int):
+            ttl (float): seconds; None means entries never expire
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """
+
+        Args:
+            key (hashable):
+
+        Returns:
+            tuple: whether the key was found (and not expired), and the value
+        """
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False, None
+        value, expires_at = entry
+        if expires_at is not None and time.time() >= expires_at:
+            return False, None
+        self._entries[key] = entry
+        return True, value
+
+    def put(self, key, value):
+        self._entries.pop(key, None)
+        self._entries[key] = (value, None if self.ttl is None else time.time() + self.ttl)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+
+class CachingDao(DaoI):
+    """
+    Memoizes another DaoI: every method has its own TTL and bounded LRU cache, and concurrent identical lookups that
+    miss the cache share a single call to the wrapped dao
+
+    resolve() caches per package and fetches all the missing packages in one call. Hits and misses are counted per
+    method name in self.hits and self.misses; a lookup served by another thread's in-flight call counts as a hit
+    """
+
+    class _Flight(object):
+
+        def __init__(self):
+            self.done = threading.Event()
+            self.value = None
+            self.error = None
+
+    def __init__(self, dao, get_all_ttl=60.0, resolve_ttl=600.0, split_ttl=None, compare_ttl=None, max_size=1024):
+        """
+
+        Args:
+            dao (DaoI): the wrapped data accessor
+            get_all_ttl (float): seconds
+            resolve_ttl (float): seconds
+            split_ttl (float): seconds; None means never expire
+            compare_ttl (float): seconds; None means never expire
+            max_size (int): maximum number of entries per method
+        """
+        self.dao = dao
+        self.caches = dict(
+            get_all=LruCache(max_size, get_all_ttl),
+            resolve=LruCache(max_size, resolve_ttl),
+            split=LruCache(max_size, split_ttl),
+            compare_packages=LruCache(max_size, compare_ttl),
+        )
+        self.hits = collections.Counter()
+        self.misses = collections.Counter()
+        self._flights = dict()
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        with self._lock:
+            for cache in self.caches.values():
+                cache.clear()
+
+    def after_fork(self):
+        """
+        To be called in the child process: the lock and the calls in flight belong to threads of the parent
+        """
+        self._lock = threading.Lock()
+        self._flights = dict()
+
+    def _fetch(self, name, key, fetch, cache=None):
+        with self._lock:
+            if cache is not None:
+                hit, value = cache.get(key)
+                if hit:
+                    self.hits[name] += 1
+                    return value
+            flight = self._flights.get((name, key))
+            leader = flight is None
+            if leader:
+                flight = self._flights[(name, key)] = self._Flight()
+                self.misses[name] += 1
+            else:
+                self.hits[name] += 1
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+        try:
+            flight.value = fetch()
+            return flight.value
+        except Exception, e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                if flight.error is None and cache is not None:
+                    cache.put(key, flight.value)
+                del self._flights[(name, key)]
+            flight.done.set()
+
+    def get_all(self, base_name, **kwargs):
+        key = base_name, tuple(sorted(kwargs.items()))
+        return list(self._fetch('get_all', key, lambda: self.dao.get_all(base_name, **kwargs),
+                                self.caches['get_all']))
+
+    def resolve(self, packages):
+        cache = self.caches['resolve']
+        found = dict()
+        with self._lock:
+            for package in packages:
+                hit, path = cache.get(package)
+                if hit:
+                    found[package] = path
+                    self.hits['resolve'] += 1
+        missing = tuple(sorted(set(package for package in packages if package not in found)))
+        if missing:
+            paths = self._fetch('resolve', missing, lambda: self.dao.resolve(list(missing)))
+            if len(paths) != len(missing):
+                return list()
+            with self._lock:
+                for package, path in zip(missing, paths):
+                    cache.put(package, path)
+            found.update(zip(missing, paths))
+        return [found[package] for package in packages]
+
+    def split(self, package):
+        return self._fetch('split', package, lambda: self.dao.split(package), self.caches['split'])
+
+    def compare_packages(self, lhs, rhs):
+        return self._fetch('compare_packages', (lhs, rhs), lambda: self.dao.compare_packages(lhs, rhs),
+                           self.caches['compare_packages'])
+
+
 class SearchRuleI(object):
 
     def search(self, m):
@@ -136,6 +359,43 @@ class SearchRuleI(object):
         """
         raise NotImplementedError()
 
+    def group_key(self, m):
+        """
+        Descriptors with the same (non-None) group key can be searched together by search_many(), with the same
+        result as searching them one by one
+
+        Args:
+            m (ModuleDescriptor):
+
+        Returns:
+            hashable: None if the descriptor must be searched on its own
+        """
+        return None
+
+    def search_many(self, ms):
+        """
+
+        Args:
+            ms (list): list of ModuleDescriptor
+
+        Returns:
+            list: what search() returns, for each descriptor
+        """
+        return [self.search(m) for m in ms]
+
+    def newer(self, m, found):
+        """
+        Whether what search() returned for another descriptor (e.g. in another process) is worth moving m to
+
+        Args:
+            m (ModuleDescriptor):
+            found (str): what search() returns
+
+        Returns:
+            bool:
+        """
+        return True
+
 
 class TimerRuleI(object):
 
@@ -150,261 +410,3493 @@ class TimerRuleI(object):
         """
         raise NotImplementedError()
 
+    def due(self, m):
+        """
+        Side-effect free hint telling whether retire() may return True; it lets callers skip taking the renewal lock
+        in the steady state. The default is conservative
+
+        Args:
+            m (ModuleDescriptor):
+
+        Returns:
+            bool:
+        """
+        return True
+
 
 class NewerPackageVersion(SearchRuleI):
+    """
+    Without a scheme, the last package DaoI.get_all() returns is taken as the newest, and DaoI.compare_packages() tells
+    whether it is newer; with a scheme, the newest package is selected by the sort keys of the versions DaoI.split()
+    gives
+    """
 
-    def __init__(self, dao, **kwargs):
+    def __init__(self, dao, scheme=None, **kwargs):
         """
 
         Args:
             dao (DaoI):
+            scheme (VersionScheme): optional
             check_existence (bool):
         """
         self.dao = dao
+        self.scheme = scheme
         self.kwargs = kwargs
 
-    def search(self, m):
-        old_package = m.version_meta.get('package', '')
-        base_name = m.version_meta.get('base_name', '')
+    def group_key(self, m):
+        base_name = (m.version_meta or dict()).get('base_name', '')
         if not base_name:
             return None
-        packages = self.dao.get_all(base_name, **self.kwargs)
-        if not len(packages):
-            return None
-        new_package = packages[-1]
-        if self.dao.compare_packages(new_package, old_package) < 1:
+        kwargs = tuple(sorted(self.kwargs.items()))
+        try:
+            hash(kwargs)
+        except TypeError:
             return None
-        return new_package
 
+        # the base name is left out so that a whole group is resolved in one DaoI.resolve() call
+        return type(self), self.dao, self.scheme, kwargs
 
-class NewerSemanticVersion(SearchRuleI):
-
-    def __init__(self, check_existence=False):
-        self.check_existence = check_existence
-
-    @staticmethod
-    def iter_dir(dir_path):
-        for fn in os.listdir(dir_path):
-            yield fn, os.path.abspath(os.path.join(dir_path, fn))
+    def newest(self, packages):
+        """
 
-    @staticmethod
-    def exists(p):
-        return os.path.exists(p)
+        Args:
+            packages (list): as returned by DaoI.get_all()
 
-    @staticmethod
-    def compare_versions(lhs, rhs):
-        regex = '^(\d+)\.(\d+)\.(\d+)$'
-        _ = re.match(regex, lhs)
-        l = [int(n) for n in _.groups()] if _ is not None else [0, 0, 0]
-        _ = re.match(regex, rhs)
-        r = [int(n) for n in _.groups()] if _ is not None else [0, 0, 0]
-        if l > r:
-            return 1
-        if l < r:
-            return -1
-        return 0
+        Returns:
+            tuple: (package, version key) of the newest package; the key is None without a scheme
+        """
+        if self.scheme is None:
+            return packages[-1], None
+        ret, ret_key = None, None
+        for package in packages:
+            k = self.scheme.key(self.dao.split(package)[1])
+            if k is not None and (ret_key is None or k > ret_key):
+                ret, ret_key = package, k
+        return ret, ret_key
 
     def search(self, m):
-        regex = '^(.+)/(\d+\.\d+\.\d+)/(.*)$'
-        r = re.match(regex, m.fs_path)
-        if r is None:
-            return ''
-        dir_, ver_, rel_path = r.groups()
-        max_ver = ver_
-        p_max_ver = ''
-        for fn, p in self.iter_dir(dir_):
-            if self.compare_versions(fn, max_ver) == 1:
-                max_ver = fn
-                p_max_ver = p
-        if max_ver == ver_:
-            return ''
-        ret = os.path.abspath(os.path.join(p_max_ver, rel_path))
-        if self.check_existence and self.exists(ret) is False:
-            return ''
-        return ret
+        return self.search_many([m])[0]
 
+    def search_many(self, ms):
+        """
+        Calls DaoI.get_all() once per base name
+        """
+        packages_by_base_name = dict()
+        ret = list()
+        for m in ms:
+            old_package = m.version_meta.get('package', '')
+            base_name = m.version_meta.get('base_name', '')
+            if not base_name:
+                ret.append(None)
+                continue
+            if base_name not in packages_by_base_name:
+                packages = self.dao.get_all(base_name, **self.kwargs)
+                packages_by_base_name[base_name] = self.newest(packages) if len(packages) else (None, None)
+            new_package, new_key = packages_by_base_name[base_name]
+            if new_package is None:
+                ret.append(None)
+                continue
+            if self.scheme is None:
+                if self.dao.compare_packages(new_package, old_package) < 1:
+                    ret.append(None)
+                    continue
+            elif new_key <= (self.scheme.key(m.version_meta.get('version', '')) or ()):
+                ret.append(None)
+                continue
+            ret.append(new_package)
+        return ret
 
-NEW_VERSION = NewerSemanticVersion(check_existence=True)
-
+    def newer(self, m, found):
+        if self.scheme is None:
+            return self.dao.compare_packages(found, (m.version_meta or dict()).get('package', '')) >= 1
+        k = self.scheme.key(self.dao.split(found)[1])
+        return k is not None and k > (self.scheme.key((m.version_meta or dict()).get('version', '')) or ())
 
-class MaxAge(TimerRuleI):
 
-    def __init__(self, max_age):
-        self.max_age = max_age
+_VERSION_RE = re.compile('^(\d+)\.(\d+)\.(\d+)$')
+_VERSIONED_PATH_RE = re.compile('^(.+)/(\d+\.\d+\.\d+)/(.*)$')
 
-    @staticmethod
-    def age(m):
-        return time.time() - m.birth_time
 
-    def retire(self, m):
-        if self.age(m) >= self.max_age:
-            m.deprecated = True
-            return True
-        return False
+def parse_version(s):
+    """
 
+    Args:
+        s (str): X.Y.Z
 
-LIVE_FOR_TWO_HOUR = MaxAge(3600 * 2)
+    Returns:
+        tuple: (X, Y, Z) as integers; None if s is not a version string
+    """
+    r = _VERSION_RE.match(s)
+    if r is None:
+        return None
+    return tuple(int(n) for n in r.groups())
 
 
-class RenewInterface(object):
+class VersionScheme(object):
     """
-    To figure out how to create a new module descriptor that wraps a newer version of the module;
-
-    Can modify the incoming module descriptor;
+    Parses version strings into sortable key tuples (the newer, the greater), once per string: the keys are cached,
+    so that picking the newest of n versions is n cached lookups and n tuple compares
     """
 
-    def renew(self, m):
+    max_cached = 65536
+
+    def __init__(self):
+        self._keys = dict()
+
+    def parse(self, s):
         """
 
         Args:
-            m (ModuleDescriptor):
+            s (str):
 
         Returns:
-            ModuleDescriptor: a renewed ModuleDescriptor or None; in the first case the given ModuleDescriptor is marked
-            deprecated
+            tuple: the sort key; None if s is not a version in this scheme
         """
         raise NotImplementedError()
 
+    def key(self, s):
+        try:
+            return self._keys[s]
+        except KeyError:
+            pass
+        if len(self._keys) >= self.max_cached:
+            self._keys.clear()
+        k = self._keys[s] = self.parse(s)
+        return k
 
-class RenewFSModule(RenewInterface):
-
-    def __init__(self, search_rule, timer_rule):
+    def floor(self, s):
         """
 
         Args:
-            search_rule (NewerSemanticVersion):
-            timer_rule (TimerRuleI):
+            s (str): a version, possibly partial (e.g. 2 for 2.0.0)
+
+        Returns:
+            tuple: a key no greater than the key of any version of the release s; None if s can not be parsed
         """
-        self.search_rule = search_rule
-        self.timer_rule = timer_rule
+        return self.key(s)
 
-    def renew(self, m):
-        if not self.timer_rule.retire(m):
-            return None
+    def is_prerelease(self, k):
+        return False
 
-        path = self.search_rule.search(m)
-        if not path:
-            m.deprecated = False
-            return None
+    def compare(self, lhs, rhs):
+        """
 
-        ret = create_descriptor_from_fs(path)
-        if not ret:
-            m.deprecated = False
-            return None
+        Returns:
+            int: 1, 0 or -1 like cmp(); a string that is not a version is older than any version
+        """
+        return cmp(self.key(lhs) or (), self.key(rhs) or ())
 
-        m.deprecated = True
-        return ret
+    def newest(self, versions):
+        """
 
+        Args:
+            versions (iterable): version strings
 
-class RenewPackageModule(RenewInterface):
+        Returns:
+            str: the newest version; None if there is no valid version
+        """
+        ret = None
+        ret_key = None
+        for v in versions:
+            k = self.key(v)
+            if k is not None and (ret_key is None or k > ret_key):
+                ret, ret_key = v, k
+        return ret
 
-    def __init__(self, search_rule, timer_rule):
+    def split_path(self, path):
         """
 
         Args:
-            dao (DaoI):
-            search_rule (NewerPackageVersion):
-            timer_rule (TimerRuleI):
-        """
-        self.search_rule = search_rule
-        self.timer_rule = timer_rule
+            path (str): a module path such as /vol/doom/1.0.0/main.py
 
-    def renew(self, m):
-        if not self.timer_rule.retire(m):
-            return None
+        Returns:
+            tuple: (directory holding the versions, version, path relative to the version directory), picking the
+                last path component that is a version; None if there is no such component
+        """
+        parts = path.split('/')
+        for i in xrange(len(parts) - 2, 0, -1):
+            if parts[i] and self.key(parts[i]) is not None:
+                return '/'.join(parts[:i]), parts[i], '/'.join(parts[i + 1:])
+        return None
 
-        package = self.search_rule.search(m)
-        if not package:
-            m.deprecated = False
-            return None
 
-        ret = create_descriptor_from_package_dao(package, self.search_rule.dao, **self.search_rule.kwargs)
-        if not ret:
-            m.deprecated = False
-            return None
+class StrictVersion(VersionScheme):
+    """
+    X.Y.Z, integers only
+    """
 
-        m.deprecated = True
-        return ret
+    def parse(self, s):
+        return parse_version(s)
 
+    def floor(self, s):
+        try:
+            return tuple(int(_) for _ in s.split('.'))
+        except ValueError:
+            return None
 
-def renew(m, search_rule, timer_rule):
-    return RenewFSModule(search_rule, timer_rule).renew(m)
+    def split_path(self, path):
+        r = _VERSIONED_PATH_RE.match(path)
+        return None if r is None else r.groups()
 
 
-def load(m):
+class SemVer(VersionScheme):
     """
-    Can modify the incoming module descriptor
-
-    Args:
-        m (ModuleDescriptor):
-
-    Returns:
-        types.ModuleType:
+    Semantic Versioning 2.0.0: MAJOR.MINOR.PATCH[-PRERELEASE][+BUILD]; a prerelease is older than its release, the
+    prerelease identifiers compare numerically when numeric, numeric ones before alphanumeric ones; the build metadata
+    is ignored
     """
 
-    class SysPathManip(object):
-
-        def __init__(self, dir_path):
-            self.dir_path = dir_path
+    _RE = re.compile('^v?(0|[1-9]\d*)\.(0|[1-9]\d*)\.(0|[1-9]\d*)'
+                     '(?:-([0-9A-Za-z-]+(?:\.[0-9A-Za-z-]+)*))?(?:\+[0-9A-Za-z-]+(?:\.[0-9A-Za-z-]+)*)?$')
 
-        def __enter__(self):
-            sys.path.append(self.dir_path)
-
-        def __exit__(self, exc_type, exc_val, exc_tb):
-            sys.path = sys.path[: -1]
+    def parse(self, s):
+        r = self._RE.match(s)
+        if r is None:
+            return None
+        major, minor, patch, prerelease = r.groups()
+        if prerelease is None:
+            return int(major), int(minor), int(patch), (1, )
+        identifiers = tuple((0, int(_), '') if _.isdigit() else (1, 0, _) for _ in prerelease.split('.'))
+        return int(major), int(minor), int(patch), (0, identifiers)
 
-    path = m.fs_path
-    search_path = os.path.dirname(path)
-    dot_path = os.path.basename(path).replace('.py', '')
-    with SysPathManip(search_path):
+    def floor(self, s):
+        if '-' in s or '+' in s:
+            return self.key(s)
         try:
-            return importlib.import_module(dot_path)
-        except Exception, e:
+            parts = [int(_) for _ in s.lstrip('v').split('.')]
+        except ValueError:
+            return None
+        if len(parts) > 3:
             return None
+        parts += [0] * (3 - len(parts))
+        return tuple(parts) + ((0, ()), )
 
+    def is_prerelease(self, k):
+        return k[3][0] == 0
 
-def unload(m):
+
+class Pep440(VersionScheme):
+    """
+    PEP 440: [N!]N(.N)*[{a|b|rc}N][.postN][.devN][+LOCAL], with the normalizations of the spelling (alpha, beta, c,
+    pre, preview, rev, r, separators, implicit numbers) and the trailing zeros of the release ignored
     """
 
-    Args:
-        m (ModuleDescriptor):
+    _RE = re.compile(
+        '^v?(?:(\d+)!)?(\d+(?:\.\d+)*)'
+        '(?:[-_.]?(a|b|c|rc|alpha|beta|pre|preview)[-_.]?(\d+)?)?'
+        '(?:-(\d+)|[-_.]?(post|rev|r)[-_.]?(\d+)?)?'
+        '(?:[-_.]?(dev)[-_.]?(\d+)?)?'
+        '(?:\+([a-z0-9]+(?:[-_.][a-z0-9]+)*))?$',
+        re.IGNORECASE
+    )
+    _PRE = dict(a=0, alpha=0, b=1, beta=1, c=2, rc=2, pre=2, preview=2)
 
-    Returns:
-        int: number of module unloaded
-    """
-    num_removed = 0
-    dir_ = os.path.dirname(m.fs_path)
-    if not dir_:
-        return num_removed
-    dir_ = os.path.abspath(dir_)
-    for symbol in sys.modules.keys():
-        mod_ = sys.modules[symbol]
-        mod_fs_path = getattr(mod_, '__file__', None)
+    def parse(self, s):
+        r = self._RE.match(s.strip())
+        if r is None:
+            return None
+        epoch, release, pre_l, pre_n, post_implicit, post_l, post_n, dev_l, dev_n, local = r.groups()
+        release = [int(_) for _ in release.split('.')]
+        while len(release) > 1 and release[-1] == 0:
+            release.pop()
 
-        # caught at Wt, the value of __file__ can sometime be a function object
-        if not isinstance(mod_fs_path, basestring):
-            continue
+        # (0, ) sorts before and (2, ) after any actual value, as the missing segments do
+        if pre_l is not None:
+            pre = (1, self._PRE[pre_l.lower()], int(pre_n or 0))
+        elif post_implicit is None and post_l is None and dev_l is not None:
+            pre = (0, )
+        else:
+            pre = (2, )
+        if post_implicit is not None:
+            post = (1, int(post_implicit))
+        elif post_l is not None:
+            post = (1, int(post_n or 0))
+        else:
+            post = (0, )
+        dev = (1, int(dev_n or 0)) if dev_l is not None else (2, )
+        if local is None:
+            local_key = ()
+        else:
+            local_key = tuple((1, int(_), '') if _.isdigit() else (0, 0, _.lower())
+                              for _ in re.split('[-_.]', local))
+        return int(epoch or 0), tuple(release), pre, post, dev, local_key
 
-        mod_dir = os.path.dirname(mod_fs_path)
-        if not mod_dir:
-            continue
-        mod_dir = os.path.abspath(mod_dir)
-        if mod_dir == dir_:
-            del sys.modules[symbol]
-            num_removed += 1
-    return num_removed
+    def floor(self, s):
+        k = self.key(s)
+        if k is None or k[2:5] != ((2, ), (0, ), (2, )):
+            return k
 
+        # below the first development release of the release
+        return k[0], k[1], (0, ), (0, ), (1, -1), ()
 
-class SymbolGetter(object):
+    def is_prerelease(self, k):
+        return k[2][0] != 2 or k[4][0] == 1
 
-    def __init__(self, module_fs_path, max_age=3600):
-        self.m = create_descriptor_from_fs(module_fs_path)
-        self.search_rule = NewerSemanticVersion(check_existence=True)
-        self.timer_rule = MaxAge(max_age)
+
+class CalVer(VersionScheme):
+    """
+    Calendar versions: YYYY.MM[.DD][.MICRO] or YY.MM..., the segments separated by dots or dashes, the month possibly
+    zero padded
+    """
+
+    _RE = re.compile('^(\d{2}|\d{4})[.-](\d{1,2})((?:[.-]\d+)*)$')
+
+    def parse(self, s):
+        r = self._RE.match(s)
+        if r is None:
+            return None
+        year, month, rest = r.groups()
+        if not 1 <= int(month) <= 12:
+            return None
+        year = int(year)
+        if year < 100:
+            year += 2000
+        return (year, int(month)) + tuple(int(_) for _ in re.split('[.-]', rest) if _)
+
+    def floor(self, s):
+        k = self.key(s)
+        if k is not None:
+            return k
+        try:
+            return tuple(int(_) for _ in re.split('[.-]', s))
+        except ValueError:
+            return None
+
+
+STRICT_VERSION = StrictVersion()
+SEMVER = SemVer()
+PEP440 = Pep440()
+CALVER = CalVer()
+
+
+class VersionSpec(object):
+    """
+    A version constraint such as '>=1.0,<2' or '~=1.4', with versions to stay away from, evaluated on version keys
+    (see VersionScheme)
+
+    The clauses: >=V, >V, <V, <=V, ==V, ==V.* (V as a prefix), !=V and ~=V (compatible release: ~=1.4.5 means >=1.4.5
+    and ==1.4.*). They narrow down to one interval of keys, so that the newest allowed version of a sorted index is
+    found by bisection, then skipping the excluded versions (and the prereleases, unless allowed)
+    """
+
+    _CLAUSE_RE = re.compile('^(~=|==|!=|<=|>=|<|>)\s*(\S+)$')
+
+    def __init__(self, spec='', exclude=(), scheme=None, prereleases=False):
+        """
+
+        Args:
+            spec (str): comma separated clauses; empty for no constraint
+            exclude (iterable): versions that are never selected
+            scheme (VersionScheme): STRICT_VERSION by default
+            prereleases (bool): whether prereleases can be selected
+        """
+        self.spec = spec
+        self.scheme = scheme or STRICT_VERSION
+        self.prereleases = prereleases
+        self.lo, self.lo_inclusive = None, True
+        self.hi, self.hi_inclusive = None, True
+        self.excluded = set()
+        for v in exclude:
+            self._exclude(v)
+        for clause in (_.strip() for _ in spec.split(',')):
+            if clause:
+                self._add(clause)
+
+    def _key(self, v):
+        """
+        The key of v, a partial release (e.g. 1.0 for 1.0.0) being padded with zeros
+        """
+        k = self.scheme.key(v)
+        if k is None:
+            r = re.match('^(v?)(\\d+(?:\\.\\d+)?)($|[-+].*$)', v)
+            if r is not None:
+                prefix, release, rest = r.groups()
+                release += '.0' * (2 - release.count('.'))
+                k = self.scheme.key(prefix + release + rest)
+        return k
+
+    def _parse(self, v, floor=False):
+        k = self.scheme.floor(v) if floor else self._key(v)
+        if k is None:
+            raise ValueError('invalid version {!r} in {!r}'.format(v, self.spec))
+        return k
+
+    def _exclude(self, v):
+        k = self._key(v)
+        if k is None:
+            raise ValueError('invalid version {!r}'.format(v))
+        self.excluded.add(k)
+
+    @staticmethod
+    def _next_prefix(parts):
+        return '.'.join([str(_) for _ in parts[:-1]] + [str(parts[-1] + 1)])
+
+    @staticmethod
+    def _release(v):
+        r = re.match('^v?(\d+(?:\.\d+)*)', v)
+        if r is None:
+            return None
+        return [int(_) for _ in r.group(1).split('.')]
+
+    def _add(self, clause):
+        r = self._CLAUSE_RE.match(clause)
+        if r is None:
+            raise ValueError('invalid clause {!r} in {!r}'.format(clause, self.spec))
+        op, v = r.groups()
+        if op == '~=':
+            parts = self._release(v)
+            if parts is None or len(parts) < 2:
+                raise ValueError('~= needs at least two release segments: {!r}'.format(clause))
+            self._lower(self._parse(v, floor=True), True)
+            self._upper(self._parse(self._next_prefix(parts[:-1]), floor=True), False)
+        elif op == '==' and v.endswith('.*'):
+            parts = self._release(v[:-2])
+            if parts is None:
+                raise ValueError('invalid clause {!r} in {!r}'.format(clause, self.spec))
+            self._lower(self._parse(v[:-2], floor=True), True)
+            self._upper(self._parse(self._next_prefix(parts), floor=True), False)
+        elif op == '==':
+            k = self._parse(v)
+            self._lower(k, True)
+            self._upper(k, True)
+        elif op == '!=':
+            self.excluded.add(self._parse(v))
+        elif op == '>=':
+            self._lower(self._parse(v, floor=True), True)
+        elif op == '>':
+            self._lower(self._parse(v), False)
+        elif op == '<':
+            self._upper(self._parse(v, floor=True), False)
+        else:
+            self._upper(self._parse(v), True)
+
+    def _lower(self, k, inclusive):
+        if self.lo is None or k > self.lo or (k == self.lo and not inclusive):
+            self.lo, self.lo_inclusive = k, inclusive
+
+    def _upper(self, k, inclusive):
+        if self.hi is None or k < self.hi or (k == self.hi and not inclusive):
+            self.hi, self.hi_inclusive = k, inclusive
+
+    def allows(self, k):
+        """
+
+        Args:
+            k (tuple): a version key
+
+        Returns:
+            bool:
+        """
+        if k is None or k in self.excluded:
+            return False
+        if not self.prereleases and self.scheme.is_prerelease(k):
+            return False
+        if self.lo is not None and (k < self.lo or (k == self.lo and not self.lo_inclusive)):
+            return False
+        if self.hi is not None and (k > self.hi or (k == self.hi and not self.hi_inclusive)):
+            return False
+        return True
+
+    def select(self, keys):
+        """
+
+        Args:
+            keys (list): sorted version keys
+
+        Returns:
+            int: the position of the newest allowed key; None if no key is allowed
+        """
+        if self.hi is None:
+            i = len(keys)
+        elif self.hi_inclusive:
+            i = bisect.bisect_right(keys, self.hi)
+        else:
+            i = bisect.bisect_left(keys, self.hi)
+        while i > 0:
+            i -= 1
+            k = keys[i]
+            if self.lo is not None and (k < self.lo or (k == self.lo and not self.lo_inclusive)):
+                return None
+            if k in self.excluded or (not self.prereleases and self.scheme.is_prerelease(k)):
+                continue
+            return i
+        return None
+
+
+class VersionIndex(object):
+    """
+    The version entries of a directory, parsed once into sort keys (integer tuples by default); the newest entry is kept
+    aside so that asking for it costs nothing, and a sorted view is built on demand
+    """
+
+    def __init__(self, dir_path, entries, signature=None, scheme=None):
+        """
+
+        Args:
+            dir_path (str):
+            entries (iterable): (file name, path) pairs, as yielded by NewerSemanticVersion.iter_dir()
+            signature (tuple): the directory's stat signature at listing time; None if it could not be stat'ed
+            scheme (VersionScheme): STRICT_VERSION by default
+        """
+        scheme = scheme or STRICT_VERSION
+        self.dir_path = dir_path
+        self.signature = signature
+        self.entries = dict()
+        self.max_key = None
+        self._sorted = None
+        self._keys = None
+        for fn, p in entries:
+            key = scheme.key(fn)
+            if key is None or key in self.entries:
+                continue
+            self.entries[key] = (fn, p)
+            if self.max_key is None or key > self.max_key:
+                self.max_key = key
+
+    def max(self):
+        """
+
+        Returns:
+            tuple: (version key, file name, path) of the newest version; None if there is no version
+        """
+        if self.max_key is None:
+            return None
+        return (self.max_key, ) + self.entries[self.max_key]
+
+    def sorted(self):
+        """
+
+        Returns:
+            list: (version key, file name, path) of every version, oldest first
+        """
+        if self._sorted is None:
+            self._sorted = [(key, ) + self.entries[key] for key in sorted(self.entries)]
+        return self._sorted
+
+    def keys(self):
+        """
+
+        Returns:
+            list: the version keys, oldest first
+        """
+        if self._keys is None:
+            self._keys = [_[0] for _ in self.sorted()]
+        return self._keys
+
+
+class NewerSemanticVersion(SearchRuleI):
+    """
+    The version directories are listed through a VersionIndex per directory, which is only rebuilt after the
+    directory's mtime (or link count) changed; a search that finds nothing new costs one stat
+
+    The version directories are named after <scheme>, X.Y.Z (STRICT_VERSION) by default
+    """
+
+    def __init__(self, check_existence=False, scheme=None):
+        self.check_existence = check_existence
+        self.scheme = scheme or STRICT_VERSION
+        self.indexes = dict()
+
+    @staticmethod
+    def iter_dir(dir_path):
+        for fn in os.listdir(dir_path):
+            yield fn, os.path.abspath(os.path.join(dir_path, fn))
+
+    @staticmethod
+    def exists(p):
+        return os.path.exists(p)
+
+    @staticmethod
+    def dir_signature(dir_path):
+        try:
+            st = os.stat(dir_path)
+        except OSError:
+            return None
+        return st.st_mtime, st.st_nlink
+
+    @staticmethod
+    def compare_versions(lhs, rhs):
+        l = parse_version(lhs) or (0, 0, 0)
+        r = parse_version(rhs) or (0, 0, 0)
+        if l > r:
+            return 1
+        if l < r:
+            return -1
+        return 0
+
+    def index(self, dir_path):
+        """
+
+        Args:
+            dir_path (str): a directory holding version directories
+
+        Returns:
+            VersionIndex: up to date with the directory; never cached if the directory can not be stat'ed
+        """
+        signature = self.dir_signature(dir_path)
+        index = self.indexes.get(dir_path)
+        if index is None or signature is None or index.signature != signature:
+            index = VersionIndex(dir_path, self.iter_dir(dir_path), signature, self.scheme)
+            if signature is not None:
+                self.indexes[dir_path] = index
+        return index
+
+    def group_key(self, m):
+        r = self.scheme.split_path(m.fs_path)
+        if r is None:
+            return None
+        return type(self), r[0], self.check_existence, self.scheme
+
+    def search(self, m):
+        return self.search_many([m])[0]
+
+    def search_many(self, ms):
+        """
+        Looks up the version index once per directory
+        """
+        indexes = dict()
+        ret = list()
+        for m in ms:
+            r = self.scheme.split_path(m.fs_path)
+            if r is None:
+                ret.append('')
+                continue
+            dir_, ver_, rel_path = r
+            if dir_ not in indexes:
+                indexes[dir_] = self.index(dir_)
+            newest = indexes[dir_].max()
+            if newest is None or newest[0] <= self.scheme.key(ver_):
+                ret.append('')
+                continue
+            p = os.path.abspath(os.path.join(newest[2], rel_path))
+            if self.check_existence and self.exists(p) is False:
+                ret.append('')
+                continue
+            ret.append(p)
+        return ret
+
+    def newer(self, m, found):
+        r, current = self.scheme.split_path(found), self.scheme.split_path(m.fs_path)
+        if r is None or current is None:
+            return False
+        k = self.scheme.key(r[1])
+        return k is not None and k > self.scheme.key(current[1])
+
+
+NEW_VERSION = NewerSemanticVersion(check_existence=True)
+
+
+class NewerVersionOrModified(NewerSemanticVersion):
+    """
+    Also returns the module's own path when the file was modified in place; meant to be paired with FsEvents, which
+    only lets a search run after something changed on disk
+    """
+
+    @staticmethod
+    def modified(m):
+        try:
+            return os.stat(m.fs_path)[stat.ST_MTIME] != m.fs_mtime
+        except OSError:
+            return False
+
+    def search_many(self, ms):
+        ret = super(NewerVersionOrModified, self).search_many(ms)
+        return [p or (m.fs_path if self.modified(m) else '') for m, p in zip(ms, ret)]
+
+
+class ConstrainedVersion(NewerSemanticVersion):
+    """
+    Finds the newest version directory allowed by a VersionSpec, looked up in the sorted view of the version index;
+    a module whose own version is not allowed (e.g. excluded as a bad release) is moved to the newest allowed one
+    even if that is older
+    """
+
+    def __init__(self, spec='', exclude=(), check_existence=False, scheme=None, prereleases=False):
+        """
+
+        Args:
+            spec (str or VersionSpec): a VersionSpec is used as it is
+            exclude (iterable): see VersionSpec
+            check_existence (bool):
+            scheme (VersionScheme):
+            prereleases (bool): see VersionSpec
+        """
+        super(ConstrainedVersion, self).__init__(check_existence=check_existence, scheme=scheme)
+        if not isinstance(spec, VersionSpec):
+            spec = VersionSpec(spec, exclude=exclude, scheme=self.scheme, prereleases=prereleases)
+        self.spec = spec
+
+    def group_key(self, m):
+        key = super(ConstrainedVersion, self).group_key(m)
+        return None if key is None else key + (self.spec, )
+
+    def search_many(self, ms):
+        indexes = dict()
+        ret = list()
+        for m in ms:
+            r = self.scheme.split_path(m.fs_path)
+            if r is None:
+                ret.append('')
+                continue
+            dir_, ver_, rel_path = r
+            if dir_ not in indexes:
+                indexes[dir_] = self.index(dir_)
+            index = indexes[dir_]
+            i = self.spec.select(index.keys())
+            if i is None:
+                ret.append('')
+                continue
+            key, _, version_path = index.sorted()[i]
+            current = self.scheme.key(ver_)
+            if key == current or (key < current and self.spec.allows(current)):
+                ret.append('')
+                continue
+            p = os.path.abspath(os.path.join(version_path, rel_path))
+            if self.check_existence and self.exists(p) is False:
+                ret.append('')
+                continue
+            ret.append(p)
+        return ret
+
+    def newer(self, m, found):
+        r, current = self.scheme.split_path(found), self.scheme.split_path(m.fs_path)
+        if r is None or current is None or not self.spec.allows(self.scheme.key(r[1])):
+            return False
+        return super(ConstrainedVersion, self).newer(m, found) or not self.spec.allows(self.scheme.key(current[1]))
+
+
+class ConstrainedPackageVersion(NewerPackageVersion):
+    """
+    Finds the newest package allowed by a VersionSpec; the packages DaoI.get_all() returns are sorted into an index
+    once per base name and the index is kept as long as get_all() returns the same packages
+    """
+
+    def __init__(self, dao, spec='', exclude=(), scheme=None, prereleases=False, **kwargs):
+        """
+
+        Args:
+            dao (DaoI):
+            spec (str or VersionSpec):
+            exclude (iterable): versions, see VersionSpec
+            scheme (VersionScheme): STRICT_VERSION by default
+            prereleases (bool):
+        """
+        super(ConstrainedPackageVersion, self).__init__(dao, scheme=scheme or STRICT_VERSION, **kwargs)
+        if not isinstance(spec, VersionSpec):
+            spec = VersionSpec(spec, exclude=exclude, scheme=self.scheme, prereleases=prereleases)
+        self.spec = spec
+
+        # base name => (packages, sorted version keys, packages in the same order)
+        self.indexes = dict()
+
+    def group_key(self, m):
+        key = super(ConstrainedPackageVersion, self).group_key(m)
+        return None if key is None else key + (self.spec, )
+
+    def index(self, base_name, packages):
+        packages = tuple(packages)
+        index = self.indexes.get(base_name)
+        if index is None or index[0] != packages:
+            entries = sorted((k, p) for k, p in ((self.scheme.key(self.dao.split(p)[1]), p) for p in packages)
+                             if k is not None)
+            index = self.indexes[base_name] = (packages, [k for k, _ in entries], [p for _, p in entries])
+        return index
+
+    def search_many(self, ms):
+        """
+        Calls DaoI.get_all() once per base name
+        """
+        selected = dict()
+        ret = list()
+        for m in ms:
+            base_name = (m.version_meta or dict()).get('base_name', '')
+            if not base_name:
+                ret.append(None)
+                continue
+            if base_name not in selected:
+                _, keys, packages = self.index(base_name, self.dao.get_all(base_name, **self.kwargs))
+                i = self.spec.select(keys)
+                selected[base_name] = (None, None) if i is None else (packages[i], keys[i])
+            new_package, key = selected[base_name]
+            current = self.scheme.key(m.version_meta.get('version', ''))
+            if new_package is None or key == current or (current is not None and key < current
+                                                         and self.spec.allows(current)):
+                ret.append(None)
+                continue
+            ret.append(new_package)
+        return ret
+
+    def newer(self, m, found):
+        if not self.spec.allows(self.scheme.key(self.dao.split(found)[1])):
+            return False
+        current = self.scheme.key((m.version_meta or dict()).get('version', ''))
+        return super(ConstrainedPackageVersion, self).newer(m, found) or not self.spec.allows(current)
+
+
+class SharedRegistry(object):
+    """
+    A memory-mapped table shared by the processes opening the same file (e.g. the workers of a prefork server),
+    mapping a module (its version root or package base name) to its current version, a generation counter bumped on
+    every version change, and the time of the last search
+
+    Writers take an exclusive flock() on the file, readers a shared one; within a process a mutex serializes the
+    threads since flock() does not. The table has a fixed number of slots; when it is full, or a key or value does not
+    fit in a slot, the registry stays out of the way and every process searches on its own
+    """
+
+    MAGIC = 'HSREG001'
+    HEADER = struct.Struct('<8sII')
+    SLOT = struct.Struct('<QQdHH')
+
+    def __init__(self, path, num_slots=1024, slot_size=512):
+        """
+
+        Args:
+            path (str): the file backing the table, created if it does not exist; processes sharing it must agree on
+                num_slots and slot_size
+            num_slots (int):
+            slot_size (int): bytes per slot, header included
+        """
+        self.path = path
+        self.num_slots = num_slots
+        self.slot_size = slot_size
+        self._lock = threading.Lock()
+        self._mm = None
+        size = self.HEADER.size + num_slots * slot_size
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self._fd).st_size == 0:
+                os.ftruncate(self._fd, size)
+                os.write(self._fd, self.HEADER.pack(self.MAGIC, num_slots, slot_size))
+            os.lseek(self._fd, 0, os.SEEK_SET)
+            header = os.read(self._fd, self.HEADER.size)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        if header != self.HEADER.pack(self.MAGIC, num_slots, slot_size):
+            self.close()
+            raise ValueError('{} is not a registry of {} slots of {} bytes'.format(path, num_slots, slot_size))
+        self._mm = mmap.mmap(self._fd, size)
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def __del__(self):
+        self.close()
+
+    def after_fork(self):
+        """
+        To be called in the child process: the mutex may have been held by a thread of the parent, and the flock()
+        of a descriptor inherited from the parent does not exclude the parent
+        """
+        self._lock = threading.Lock()
+        if self._fd is not None:
+            fd, self._fd = self._fd, os.open(self.path, os.O_RDWR)
+            os.close(fd)
+
+    def _locked(self, exclusive):
+        registry = self
+
+        class Locked(object):
+
+            def __enter__(self):
+                registry._lock.acquire()
+                fcntl.flock(registry._fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+
+            def __exit__(self, exc_type, exc_val, exc_tb):
+                fcntl.flock(registry._fd, fcntl.LOCK_UN)
+                registry._lock.release()
+
+        return Locked()
+
+    def _find(self, key, create):
+        """
+        Must be called with the lock held
+
+        Returns:
+            tuple: (offset, generation, searched_at, value) of the key's slot, or None
+        """
+        if self.SLOT.size + len(key) > self.slot_size:
+            return None
+        tag = (zlib.crc32(key) & 0xffffffff) | (1 << 32)
+        start = tag % self.num_slots
+        for i in xrange(self.num_slots):
+            offset = self.HEADER.size + ((start + i) % self.num_slots) * self.slot_size
+            slot_tag, generation, searched_at, key_size, value_size = self.SLOT.unpack(
+                self._mm[offset: offset + self.SLOT.size]
+            )
+            if slot_tag == 0:
+                if not create:
+                    return None
+                self._write(offset, tag, key, 0, 0.0, '')
+                return offset, 0, 0.0, ''
+            if slot_tag == tag:
+                payload = offset + self.SLOT.size
+                if self._mm[payload: payload + key_size] == key:
+                    return offset, generation, searched_at, self._mm[payload + key_size: payload + key_size + value_size]
+        return None
+
+    def _write(self, offset, tag, key, generation, searched_at, value):
+        self._mm[offset: offset + self.SLOT.size + len(key) + len(value)] = self.SLOT.pack(
+            tag, generation, searched_at, len(key), len(value)
+        ) + key + value
+
+    def read(self, key):
+        """
+
+        Args:
+            key (str):
+
+        Returns:
+            tuple: (generation, value, searched_at), or None if the key is not in the table
+        """
+        with self._locked(False):
+            found = self._find(key, False)
+        if found is None:
+            return None
+        _, generation, searched_at, value = found
+        return generation, value, searched_at
+
+    def claim(self, key, interval):
+        """
+        Lets one process search on behalf of the others
+
+        Args:
+            key (str):
+            interval (float): seconds between two searches
+
+        Returns:
+            bool: True if the caller is to search, in which case it should publish() what it finds
+        """
+        now = time.time()
+        with self._locked(True):
+            found = self._find(key, True)
+            if found is None:
+                return True
+            offset, generation, searched_at, value = found
+            if now - searched_at < interval:
+                return False
+            self._write(offset, (zlib.crc32(key) & 0xffffffff) | (1 << 32), key, generation, now, value)
+            return True
+
+    def publish(self, key, value):
+        """
+
+        Args:
+            key (str):
+            value (str): the current version
+
+        Returns:
+            int: the generation of the key, or None if it can not be stored
+        """
+        with self._locked(True):
+            found = self._find(key, True)
+            if found is None or self.SLOT.size + len(key) + len(value) > self.slot_size:
+                return None
+            offset, generation, searched_at, old_value = found
+            if value != old_value:
+                generation += 1
+            self._write(offset, (zlib.crc32(key) & 0xffffffff) | (1 << 32), key, generation, searched_at, value)
+            return generation
+
+
+class SharedSearch(SearchRuleI):
+    """
+    Shares the results of a search rule between processes through a SharedRegistry: within <interval> of a search
+    made by any process, the others read the published version instead of searching themselves
+    """
+
+    def __init__(self, search_rule, registry, interval=1.0):
+        """
+
+        Args:
+            search_rule (SearchRuleI): returns module paths, or package names for descriptors carrying version_meta
+            registry (SharedRegistry):
+            interval (float): seconds
+        """
+        self.search_rule = search_rule
+        self.registry = registry
+        self.interval = interval
+
+    @staticmethod
+    def key(m):
+        return module_key(m)
+
+    @staticmethod
+    def identity(m):
+        if m.version_meta and 'package' in m.version_meta:
+            return m.version_meta['package']
+        return m.fs_path
+
+    def group_key(self, m):
+        key = self.search_rule.group_key(m)
+        if key is None:
+            return None
+        return type(self), self.registry.path, self.interval, key
+
+    def _published(self, m, entry):
+        # the publisher may be behind m, e.g. a process started on a newer version than the one published
+        if entry is None or not entry[1] or entry[1] == self.identity(m) or not self.search_rule.newer(m, entry[1]):
+            return None
+        return entry[1]
+
+    def search(self, m):
+        return self.search_many([m])[0]
+
+    def search_many(self, ms):
+        ret = [None] * len(ms)
+        claimed = dict()
+        now = time.time()
+        for i, m in enumerate(ms):
+            key = self.key(m)
+            if key not in claimed:
+                entry = self.registry.read(key)
+                if entry is not None and now - entry[2] < self.interval:
+                    ret[i] = self._published(m, entry)
+                    continue
+                if not self.registry.claim(key, self.interval):
+                    ret[i] = self._published(m, self.registry.read(key))
+                    continue
+                claimed[key] = list()
+            claimed[key].append(i)
+        indices = [i for key in claimed for i in claimed[key]]
+        if indices:
+            founds = self.search_rule.search_many([ms[i] for i in indices])
+            for i, found in zip(indices, founds):
+                ret[i] = found
+                self.registry.publish(self.key(ms[i]), found or self.identity(ms[i]))
+        return ret
+
+
+class MaxAge(TimerRuleI):
+
+    def __init__(self, max_age):
+        self.max_age = max_age
+
+    @staticmethod
+    def age(m):
+        return time.time() - m.birth_time
+
+    def retire(self, m):
+        if self.age(m) >= self.max_age:
+            m.deprecated = True
+            return True
+        return False
+
+    def due(self, m):
+        return self.age(m) >= self.max_age
+
+
+LIVE_FOR_TWO_HOUR = MaxAge(3600 * 2)
+
+
+def _clock_gettime_monotonic():
+    """
+
+    Returns:
+        function: reading CLOCK_MONOTONIC through clock_gettime(), or None where it is not available
+    """
+
+    class Timespec(ctypes.Structure):
+        _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('rt') or ctypes.util.find_library('c'), use_errno=True)
+        clock_gettime = libc.clock_gettime
+    except (OSError, AttributeError), e:
+        return None
+    clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(Timespec)]
+    clock_monotonic = 1 if sys.platform.startswith('linux') else 6
+
+    def monotonic():
+        ts = Timespec()
+        if clock_gettime(clock_monotonic, ctypes.byref(ts)) != 0:
+            return time.time()
+        return ts.tv_sec + ts.tv_nsec * 1e-9
+
+    return monotonic
+
+
+# seconds from an arbitrary point, unaffected by wall-clock adjustments
+monotonic = getattr(time, 'monotonic', None) or _clock_gettime_monotonic() or time.time
+
+
+class ScheduledRule(TimerRuleI):
+    """
+    Base class of the timer rules that keep their own schedule per module descriptor, on the monotonic clock
+
+    The first check of a descriptor is due interval(0) seconds after the rule first sees it. Every time the descriptor
+    is retired, the next check is scheduled interval(n) seconds later, n being the number of times it was retired: a
+    descriptor that is still checked after being retired is one whose search found nothing (a successful search
+    replaces the descriptor), which is what lets subclasses back off
+    """
+
+    def __init__(self):
+        # module descriptor => (time of the next check, number of times retired)
+        self._schedule = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def interval(self, num_retired):
+        """
+
+        Args:
+            num_retired (int):
+
+        Returns:
+            float: seconds until the next check
+        """
+        raise NotImplementedError()
+
+    def _entry(self, m, now):
+        try:
+            return self._schedule[m]
+        except KeyError:
+            return self._schedule.setdefault(m, (now + self.interval(0), 0))
+
+    def due(self, m):
+        now = monotonic()
+        return now >= self._entry(m, now)[0]
+
+    def retire(self, m):
+        now = monotonic()
+        with self._lock:
+            next_time, num_retired = self._entry(m, now)
+            if now < next_time:
+                return False
+            self._schedule[m] = (now + self.interval(num_retired + 1), num_retired + 1)
+        m.deprecated = True
+        return True
+
+
+class JitteredMaxAge(ScheduledRule):
+    """
+    Checks every <max_age> seconds give or take <jitter> * max_age, so that the processes and getters created at
+    the same time do not all search at the same moment
+    """
+
+    def __init__(self, max_age, jitter=0.1):
+        super(JitteredMaxAge, self).__init__()
+        self.max_age = max_age
+        self.jitter = jitter
+        self._random = None
+        self._pid = None
+
+    def random(self):
+        # reseeded in a forked child, which would otherwise draw the same numbers as its parent and siblings
+        if self._pid != os.getpid():
+            self._random = random.Random()
+            self._pid = os.getpid()
+        return self._random.random()
+
+    def jittered(self, seconds):
+        return seconds * (1.0 + self.jitter * (2.0 * self.random() - 1.0))
+
+    def interval(self, num_retired):
+        return self.jittered(self.max_age)
+
+
+class BackoffMaxAge(JitteredMaxAge):
+    """
+    Checks <max_age> seconds after the descriptor is seen, then waits <factor> times longer after every search that
+    found nothing, up to <max_interval>
+    """
+
+    def __init__(self, max_age, factor=2.0, max_interval=3600.0, jitter=0.0):
+        super(BackoffMaxAge, self).__init__(max_age, jitter=jitter)
+        self.factor = factor
+        self.max_interval = max_interval
+
+    def interval(self, num_retired):
+        return self.jittered(min(self.max_age * self.factor ** num_retired, self.max_interval))
+
+
+class MinSpacing(TimerRuleI):
+    """
+    Wraps a timer rule so that a descriptor is retired at most once every <spacing> seconds, e.g. MaxAge, which keeps
+    retiring a descriptor on every call once it is older than max_age
+    """
+
+    def __init__(self, timer_rule, spacing):
+        self.timer_rule = timer_rule
+        self.spacing = spacing
+
+        # module descriptor => time it was last retired
+        self._last = weakref.WeakKeyDictionary()
+
+    def due(self, m):
+        last = self._last.get(m)
+        if last is not None and monotonic() - last < self.spacing:
+            return False
+        return self.timer_rule.due(m)
+
+    def retire(self, m):
+        now = monotonic()
+        last = self._last.get(m)
+        if last is not None and now - last < self.spacing:
+            return False
+        if not self.timer_rule.retire(m):
+            return False
+        self._last[m] = now
+        return True
+
+
+class FsWatcherI(object):
+    """
+    Counts the filesystem changes of watched files and directories; a change to a file inside a watched directory
+    also counts as a change to that file
+    """
+
+    def watch(self, path):
+        """
+        Start watching a file or a directory; watching the same path twice is a no-op
+
+        Args:
+            path (str):
+        """
+        raise NotImplementedError()
+
+    def generation(self, path):
+        """
+
+        Args:
+            path (str):
+
+        Returns:
+            tuple: number of changes observed so far and the time of the latest one
+        """
+        raise NotImplementedError()
+
+    def close(self):
+        raise NotImplementedError()
+
+
+class PollingWatcher(FsWatcherI):
+    """
+    Pure Python fallback: a daemon thread stats the watched paths every <interval> seconds
+    """
+
+    def __init__(self, interval=1.0):
+        self.interval = interval
+        self._signatures = dict()
+        self._generations = dict()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def signature(path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st.st_mtime, st.st_size, st.st_ino
+
+    def watch(self, path):
+        path = os.path.abspath(path)
+        with self._lock:
+            if path in self._signatures:
+                return
+            self._signatures[path] = self.signature(path)
+            self._generations.setdefault(path, (0, 0.0))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='hotswapping-polling-watcher')
+                self._thread.daemon = True
+                self._thread.start()
+
+    def generation(self, path):
+        return self._generations.get(os.path.abspath(path), (0, 0.0))
+
+    def poll(self):
+        """
+        Stat every watched path once
+        """
+        with self._lock:
+            paths = self._signatures.items()
+        now = time.time()
+        for path, old in paths:
+            new = self.signature(path)
+            if new == old:
+                continue
+            with self._lock:
+                self._signatures[path] = new
+                self._generations[path] = (self._generations[path][0] + 1, now)
+
+    def close(self):
+        self._stopped.set()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.poll()
+
+
+class InotifyWatcher(FsWatcherI):
+    """
+    Linux only: directories are watched through inotify and a daemon thread blocks on the event queue, so nothing is
+    done while nothing changes. A watched file is covered by a watch on its directory, which also catches the file
+    being replaced by a rename
+    """
+
+    MASK = (inotify.IN_CREATE | inotify.IN_DELETE | inotify.IN_MOVED_TO | inotify.IN_MOVED_FROM |
+            inotify.IN_CLOSE_WRITE | inotify.IN_ATTRIB | inotify.IN_DELETE_SELF | inotify.IN_MOVE_SELF)
+
+    def __init__(self):
+        self._fd = inotify.init()
+        self._dirs = dict()
+        self._generations = dict()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='hotswapping-inotify-watcher')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def watch(self, path):
+        path = os.path.abspath(path)
+        dir_ = path if os.path.isdir(path) else os.path.dirname(path)
+        with self._lock:
+            self._generations.setdefault(path, (0, 0.0))
+            if dir_ in self._dirs.values():
+                return
+            wd = inotify.add_watch(self._fd, dir_, self.MASK)
+            self._dirs[wd] = dir_
+
+    def generation(self, path):
+        return self._generations.get(os.path.abspath(path), (0, 0.0))
+
+    def _bump(self, path, now):
+        num_changes = self._generations.get(path, (0, 0.0))[0]
+        self._generations[path] = (num_changes + 1, now)
+
+    def _dispatch(self, events):
+        now = time.time()
+        with self._lock:
+            for wd, mask, cookie, name in events:
+                if mask & inotify.IN_Q_OVERFLOW:
+                    for path in self._generations.keys():
+                        self._bump(path, now)
+                    continue
+                dir_ = self._dirs.get(wd)
+                if dir_ is None:
+                    continue
+                if mask & inotify.IN_IGNORED:
+                    del self._dirs[wd]
+                self._bump(dir_, now)
+                if name:
+                    self._bump(os.path.join(dir_, name), now)
+
+    def close(self):
+        self._stopped.set()
+
+    def _run(self):
+        try:
+            while not self._stopped.is_set():
+                readable, _, _ = select.select([self._fd], [], [], 1.0)
+                if readable:
+                    self._dispatch(inotify.read_events(self._fd))
+        finally:
+            os.close(self._fd)
+
+
+def create_fs_watcher(interval=1.0):
+    """
+
+    Args:
+        interval (float): polling interval, only used when inotify is not available
+
+    Returns:
+        FsWatcherI: an InotifyWatcher where possible, a PollingWatcher otherwise
+    """
+    if inotify.available():
+        try:
+            return InotifyWatcher()
+        except OSError:
+            pass
+    return PollingWatcher(interval)
+
+
+class FsEvents(TimerRuleI):
+    """
+    Retires a module descriptor when its module file or the directory holding its version directories changed on
+    disk, instead of after a fixed age; pair it with NewerVersionOrModified
+
+    The first time a descriptor is seen, its paths are watched, the current state is taken as the baseline and the
+    descriptor is retired once, so that a change made before the watch started is not missed. A change must have
+    settled for <settle> seconds, so that a version directory that is still being written is not searched
+    """
+
+    def __init__(self, watcher=None, settle=0.2):
+        """
+
+        Args:
+            watcher (FsWatcherI): default to create_fs_watcher()
+            settle (float): seconds
+        """
+        self.watcher = watcher if watcher is not None else create_fs_watcher()
+        self.settle = settle
+        self._seen = dict()
+
+    @staticmethod
+    def watched_paths(m):
+        """
+
+        Args:
+            m (ModuleDescriptor):
+
+        Returns:
+            tuple: the directory holding the version directories (empty if the path is not versioned) and the module
+            file
+        """
+        r = _VERSIONED_PATH_RE.match(m.fs_path)
+        return r.group(1) if r else '', m.fs_path
+
+    def _state(self, paths):
+        return tuple(self.watcher.generation(p) if p else (0, 0.0) for p in paths)
+
+    def _settled(self, state):
+        return time.time() - max(changed_at for _, changed_at in state) >= self.settle
+
+    def due(self, m):
+        paths = self.watched_paths(m)
+        seen = self._seen.get(paths)
+        if seen is None:
+            return True
+        state = self._state(paths)
+        return state != seen and self._settled(state)
+
+    def retire(self, m):
+        paths = self.watched_paths(m)
+        seen = self._seen.get(paths)
+        if seen is None:
+            for p in paths:
+                if p:
+                    self.watcher.watch(p)
+            self._seen[paths] = self._state(paths)
+            m.deprecated = True
+            return True
+        state = self._state(paths)
+        if state == seen or not self._settled(state):
+            return False
+        self._seen[paths] = state
+        m.deprecated = True
+        return True
+
+
+class MetricsSinkI(object):
+    """
+    Receives the measurements made by Instrumentation; must be thread safe
+    """
+
+    def observe(self, op, module, version, seconds, count):
+        """
+
+        Args:
+            op (str): 'renew', 'search', 'load' or 'unload'
+            module (str): see module_key()
+            version (str): see module_version()
+            seconds (float): duration of the operation
+            count (int): number of items the operation handled, e.g. the modules removed by unload(); may be None
+        """
+        raise NotImplementedError()
+
+    def swapped(self, module, version):
+        """
+        A getter swapped in a new version
+
+        Args:
+            module (str):
+            version (str):
+        """
+        raise NotImplementedError()
+
+    def serving(self, module, version):
+        """
+        A getter imported its first version, which is not counted as a swap
+
+        Args:
+            module (str):
+            version (str):
+        """
+        raise NotImplementedError()
+
+
+class DictSink(MetricsSinkI):
+    """
+    Aggregates the measurements in process: a latency histogram and an item count per (operation, module), the swap
+    count and current version per module
+    """
+
+    BUCKETS = (0.0001, 0.001, 0.01, 0.1, 1.0, 10.0)
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self.clear()
+
+    def after_fork(self):
+        self._lock = threading.Lock()
+
+    def clear(self):
+        with self._lock:
+            # (op, module) => dict(count, sum, items, buckets)
+            self.operations = dict()
+            self.swaps = collections.Counter()
+            self.versions = dict()
+
+    def observe(self, op, module, version, seconds, count):
+        with self._lock:
+            try:
+                entry = self.operations[op, module]
+            except KeyError:
+                entry = self.operations[op, module] = dict(count=0, sum=0.0, items=0, buckets=[0] * len(self.buckets))
+            entry['count'] += 1
+            entry['sum'] += seconds
+            if count is not None:
+                entry['items'] += count
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    entry['buckets'][i] += 1
+
+    def swapped(self, module, version):
+        with self._lock:
+            self.swaps[module] += 1
+            self.versions[module] = version
+
+    def serving(self, module, version):
+        with self._lock:
+            self.versions[module] = version
+
+    def snapshot(self):
+        """
+
+        Returns:
+            dict: a copy of the aggregates, with per operation totals
+        """
+        with self._lock:
+            operations = copy.deepcopy(self.operations)
+            ret = dict(operations=operations, swaps=dict(self.swaps), versions=dict(self.versions), totals=dict())
+        for (op, _), entry in operations.items():
+            total = ret['totals'].setdefault(op, dict(count=0, sum=0.0, items=0))
+            for k in total:
+                total[k] += entry[k]
+        return ret
+
+    def prometheus(self, prefix='hotswapping'):
+        """
+
+        Returns:
+            str: the aggregates in the Prometheus text exposition format
+        """
+        snapshot = self.snapshot()
+        lines = ['# TYPE {}_operation_seconds histogram'.format(prefix)]
+        for (op, module), entry in sorted(snapshot['operations'].items()):
+            labels = 'op="{}",module="{}"'.format(_prometheus_escape(op), _prometheus_escape(module))
+            for bound, n in zip(self.buckets, entry['buckets']):
+                lines.append('{}_operation_seconds_bucket{{{},le="{!r}"}} {}'.format(prefix, labels, bound, n))
+            lines.append('{}_operation_seconds_bucket{{{},le="+Inf"}} {}'.format(prefix, labels, entry['count']))
+            lines.append('{}_operation_seconds_sum{{{}}} {!r}'.format(prefix, labels, entry['sum']))
+            lines.append('{}_operation_seconds_count{{{}}} {}'.format(prefix, labels, entry['count']))
+        lines.append('# TYPE {}_operation_items_total counter'.format(prefix))
+        for (op, module), entry in sorted(snapshot['operations'].items()):
+            lines.append('{}_operation_items_total{{op="{}",module="{}"}} {}'.format(
+                prefix, _prometheus_escape(op), _prometheus_escape(module), entry['items']))
+        lines.append('# TYPE {}_swaps_total counter'.format(prefix))
+        for module, n in sorted(snapshot['swaps'].items()):
+            lines.append('{}_swaps_total{{module="{}"}} {}'.format(prefix, _prometheus_escape(module), n))
+        lines.append('# TYPE {}_current_version gauge'.format(prefix))
+        for module, version in sorted(snapshot['versions'].items()):
+            lines.append('{}_current_version{{module="{}",version="{}"}} 1'.format(
+                prefix, _prometheus_escape(module), _prometheus_escape(version)))
+        return '\n'.join(lines) + '\n'
+
+
+def _prometheus_escape(s):
+    return str(s).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class CallbackSink(MetricsSinkI):
+    """
+    Hands every measurement, as a dictionary, to a callback (e.g. to forward it to statsd or a log)
+    """
+
+    def __init__(self, callback):
+        self.callback = callback
+
+    def observe(self, op, module, version, seconds, count):
+        self.callback(dict(kind='observe', op=op, module=module, version=version, seconds=seconds, count=count))
+
+    def swapped(self, module, version):
+        self.callback(dict(kind='swap', module=module, version=version))
+
+    def serving(self, module, version):
+        self.callback(dict(kind='serving', module=module, version=version))
+
+
+def module_key(m):
+    """
+
+    Args:
+        m (ModuleDescriptor):
+
+    Returns:
+        str: identifies a module whatever its version: the package base name, or the module path with the version
+            directory replaced by *
+    """
+    if m is None:
+        return ''
+    if m.version_meta and 'base_name' in m.version_meta:
+        return 'package:' + m.version_meta['base_name']
+    match = _VERSIONED_PATH_RE.match(m.fs_path)
+    if match:
+        return 'fs:{}/*/{}'.format(match.group(1), match.group(3))
+    return 'fs:' + m.fs_path
+
+
+def module_version(m):
+    """
+
+    Args:
+        m (ModuleDescriptor):
+
+    Returns:
+        str: the package version, the version directory, or the module path
+    """
+    if m is None:
+        return ''
+    if m.version_meta and 'version' in m.version_meta:
+        return m.version_meta['version']
+    match = _VERSIONED_PATH_RE.match(m.fs_path)
+    if match:
+        return match.group(2)
+    return m.fs_path
+
+
+class Instrumentation(object):
+    """
+    Measures renew, search, load and unload and reports to the sinks; install it by assigning INSTRUMENTATION. When
+    INSTRUMENTATION is None an instrumented operation costs one global lookup. A failing sink never fails the
+    operation
+    """
+
+    def __init__(self, sinks=None):
+        """
+
+        Args:
+            sinks (list): of MetricsSinkI; a DictSink if not given
+        """
+        self.sinks = list(sinks) if sinks is not None else [DictSink()]
+
+    def after_fork(self):
+        for sink in self.sinks:
+            if getattr(sink, 'after_fork', None) is not None:
+                sink.after_fork()
+
+    def observe(self, op, m, seconds, count=None):
+        module, version = module_key(m), module_version(m)
+        for sink in self.sinks:
+            try:
+                sink.observe(op, module, version, seconds, count)
+            except Exception:
+                continue
+
+    def swapped(self, m):
+        module, version = module_key(m), module_version(m)
+        for sink in self.sinks:
+            try:
+                sink.swapped(module, version)
+            except Exception:
+                continue
+
+    def serving(self, m):
+        module, version = module_key(m), module_version(m)
+        for sink in self.sinks:
+            try:
+                sink.serving(module, version)
+            except Exception:
+                continue
+
+
+# assign an Instrumentation to have the operations measured
+INSTRUMENTATION = None
+
+
+def _instrumented(op, m_index=0, count=None):
+    """
+    Decorates an operation taking a module descriptor as its <m_index>-th argument; <count> optionally gives the
+    number of items the operation handled from what it returns
+    """
+
+    def decorate(func):
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            instrumentation = INSTRUMENTATION
+            if instrumentation is None:
+                return func(*args, **kwargs)
+            start = monotonic()
+            ret = None
+            try:
+                ret = func(*args, **kwargs)
+                return ret
+            finally:
+                instrumentation.observe(op, args[m_index] if len(args) > m_index else None, monotonic() - start,
+                                        None if count is None or ret is None else count(ret))
+
+        return wrapper
+
+    return decorate
+
+
+def _search(search_rule, m):
+    instrumentation = INSTRUMENTATION
+    if instrumentation is None:
+        return search_rule.search(m)
+    start = monotonic()
+    try:
+        return search_rule.search(m)
+    finally:
+        instrumentation.observe('search', m, monotonic() - start, 1)
+
+
+def _search_many(search_rule, ms):
+    instrumentation = INSTRUMENTATION
+    if instrumentation is None:
+        return search_rule.search_many(ms)
+    start = monotonic()
+    try:
+        return search_rule.search_many(ms)
+    finally:
+        instrumentation.observe('search', ms[0] if ms else None, monotonic() - start, len(ms))
+
+
+class RenewInterface(object):
+    """
+    To figure out how to create a new module descriptor that wraps a newer version of the module;
+
+    Can modify the incoming module descriptor;
+    """
+
+    def renew(self, m):
+        """
+
+        Args:
+            m (ModuleDescriptor):
+
+        Returns:
+            ModuleDescriptor: a renewed ModuleDescriptor or None; in the first case the given ModuleDescriptor is marked
+            deprecated
+        """
+        raise NotImplementedError()
+
+    def renew_with(self, m, found):
+        """
+        The second half of renew(), for a descriptor that the timer rule has retired
+
+        Args:
+            m (ModuleDescriptor):
+            found (str): what the search rule returned for m
+
+        Returns:
+            ModuleDescriptor: a renewed ModuleDescriptor or None
+        """
+        raise NotImplementedError()
+
+    def renew_with_many(self, ms, founds):
+        """
+
+        Args:
+            ms (list): list of ModuleDescriptor
+            founds (list): what the search rule returned for each of them
+
+        Returns:
+            list: a renewed ModuleDescriptor or None, for each descriptor
+        """
+        return [self.renew_with(m, found) for m, found in zip(ms, founds)]
+
+
+class RenewFSModule(RenewInterface):
+
+    def __init__(self, search_rule, timer_rule):
+        """
+
+        Args:
+            search_rule (NewerSemanticVersion):
+            timer_rule (TimerRuleI):
+        """
+        self.search_rule = search_rule
+        self.timer_rule = timer_rule
+
+    @_instrumented('renew', m_index=1)
+    def renew(self, m):
+        if not self.timer_rule.retire(m):
+            return None
+        return self.renew_with(m, _search(self.search_rule, m))
+
+    def renew_with(self, m, path):
+        if not path:
+            m.deprecated = False
+            return None
+
+        ret = create_descriptor_from_fs(path)
+        if not ret:
+            m.deprecated = False
+            return None
+
+        m.deprecated = True
+        return ret
+
+
+class RenewPackageModule(RenewInterface):
+
+    def __init__(self, search_rule, timer_rule):
+        """
+
+        Args:
+            dao (DaoI):
+            search_rule (NewerPackageVersion):
+            timer_rule (TimerRuleI):
+        """
+        self.search_rule = search_rule
+        self.timer_rule = timer_rule
+
+    @_instrumented('renew', m_index=1)
+    def renew(self, m):
+        if not self.timer_rule.retire(m):
+            return None
+        return self.renew_with(m, _search(self.search_rule, m))
+
+    def renew_with(self, m, package):
+        if not package:
+            m.deprecated = False
+            return None
+
+        ret = create_descriptor_from_package_dao(package, self.search_rule.dao, **self.search_rule.kwargs)
+        return self._settle(m, ret)
+
+    def renew_with_many(self, ms, packages):
+        """
+        Resolves all the distinct packages found in one DaoI.resolve() call
+        """
+        pending = sorted(set(package for package in packages if package))
+        created = create_descriptors_from_package_dao(pending, self.search_rule.dao, **self.search_rule.kwargs)
+        by_package = dict(zip(pending, created))
+        handed_out = set()
+        ret = list()
+        for m, package in zip(ms, packages):
+            if not package:
+                m.deprecated = False
+                ret.append(None)
+                continue
+            new_m = by_package[package]
+            if new_m is not None:
+                # each getter owns its descriptor
+                if package in handed_out:
+                    new_m = copy.copy(new_m)
+                    new_m.version_meta = dict(new_m.version_meta)
+                handed_out.add(package)
+            ret.append(self._settle(m, new_m))
+        return ret
+
+    @staticmethod
+    def _settle(m, new_m):
+        if not new_m:
+            m.deprecated = False
+            return None
+
+        m.deprecated = True
+        return new_m
+
+
+def renew(m, search_rule, timer_rule):
+    return RenewFSModule(search_rule, timer_rule).renew(m)
+
+
+# serializes the mutations of sys.path and sys.modules done by load() and unload()
+_IMPORT_LOCK = threading.RLock()
+
+
+_namespace_serials = itertools.count()
+
+
+class SourceLoader(object):
+    """
+    Base class of the import hooks that compile the module sources themselves (see compile())
+
+    While load() imports a module the hook sits on sys.meta_path and handles the modules found in the module's
+    directory (and below it); everything else goes through the regular import machinery
+    """
+
+    def __init__(self):
+        self.dirs = list()
+        self.top_level_dirs = list()
+        self._found = dict()
+
+    def scope(self, dir_path, top_level=False):
+        """
+
+        Args:
+            dir_path (str): the directory load() imports from
+            top_level (bool): whether dir_path is on sys.path for the duration of the import
+
+        Returns:
+            object: a context manager that installs the loader for the duration of the import
+        """
+        loader = self
+
+        class Scope(object):
+
+            def __enter__(self):
+                loader.dirs.append(os.path.abspath(dir_path))
+                if top_level:
+                    loader.top_level_dirs.append(os.path.abspath(dir_path))
+                sys.meta_path.insert(0, loader)
+
+            def __exit__(self, exc_type, exc_val, exc_tb):
+                sys.meta_path.remove(loader)
+                loader.dirs.pop()
+                if top_level:
+                    loader.top_level_dirs.pop()
+
+        return Scope()
+
+    def _claims(self, dir_path):
+        dir_path = os.path.abspath(dir_path)
+        return any(dir_path == _ or dir_path.startswith(_ + os.sep) for _ in self.dirs)
+
+    def find_module(self, fullname, path=None):
+        name = fullname.rpartition('.')[2]
+        if path is None:
+            if not self.top_level_dirs or name in sys.builtin_module_names:
+                return None
+            # load() appends the module directory to sys.path: what the earlier entries provide takes precedence
+            try:
+                f, _, _ = imp.find_module(name, [_ for _ in sys.path if not self._claims(_ or '.')])
+            except ImportError, e:
+                candidates = [self.top_level_dirs[-1]]
+            else:
+                if f is not None:
+                    f.close()
+                return None
+        else:
+            candidates = [_ for _ in path if self._claims(_)]
+        for dir_path in candidates:
+            package_init = os.path.join(dir_path, name, '__init__.py')
+            if os.path.isfile(package_init):
+                self._found[fullname] = (package_init, True)
+                return self
+            source = os.path.join(dir_path, name + '.py')
+            if os.path.isfile(source):
+                self._found[fullname] = (source, False)
+                return self
+        return None
+
+    def load_module(self, fullname):
+        if fullname in sys.modules:
+            return sys.modules[fullname]
+        source, is_package = self._found.pop(fullname)
+        code = self.compile(source)
+        mod_ = types.ModuleType(fullname)
+        mod_.__file__ = source
+        mod_.__loader__ = self
+        if is_package:
+            mod_.__path__ = [os.path.dirname(source)]
+            mod_.__package__ = fullname
+        else:
+            mod_.__package__ = fullname.rpartition('.')[0] or None
+        sys.modules[fullname] = mod_
+        try:
+            exec code in mod_.__dict__
+        except BaseException:
+            sys.modules.pop(fullname, None)
+            raise
+        return sys.modules[fullname]
+
+    def compile(self, source):
+        """
+
+        Args:
+            source (str): path of a .py file
+
+        Returns:
+            types.CodeType:
+        """
+        raise NotImplementedError()
+
+
+class BytecodeCache(SourceLoader):
+    """
+    A writable compiled-bytecode cache for the modules imported by load(), for module trees deployed where Python can
+    not write its own .pyc files (read-only volumes)
+
+    Entries are keyed by source path, mtime and size, written atomically so that several processes can share the
+    cache directory, and pruned by least recent use once there are more than <max_entries>. Pruning scans the
+    directory, so it is done when the entries counted by the last scan plus those written since exceed <max_entries>,
+    or after <prune_every> writes (to account for the other processes' writes), not after every write
+    """
+
+    def __init__(self, cache_dir, max_entries=1024, prune_every=256):
+        """
+
+        Args:
+            cache_dir (str): created if it does not exist
+            max_entries (int):
+            prune_every (int): writes
+        """
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.prune_every = prune_every
+        super(BytecodeCache, self).__init__()
+        self.hits = 0
+        self.misses = 0
+
+        # entries counted by the last prune (None before the first one), and entries written since
+        self._num_entries = None
+        self._num_written = 0
+        if not os.path.isdir(cache_dir):
+            try:
+                os.makedirs(cache_dir)
+            except OSError, e:
+                if not os.path.isdir(cache_dir):
+                    raise
+
+    def entry_path(self, source, st):
+        key = hashlib.sha1('{}\0{}\0{}'.format(os.path.abspath(source), st.st_mtime, st.st_size)).hexdigest()
+        return os.path.join(self.cache_dir, key + '.pyc')
+
+    def compile(self, source):
+        """
+
+        Args:
+            source (str): path of a .py file
+
+        Returns:
+            types.CodeType: read from the cache, or compiled and written to it
+        """
+        st = os.stat(source)
+        entry = self.entry_path(source, st)
+        try:
+            with open(entry, 'rb') as f:
+                data = f.read()
+            if data[:4] == imp.get_magic():
+                code = marshal.loads(data[4:])
+                self.hits += 1
+                try:
+                    os.utime(entry, None)
+                except OSError, e:
+                    pass
+                return code
+        except (IOError, EOFError, ValueError, TypeError), e:
+            pass
+        self.misses += 1
+        with open(source, 'rU') as f:
+            code = compile(f.read() + '\n', source, 'exec')
+        tmp_path = '{}.{}.{}.tmp'.format(entry, os.getpid(), threading.current_thread().ident)
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(imp.get_magic() + marshal.dumps(code))
+            os.rename(tmp_path, entry)
+        except (IOError, OSError), e:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return code
+        self._num_written += 1
+        if self._num_entries is None or self._num_entries + self._num_written > self.max_entries or \
+                self._num_written >= self.prune_every:
+            self.prune()
+        return code
+
+    def prune(self):
+        """
+        Remove the least recently used entries beyond <max_entries>
+
+        Returns:
+            int: the number of entries removed
+        """
+        entries = list()
+        for fn in os.listdir(self.cache_dir):
+            if not fn.endswith('.pyc'):
+                continue
+            path = os.path.join(self.cache_dir, fn)
+            try:
+                entries.append((os.stat(path).st_mtime, path))
+            except OSError, e:
+                pass
+        num_removed = 0
+        for _, path in sorted(entries)[: max(0, len(entries) - self.max_entries)]:
+            try:
+                os.remove(path)
+                num_removed += 1
+            except OSError, e:
+                pass
+        self._num_entries, self._num_written = len(entries) - num_removed, 0
+        return num_removed
+
+
+class ContentStore(SourceLoader):
+    """
+    A content-addressed store of compiled modules: each source file is hashed once (per path, mtime and size) and its
+    code object is cached by digest, so that a file shipped unchanged in a new version directory is not compiled
+    again. A shared code object keeps the file name it was first compiled from, which is what tracebacks show
+
+    It also tells when a new version is byte-identical to a loaded one, in which case stage() hands the loaded modules
+    over to the new descriptor instead of importing anything
+    """
+
+    def __init__(self, max_entries=1024, bytecode_cache=None):
+        """
+
+        Args:
+            max_entries (int): code objects kept in memory
+            bytecode_cache (BytecodeCache): optional; where the code objects missing from the store come from
+        """
+        super(ContentStore, self).__init__()
+        self.digests = LruCache(max_size=max_entries * 4)
+        self.codes = LruCache(max_size=max_entries)
+        self.bytecode_cache = bytecode_cache
+        self.num_hashed = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.RLock()
+
+    def after_fork(self):
+        self._lock = threading.RLock()
+
+    def digest(self, path):
+        """
+
+        Args:
+            path (str):
+
+        Returns:
+            str: sha1 of the file content
+        """
+        st = os.stat(path)
+        key = os.path.abspath(path), st.st_mtime, st.st_size
+        with self._lock:
+            hit, digest = self.digests.get(key)
+            if not hit:
+                with open(path, 'rb') as f:
+                    digest = hashlib.sha1(f.read()).hexdigest()
+                self.num_hashed += 1
+                self.digests.put(key, digest)
+            return digest
+
+    def compile(self, source):
+        digest = self.digest(source)
+        with self._lock:
+            hit, code = self.codes.get(digest)
+            if hit:
+                self.hits += 1
+                return code
+            self.misses += 1
+            if self.bytecode_cache is not None:
+                code = self.bytecode_cache.compile(source)
+            else:
+                with open(source, 'rU') as f:
+                    code = compile(f.read() + '\n', source, 'exec')
+            self.codes.put(digest, code)
+            return code
+
+    def identical(self, old_m, new_m):
+        """
+
+        Args:
+            old_m (ModuleDescriptor): loaded
+            new_m (ModuleDescriptor):
+
+        Returns:
+            bool: True if the two version directories hold the same module files and the modules old_m loaded have
+                the same content in both
+        """
+        if not old_m.sources or os.path.basename(old_m.fs_path) != os.path.basename(new_m.fs_path):
+            return False
+        old_dir = os.path.dirname(old_m.fs_path)
+        new_dir = os.path.dirname(new_m.fs_path)
+        try:
+            if sorted(fn for fn in os.listdir(old_dir) if fn.endswith('.py')) != \
+                    sorted(fn for fn in os.listdir(new_dir) if fn.endswith('.py')):
+                return False
+            for rel, digest, size, _, _ in old_m.sources.values():
+                path = os.path.join(new_dir, rel)
+                if os.stat(path).st_size != size or self.digest(path) != digest:
+                    return False
+        except (IOError, OSError), e:
+            return False
+        return True
+
+
+# assign a ContentStore to have load() share the compiled modules by content and stage() skip identical versions;
+# it takes precedence over BYTECODE_CACHE, which it can be given as a fallback
+CONTENT_STORE = None
+
+
+# assign a BytecodeCache to have load() cache the compiled modules
+BYTECODE_CACHE = None
+
+
+def after_fork():
+    """
+    To be called in the child process: resets the process-wide locks (imports, CONTENT_STORE, INSTRUMENTATION), which
+    may have been held by a thread of the parent, e.g. a BackgroundReloader importing a new version at fork time
+    """
+    global _IMPORT_LOCK
+    _IMPORT_LOCK = threading.RLock()
+    for o in (CONTENT_STORE, INSTRUMENTATION):
+        if o is not None:
+            o.after_fork()
+
+
+def _source_loader_scope(dir_path, top_level=False):
+    loader = CONTENT_STORE if CONTENT_STORE is not None else BYTECODE_CACHE
+    if loader is None:
+
+        class NoScope(object):
+
+            def __enter__(self):
+                pass
+
+            def __exit__(self, exc_type, exc_val, exc_tb):
+                pass
+
+        return NoScope()
+    return loader.scope(dir_path, top_level)
+
+
+@_instrumented('load')
+def load(m, isolated=False, reuse=None, record_graph=False):
+    """
+    Can modify the incoming module descriptor
+
+    In isolated mode the module is imported into a synthetic package created for the descriptor, whose __path__ is
+    the module's directory and whose name carries the version directory and a serial number (for example
+    _hotswapping_2_1_0_7.foobar). Its sibling modules are found through the package rather than sys.path, so
+    sys.path is left alone and several versions of the same module can be resident at the same time
+
+    The compiled modules are cached by CONTENT_STORE or BYTECODE_CACHE when one is set
+
+    With <record_graph> (or CONTENT_STORE set), the imports made while loading are recorded, along with a digest of
+    each module's source, so that a later incremental stage() can tell which modules need to be executed again (and
+    ContentStore.identical() whether the new version differs at all)
+
+    Args:
+        m (ModuleDescriptor):
+        isolated (bool):
+        reuse (dict): optional; module name (as in m.sources) => module object to use instead of importing it
+        record_graph (bool): populate m.sources and m.dependencies
+
+    Returns:
+        types.ModuleType:
+    """
+    record_graph = record_graph or bool(reuse) or CONTENT_STORE is not None
+    if isolated:
+        return _load_isolated(m, reuse, record_graph)
+
+    class SysPathManip(object):
+
+        def __init__(self, dir_path):
+            self.dir_path = dir_path
+
+        def __enter__(self):
+            sys.path.append(self.dir_path)
+
+        def __exit__(self, exc_type, exc_val, exc_tb):
+            sys.path = sys.path[: -1]
+
+    path = m.fs_path
+    search_path = os.path.dirname(path)
+    dot_path = os.path.basename(path).replace('.py', '')
+    with _IMPORT_LOCK, SysPathManip(search_path), _source_loader_scope(search_path, True):
+        # the import is only attributable to this descriptor if the module is not already imported
+        before = None if dot_path in sys.modules and not reuse else set(sys.modules)
+        if reuse:
+            sys.modules.update(reuse)
+        recorder = _ImportRecorder(record_graph)
+        try:
+            with recorder:
+                return importlib.import_module(dot_path)
+        except Exception, e:
+            return None
+        finally:
+            if before is not None:
+                m.loaded_modules = list(set(reuse or ()).union(_introduced_modules(before, search_path)))
+                if record_graph:
+                    _record_graph(m, '', recorder.edges, reuse)
+
+
+def _load_isolated(m, reuse=None, record_graph=False):
+    path = m.fs_path
+    dir_ = os.path.dirname(path)
+    dot_path = os.path.basename(path).replace('.py', '')
+    with _IMPORT_LOCK:
+        if m.namespace is None or m.namespace not in sys.modules:
+            m.namespace = '_hotswapping_{}_{}'.format(
+                re.sub('\W', '_', os.path.basename(dir_)), next(_namespace_serials)
+            )
+            package = types.ModuleType(m.namespace)
+            package.__path__ = [dir_]
+            sys.modules[m.namespace] = package
+        prefix = m.namespace + '.'
+        before = None if prefix + dot_path in sys.modules and not reuse else set(sys.modules)
+        for name, mod_ in (reuse or dict()).items():
+            sys.modules[prefix + name] = mod_
+            if '.' not in name:
+                setattr(sys.modules[m.namespace], name, mod_)
+        recorder = _ImportRecorder(record_graph)
+        try:
+            with _source_loader_scope(dir_), _NamespaceFinder(m.namespace, dir_), recorder:
+                return importlib.import_module(prefix + dot_path)
+        except Exception, e:
+            return None
+        finally:
+            if before is not None:
+                m.loaded_modules = [m.namespace] + [prefix + name for name in reuse or ()] + [
+                    symbol for symbol in set(sys.modules) - before if symbol.startswith(prefix)
+                ]
+                if record_graph:
+                    _record_graph(m, prefix, recorder.edges, reuse)
+
+
+class _NamespaceFinder(object):
+    """
+    Maps the absolute imports of the modules found in a descriptor's directory (import foo, or import foo.bar, in a
+    module using from __future__ import absolute_import) to the descriptor's namespace (<namespace>.foo) while
+    load(m, isolated=True) imports it; as in the default mode, what sys.path provides takes precedence
+    """
+
+    def __init__(self, namespace, dir_path):
+        self.prefix = namespace + '.'
+        self.dir_path = os.path.abspath(dir_path)
+
+    def __enter__(self):
+        sys.meta_path.insert(0, self)
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        sys.meta_path.remove(self)
+
+    def _local(self, name):
+        return os.path.isfile(os.path.join(self.dir_path, name + '.py')) or \
+            os.path.isfile(os.path.join(self.dir_path, name, '__init__.py'))
+
+    def find_module(self, fullname, path=None):
+        top = fullname.partition('.')[0]
+        if fullname.startswith(self.prefix) or top in sys.builtin_module_names or not self._local(top):
+            return None
+        if path is not None:
+            # a submodule of a package this finder mapped
+            return self if any(os.path.abspath(_).startswith(self.dir_path + os.sep) for _ in path) else None
+        try:
+            f, _, _ = imp.find_module(top, [_ for _ in sys.path if os.path.abspath(_ or '.') != self.dir_path])
+        except ImportError, e:
+            return self
+        if f is not None:
+            f.close()
+        return None
+
+    def load_module(self, fullname):
+        return importlib.import_module(self.prefix + fullname)
+
+
+class _ImportRecorder(object):
+    """
+    Records the (importer, imported) module names of the import statements the entering thread executes while it is
+    entered; does nothing unless enabled. The import hook is only removed if nothing replaced it in the meantime
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.edges = set()
+        self._import = None
+        self._hook = None
+
+    def __enter__(self):
+        if not self.enabled:
+            return
+        real_import = self._import = __builtin__.__import__
+        edges = self.edges
+        thread = threading.current_thread()
+
+        def _(name, globals=None, locals=None, fromlist=None, level=-1):
+            mod_ = real_import(name, globals, locals, fromlist, level)
+            if threading.current_thread() is not thread:
+                return mod_
+            importer = globals.get('__name__') if globals else None
+            imported = getattr(mod_, '__name__', None)
+            if importer and imported:
+                if not fromlist and '.' in name:
+                    # import a.b returns a
+                    imported += name[name.index('.'):]
+                edges.add((importer, imported))
+                for item in fromlist or ():
+                    edges.add((importer, imported + '.' + item))
+            return mod_
+
+        __builtin__.__import__ = self._hook = _
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self._hook is not None and __builtin__.__import__ is self._hook:
+            __builtin__.__import__ = self._import
+        self._hook = None
+
+
+def _source_file(mod_):
+    path = getattr(mod_, '__file__', None)
+    if not isinstance(path, basestring):
+        return None
+    if path.endswith(('.pyc', '.pyo')):
+        path = path[:-1]
+    return os.path.abspath(path) if path.endswith('.py') else None
+
+
+def _file_digest(path):
+    if CONTENT_STORE is not None:
+        return CONTENT_STORE.digest(path)
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def _record_graph(m, prefix, edges, reuse):
+    """
+    Populate m.sources and m.dependencies from the modules recorded in m.loaded_modules and the recorded imports,
+    leaving out the reused modules (stage() carries their entries over)
+    """
+    dir_ = os.path.abspath(os.path.dirname(m.fs_path))
+    names = dict()
+    sources = dict()
+    for symbol in m.loaded_modules:
+        if not symbol.startswith(prefix) or symbol == prefix[:-1]:
+            continue
+        name = symbol[len(prefix):]
+        if reuse and name in reuse:
+            continue
+        file_ = _source_file(sys.modules.get(symbol))
+        if file_ is None:
+            continue
+        try:
+            st = os.stat(file_)
+            sources[name] = (os.path.relpath(file_, dir_), _file_digest(file_), st.st_size, st.st_mtime, file_)
+        except (IOError, OSError), e:
+            continue
+        names[symbol] = name
+    for name in reuse or ():
+        names[prefix + name] = name
+    dependencies = dict((name, set()) for name in sources)
+    for importer, imported in edges:
+        if importer in names and imported in names and names[importer] in dependencies:
+            dependencies[names[importer]].add(names[imported])
+    m.sources = sources
+    m.dependencies = dependencies
+
+
+def _module_dir(mod_):
+    """
+
+    Args:
+        mod_ (types.ModuleType):
+
+    Returns:
+        str: absolute path of the directory holding the module file, or None
+    """
+    mod_fs_path = getattr(mod_, '__file__', None)
+
+    # caught at Wt, the value of __file__ can sometime be a function object
+    if not isinstance(mod_fs_path, basestring):
+        return None
+
+    mod_dir = os.path.dirname(mod_fs_path)
+    if not mod_dir:
+        return None
+    return os.path.abspath(mod_dir)
+
+
+def _introduced_modules(before, dir_):
+    """
+
+    Args:
+        before (set): sys.modules keys before the import
+        dir_ (str): the directory the import was made from
+
+    Returns:
+        list: the new sys.modules keys whose module file lives in dir_
+    """
+    dir_ = os.path.abspath(dir_)
+    return [symbol for symbol in set(sys.modules) - before if _module_dir(sys.modules[symbol]) == dir_]
+
+
+def unload(m):
+    """
+    Only visits the modules recorded by load() when the descriptor carries such a record; scans sys.modules otherwise
+
+    Args:
+        m (ModuleDescriptor):
+
+    Returns:
+        int: number of module unloaded
+    """
+    return len(_detach(m))
+
+
+@_instrumented('unload', count=len)
+def _detach(m):
+    """
+    Remove the modules of the given descriptor from sys.modules, see unload()
+
+    Args:
+        m (ModuleDescriptor):
+
+    Returns:
+        dict: the removed sys.modules entries
+    """
+    removed = dict()
+    namespace = getattr(m, 'namespace', None)
+    if namespace:
+        return _detach_namespace(namespace, getattr(m, 'loaded_modules', None))
+    dir_ = os.path.dirname(m.fs_path)
+    if not dir_:
+        return removed
+    dir_ = os.path.abspath(dir_)
+    symbols = getattr(m, 'loaded_modules', None)
+    sources = getattr(m, 'sources', None) or dict()
+    with _IMPORT_LOCK:
+        if symbols is None:
+            symbols = sys.modules.keys()
+        for symbol in symbols:
+            mod_ = sys.modules.get(symbol)
+            # a module carried over from an earlier version lives in that version's directory
+            if _module_dir(mod_) == dir_ or (symbol in sources and _source_file(mod_) == sources[symbol][4]):
+                del sys.modules[symbol]
+                removed[symbol] = mod_
+    return removed
+
+
+def _adopt(old_m, new_m):
+    """
+    Hand the modules of old_m over to new_m
+
+    Returns:
+        types.ModuleType: the module of new_m; None if the old modules can not be handed over
+    """
+    prefix = old_m.namespace + '.' if old_m.namespace else ''
+    mod_ = sys.modules.get(prefix + os.path.basename(new_m.fs_path).replace('.py', ''))
+    if mod_ is None or old_m.loaded_modules is None:
+        return None
+    new_m.loaded_modules, new_m.namespace = old_m.loaded_modules, old_m.namespace
+    new_m.sources, new_m.dependencies = old_m.sources, old_m.dependencies
+    old_m.loaded_modules, old_m.namespace = list(), None
+    return mod_
+
+
+def _reusable_modules(old_m, new_m, stash):
+    """
+
+    Args:
+        old_m (ModuleDescriptor): detached
+        new_m (ModuleDescriptor):
+        stash (dict): what _detach(old_m) returned
+
+    Returns:
+        dict: module name => old module object that the new version can reuse
+    """
+    if not old_m.sources or old_m.dependencies is None:
+        return dict()
+    new_dir = os.path.abspath(os.path.dirname(new_m.fs_path))
+    changed = [name for name, entry in old_m.sources.items()
+               if not _same_source(entry, os.path.join(new_dir, entry[0]))]
+    dependents = collections.defaultdict(set)
+    for name, dependencies in old_m.dependencies.items():
+        for dependency in dependencies:
+            dependents[dependency].add(name)
+    dirty = set(changed)
+    while changed:
+        for name in dependents[changed.pop()]:
+            if name not in dirty:
+                dirty.add(name)
+                changed.append(name)
+    prefix = old_m.namespace + '.' if old_m.namespace else ''
+    return dict((name, stash[prefix + name]) for name in old_m.sources
+                if name not in dirty and stash.get(prefix + name) is not None)
+
+
+def _same_source(entry, path):
+    _, digest, size, mtime, file_ = entry
+    try:
+        st = os.stat(path)
+        if st.st_size != size:
+            return False
+        if path == file_ and st.st_mtime == mtime:
+            return True
+        return _file_digest(path) == digest
+    except (IOError, OSError), e:
+        return False
+
+
+def _detach_namespace(namespace, symbols):
+    removed = dict()
+    prefix = namespace + '.'
+    with _IMPORT_LOCK:
+        if symbols is None:
+            symbols = sys.modules.keys()
+        for symbol in symbols:
+            if (symbol == namespace or symbol.startswith(prefix)) and symbol in sys.modules:
+                mod_ = sys.modules.pop(symbol)
+
+                # None entries are the misses of the implicit relative imports made from inside the package
+                if mod_ is not None:
+                    removed[symbol] = mod_
+    return removed
+
+
+def stage(old_m, new_m, smoke_check=None, isolated=False, incremental=False):
+    """
+    Import a new version of a module before retiring the old one
+
+    The old modules are set aside (not destroyed) while the new ones are imported. If the import fails or smoke_check
+    rejects the new module, the new modules are unloaded and the old ones are put back; otherwise the old ones are
+    dropped, which is what unload() does. smoke_check runs without the import lock held, so that a slow check does
+    not hold up the imports of the other getters
+
+    With CONTENT_STORE set, a new version identical to the old one is not imported: the new descriptor takes the
+    old modules over
+
+    In incremental mode, the old modules whose source is the same in the new version (same size and mtime for the
+    same file, same digest otherwise) and which only import such modules are carried over to the new version instead
+    of being executed again; only the changed modules and the modules importing them, directly or not, are
+
+    Args:
+        old_m (ModuleDescriptor): may be None
+        new_m (ModuleDescriptor):
+        smoke_check (function): optional; receives the new module, returns False (or raises) to reject it
+        isolated (bool): see load()
+        incremental (bool):
+
+    Returns:
+        types.ModuleType: the new module; None if it was rejected
+    """
+    with _IMPORT_LOCK:
+        if old_m is not None and CONTENT_STORE is not None and CONTENT_STORE.identical(old_m, new_m):
+            mod_ = _adopt(old_m, new_m)
+            if mod_ is not None:
+                return mod_
+        stash = _detach(old_m) if old_m is not None else dict()
+        reuse = _reusable_modules(old_m, new_m, stash) if incremental and old_m is not None else None
+        mod_ = load(new_m, isolated=isolated, reuse=reuse, record_graph=incremental)
+        if mod_ is None:
+            unload(new_m)
+            sys.modules.update(stash)
+            return None
+    accepted = True
+    if smoke_check is not None:
+        try:
+            accepted = bool(smoke_check(mod_))
+        except Exception:
+            accepted = False
+    with _IMPORT_LOCK:
+        if not accepted:
+            unload(new_m)
+            sys.modules.update(stash)
+            return None
+        if reuse:
+            if new_m.sources is not None:
+                for name in reuse:
+                    new_m.sources[name] = old_m.sources[name]
+                    new_m.dependencies[name] = set(old_m.dependencies.get(name, ()))
+            if not old_m.namespace:
+                # the reused modules are the new version's now, under the same names
+                old_m.loaded_modules = list()
+        return mod_
+
+
+def _from_json(o):
+    if isinstance(o, unicode):
+        return o.encode('utf-8')
+    if isinstance(o, dict):
+        return dict((_from_json(k), _from_json(v)) for k, v in o.iteritems())
+    if isinstance(o, list):
+        return [_from_json(_) for _ in o]
+    return o
+
+
+class DescriptorSnapshot(object):
+    """
+    A JSON file of the module descriptors the getters last served (path, mtime and version_meta), keyed by the
+    package or the path each getter was created with, so that a restarted process serves without resolving every
+    package first
+
+    A getter given a snapshot starts with the recorded descriptor, provided that its file is still there with the
+    recorded mtime. The recorded packages are then checked against their daos in a background thread, <delay> seconds
+    after the first of them is queued, all the packages queued by then being resolved in one DaoI.resolve() call per
+    dao; a getter whose recorded descriptor turns
+    out to be stale is moved to the resolved one, unless it has renewed in the meantime. The swaps are recorded, and
+    the file is rewritten (replaced in one rename) by the background thread
+    """
+
+    FORMAT = 1
+
+    def __init__(self, path, verify=True, delay=0.05):
+        """
+
+        Args:
+            path (str): created on the first change if it does not exist
+            verify (bool): check the recorded packages against their daos; if False the snapshot is trusted
+            delay (float): seconds; lets the getters created together (e.g. at startup) be checked together
+        """
+        self.path = path
+        self.verify = verify
+        self.delay = delay
+        self.entries = self._read()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self._lock = threading.Lock()
+        self._idle = threading.Event()
+        self._idle.set()
+        self._dirty = False
+
+        # (key, weak reference to the getter, recorded descriptor, dao)
+        self._pending = list()
+
+        # the background thread runs while there is work, and is started again by the next change
+        self._thread = None
+        self._pid = None
+
+    def _read(self):
+        try:
+            with open(self.path) as f:
+                data = _from_json(json.load(f))
+        except (IOError, ValueError):
+            return dict()
+        if not isinstance(data, dict) or data.get('format') != self.FORMAT:
+            return dict()
+        return data.get('entries') or dict()
+
+    def descriptor(self, key):
+        """
+
+        Args:
+            key (str):
+
+        Returns:
+            ModuleDescriptor: the recorded descriptor; None if there is none or its file has changed
+        """
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        try:
+            mtime = os.stat(entry['fs_path'])[stat.ST_MTIME]
+        except (OSError, KeyError):
+            return None
+        if mtime != entry.get('fs_mtime'):
+            return None
+        m = ModuleDescriptor()
+        m.birth_time = time.time()
+        m.fs_mtime = mtime
+        m.fs_path = entry['fs_path']
+        m.deprecated = False
+        m.version_meta = entry.get('version_meta')
+        return m
+
+    def restore(self, getter, key, create, dao=None):
+        """
+        Assign a getter the descriptor it starts with; the getter has it before the background check may replace it
+
+        Args:
+            getter (BaseSymbolGetter):
+            key (str):
+            create (function): creates the descriptor when the snapshot has none
+            dao (DaoI): optional; the recorded package is checked against it in the background
+
+        Returns:
+            ModuleDescriptor:
+        """
+        m = self.descriptor(key)
+        if m is None:
+            self.misses += 1
+            m = getter.m = create()
+            if m is not None:
+                self.record(key, m)
+            return m
+        self.hits += 1
+        getter.m = m
+        if self.verify and dao is not None and m.version_meta:
+            with self._lock:
+                self._pending.append((key, weakref.ref(getter), m, dao))
+                self._notify()
+        return m
+
+    def record(self, key, m):
+        """
+
+        Args:
+            key (str):
+            m (ModuleDescriptor):
+        """
+        entry = dict(fs_path=m.fs_path, fs_mtime=m.fs_mtime, version_meta=m.version_meta)
+        with self._lock:
+            if self.entries.get(key) == entry:
+                return
+            self.entries[key] = entry
+            self._dirty = True
+            self._notify()
+
+    def _notify(self):
+        self._idle.clear()
+        if self._thread is None or self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='hotswapping-snapshot')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def after_fork(self):
+        """
+        To be called in the child process: the lock may have been held by the background thread of the parent, which
+        does not exist in the child
+        """
+        self._lock = threading.Lock()
+        self._idle = threading.Event()
+        self._idle.set()
+        self._thread = None
+        with self._lock:
+            if self._pending or self._dirty:
+                self._notify()
+
+    def wait(self, timeout=None):
+        """
+        Wait for the background checks and writes to complete
+
+        Returns:
+            bool: False on timeout
+        """
+        return self._idle.wait(timeout)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._pending and not self._dirty:
+                    self._thread = None
+                    self._idle.set()
+                    return
+                delay = self.delay if self._pending else 0
+            if delay > 0:
+                time.sleep(delay)
+            with self._lock:
+                pending, self._pending = self._pending, list()
+            try:
+                self.check(pending)
+                self.save()
+            except Exception:
+                continue
+
+    def check(self, pending):
+        """
+
+        Args:
+            pending (list): (key, weak reference to the getter, recorded descriptor, dao)
+
+        Returns:
+            int: number of stale descriptors
+        """
+        groups = collections.OrderedDict()
+        for item in pending:
+            groups.setdefault(id(item[3]), list()).append(item)
+        num_stale = 0
+        for items in groups.values():
+            dao = items[0][3]
+            try:
+                resolved = create_descriptors_from_package_dao([m.version_meta['package'] for _, _, m, _ in items],
+                                                               dao)
+            except Exception:
+                continue
+            for (key, ref, m, _), new_m in zip(items, resolved):
+                if new_m is None or (new_m.fs_path, new_m.fs_mtime, new_m.version_meta) == \
+                        (m.fs_path, m.fs_mtime, m.version_meta):
+                    continue
+                num_stale += 1
+                self.record(key, new_m)
+                getter = ref()
+                if getter is None:
+                    continue
+                with getter._lock:
+                    if getter.m is not m:
+                        continue
+                    if getter._live[1] is None:
+                        getter.m = new_m
+                    else:
+                        getter.swap(new_m)
+        self.stale += num_stale
+        return num_stale
+
+    def save(self):
+        """
+        Write the file if anything changed since it was read or written
+
+        Returns:
+            bool: True if the file is written
+        """
+        with self._lock:
+            if not self._dirty:
+                return False
+            text = json.dumps(dict(format=self.FORMAT, entries=self.entries), sort_keys=True)
+            self._dirty = False
+        tmp = '{}.{}.tmp'.format(self.path, os.getpid())
+        with open(tmp, 'w') as f:
+            f.write(text)
+        os.rename(tmp, self.path)
+        return True
+
+
+class BaseSymbolGetter(object):
+    """
+    Shared get_all() implementation; subclasses populate self.m and implement renew()
+
+    The imported module and the symbols resolved from it are cached against the current module descriptor, so that
+    once a module is live a lookup is a dictionary access; the cache is dropped only when a new descriptor is swapped in
+
+    When a RenewalManager (such as a BackgroundReloader) is given, get_all() no longer evaluates the renewal rules;
+    the manager renews the getter instead
+
+    Thread safety: readers take a snapshot of self._live and take no lock in the steady state. When due() says a
+    renewal may be needed, a reader only try-acquires the writer lock; whoever gets it builds the new generation while
+    the others keep serving the current one, and the new generation is published in one assignment
+    """
+
+    def __init__(self, reloader=None, smoke_check=None, isolated=False, incremental=False, snapshot=None):
+        """
+
+        Args:
+            reloader (RenewalManager): optional; renews this getter on the caller's behalf
+            smoke_check (function): optional; validates a new module before it is swapped in, see stage()
+            isolated (bool): import into a per-version namespace instead of through sys.path, see load()
+            incremental (bool): only execute the modules that changed, and those importing them; see stage()
+            snapshot (DescriptorSnapshot): optional; records the swaps, subclasses start from it
+        """
+        # (module descriptor, imported module, resolved symbols), published as a whole
+        self._live = (None, None, dict())
+        self._lock = threading.RLock()
+        self.reloader = reloader
+        self.smoke_check = smoke_check
+        self.isolated = isolated
+        self.incremental = incremental
+        self.snapshot = snapshot
+
+        # the key of this getter in the snapshot, set by subclasses
+        self.snapshot_key = None
+
+        # (fs_path, fs_mtime) of the versions that failed to import or were rejected by smoke_check => when; such a
+        # version is tried again <reject_for> seconds later, in case the failure was transient
+        self.rejected = dict()
+        self.reject_for = 600.0
+
+        # bumped after every change of module descriptor, see ModuleProxy
+        self.generation = 0
+
+    @property
+    def m(self):
+        return self._live[0]
+
+    @m.setter
+    def m(self, m):
+        self._live = (m, None, dict())
+        self.generation += 1
+
+    def renewer(self):
+        """
+
+        Returns:
+            RenewInterface: bound to this getter's search and timer rules
+        """
+        raise NotImplementedError()
+
+    def renew(self):
+        """
+
+        Returns:
+            ModuleDescriptor: a renewed ModuleDescriptor or None
+        """
+        return self.renewer().renew(self.m)
+
+    def due(self):
+        """
+        Side-effect free hint, see TimerRuleI.due()
+
+        Returns:
+            bool:
+        """
+        return True
+
+    def swap(self, m):
+        """
+        Import the module described by m and retire the current one (see stage()); the new module, with an empty
+        symbol cache, is published in one assignment. If the new module is rejected, the current one keeps serving and
+        the same version is not tried again for <reject_for> seconds
+
+        Args:
+            m (ModuleDescriptor):
+
+        Returns:
+            bool: True if the new module was swapped in
+        """
+        with self._lock:
+            key = m.fs_path, m.fs_mtime
+            old_m = self.m
+            rejected_at = self.rejected.get(key)
+            if rejected_at is not None and monotonic() - rejected_at < self.reject_for:
+                mod_ = None
+            else:
+                mod_ = stage(old_m, m, self.smoke_check, self.isolated, self.incremental)
+                if mod_ is None:
+                    self.rejected[key] = monotonic()
+                else:
+                    self.rejected.pop(key, None)
+            if mod_ is None:
+                if old_m is not None:
+                    old_m.deprecated = False
+                return False
+            self._live = (m, mod_, dict())
+            self.generation += 1
+            if INSTRUMENTATION is not None:
+                INSTRUMENTATION.swapped(m)
+            if self.snapshot is not None and self.snapshot_key is not None:
+                self.snapshot.record(self.snapshot_key, m)
+            return True
+
+    def refresh(self, blocking=True):
+        """
+        Evaluate the renewal rules and swap in the new module if there is one
+
+        Args:
+            blocking (bool): if False, give up immediately when another thread is renewing this getter
+
+        Returns:
+            bool: True if a new module was swapped in
+        """
+        if not self._lock.acquire(blocking):
+            return False
+        try:
+            _ = self.renew()
+            if _ is None:
+                return False
+            return self.swap(_)
+        finally:
+            self._lock.release()
 
     def __call__(self, symbol):
         return self.get_all([symbol, ]).get(symbol)
 
+    def _load_live(self):
+        m, module, cache = self._live
+        if module is None:
+            with self._lock:
+                m, module, cache = self._live
+                if module is None:
+                    module = load(m, isolated=self.isolated, record_graph=self.incremental)
+                    if module is not None:
+                        self._live = (m, module, cache)
+                        if INSTRUMENTATION is not None:
+                            INSTRUMENTATION.serving(m)
+        return module, cache
+
+    def preload(self, symbols=()):
+        """
+        Import the current module without evaluating the renewal rules, e.g. in the master process of a prefork
+        server so that the workers share the imported module instead of each importing it after fork
+
+        Args:
+            symbols (list): optional; also resolved and cached
+
+        Returns:
+            bool: True if the module is imported
+        """
+        module, cache = self._load_live()
+        if module is None:
+            return False
+        for symbol in symbols:
+            if symbol not in cache:
+                cache[symbol] = getattr(module, symbol, None)
+        return True
+
+    def proxy(self, symbol=None):
+        """
+
+        Args:
+            symbol (str): optional
+
+        Returns:
+            object: a ModuleProxy, or a SymbolProxy if a symbol is given
+        """
+        if symbol is None:
+            return ModuleProxy(self)
+        return SymbolProxy(self, symbol)
+
+    def get_all(self, symbols):
+        """
+
+        Args:
+            symbols (list):
+
+        Returns:
+            dict: a dictionary whose keys are the symbols, whose values are those imported objects
+        """
+        if self.reloader is None and self.due():
+            self.refresh(blocking=False)
+        return self._resolve(symbols)
+
+    def _resolve(self, symbols):
+        module, cache = self._load_live()
+        if module is None:
+            return dict()
+        d = dict()
+        for symbol in symbols:
+            try:
+                o = cache[symbol]
+            except KeyError:
+                o = cache[symbol] = getattr(module, symbol, None)
+            if o is not None:
+                d[symbol] = o
+        return d
+
+    def __del__(self):
+        unload(self.m)
+
+
+class SymbolGetter(BaseSymbolGetter):
+
+    def __init__(self, module_fs_path, max_age=3600, reloader=None, watcher=None, smoke_check=None, isolated=False,
+                 registry=None, incremental=False, snapshot=None, timer_rule=None):
+        """
+
+        Args:
+            module_fs_path (str):
+            max_age (float): seconds; ignored when timer_rule is given
+            reloader (RenewalManager): optional
+            watcher (FsWatcherI): optional; when given, renewal is driven by filesystem events and max_age is ignored
+            smoke_check (function): optional
+            isolated (bool): optional
+            registry (SharedRegistry): optional; shares the searches with the other processes using the registry
+            incremental (bool): optional
+            snapshot (DescriptorSnapshot): optional; starts from the descriptor recorded for this path, if any
+            timer_rule (TimerRuleI): optional; defaults to MaxAge(max_age), or FsEvents(watcher) with a watcher
+        """
+        super(SymbolGetter, self).__init__(reloader=reloader, smoke_check=smoke_check, isolated=isolated,
+                                           incremental=incremental, snapshot=snapshot)
+        if snapshot is None:
+            self.m = create_descriptor_from_fs(module_fs_path)
+        else:
+            self.snapshot_key = 'path:{}'.format(os.path.abspath(module_fs_path))
+            snapshot.restore(self, self.snapshot_key, lambda: create_descriptor_from_fs(module_fs_path))
+        if watcher is None:
+            self.search_rule = NewerSemanticVersion(check_existence=True)
+            self.timer_rule = MaxAge(max_age) if timer_rule is None else timer_rule
+        else:
+            self.search_rule = NewerVersionOrModified(check_existence=True)
+            self.timer_rule = FsEvents(watcher) if timer_rule is None else timer_rule
+        if registry is not None:
+            self.search_rule = SharedSearch(self.search_rule, registry)
+        if reloader is not None:
+            reloader.register(self)
+
+    def renewer(self):
+        return RenewFSModule(self.search_rule, self.timer_rule)
+
+    def due(self):
+        return self.timer_rule.due(self.m)
+
+
+class SymbolGetterPackageDao(BaseSymbolGetter):
+
+    def __init__(self, package, dao, max_age=3600, reloader=None, smoke_check=None, isolated=False, registry=None,
+                 incremental=False, snapshot=None, timer_rule=None):
+        """
+
+        Args:
+            package (str):
+            dao (DaoI):
+            max_age (float): seconds; ignored when timer_rule is given
+            reloader (RenewalManager): optional
+            smoke_check (function): optional
+            isolated (bool): optional
+            registry (SharedRegistry): optional; shares the searches with the other processes using the registry
+            incremental (bool): optional
+            snapshot (DescriptorSnapshot): optional; starts from the descriptor recorded for this package, if any
+            timer_rule (TimerRuleI): optional; defaults to MaxAge(max_age)
+        """
+        super(SymbolGetterPackageDao, self).__init__(reloader=reloader, smoke_check=smoke_check, isolated=isolated,
+                                                     incremental=incremental, snapshot=snapshot)
+        if snapshot is None:
+            self.m = create_descriptor_from_package_dao(package, dao)
+        else:
+            # the recorded descriptor is checked against the dao in the background
+            self.snapshot_key = 'package:{}'.format(package)
+            snapshot.restore(self, self.snapshot_key, lambda: create_descriptor_from_package_dao(package, dao),
+                             dao=dao)
+        self.search_rule = NewerPackageVersion(dao)
+        if registry is not None:
+            self.search_rule = SharedSearch(self.search_rule, registry)
+        self.timer_rule = MaxAge(max_age=max_age) if timer_rule is None else timer_rule
+        if reloader is not None:
+            reloader.register(self)
+
+    def renewer(self):
+        return RenewPackageModule(self.search_rule, self.timer_rule)
+
+    def due(self):
+        return self.timer_rule.due(self.m)
+
+
+class ModuleProxy(object):
+    """
+    Stands for the current version of a getter's module: proxy.Doer is the Doer of whichever version is live
+
+    The attributes are cached until the getter's generation changes, so that once the module is live an access costs
+    the renewal hint (see BaseSymbolGetter.due(); nothing when a reloader renews the getter) and an integer compare
+    """
+
+    __slots__ = ('_getter', '_generation', '_module', '_attrs')
+
+    def __init__(self, getter):
+        """
+
+        Args:
+            getter (BaseSymbolGetter):
+        """
+        self._getter = getter
+        self._generation = -1
+        self._module = None
+        self._attrs = dict()
+
+    def _current(self):
+        getter = self._getter
+        if getter.reloader is None and getter.due():
+            getter.refresh(blocking=False)
+        if getter.generation != self._generation:
+            # the generation is read before the module: a swap in between makes the next access resolve again
+            generation = getter.generation
+            module, _ = getter._load_live()
+            if module is None:
+                raise ImportError('can not import {}'.format(getter.m.fs_path if getter.m else None))
+            self._module, self._attrs, self._generation = module, dict(), generation
+        return self._attrs
+
+    def __getattr__(self, name):
+        attrs = self._current()
+        try:
+            return attrs[name]
+        except KeyError:
+            value = attrs[name] = getattr(self._module, name)
+            return value
+
+    def __repr__(self):
+        return '<ModuleProxy of {!r}>'.format(self._module)
+
+
+class SymbolProxy(ModuleProxy):
+    """
+    Stands for the current version of a symbol, typically a class or function: proxy(...) calls it and proxy.attr
+    reads its attributes
+    """
+
+    __slots__ = ('_symbol', '_target')
+
+    def __init__(self, getter, symbol):
+        """
+
+        Args:
+            getter (BaseSymbolGetter):
+            symbol (str):
+        """
+        super(SymbolProxy, self).__init__(getter)
+        self._symbol = symbol
+        self._target = None
+
+    def _current(self):
+        generation = self._generation
+        attrs = super(SymbolProxy, self)._current()
+        if self._generation != generation:
+            try:
+                self._target = getattr(self._module, self._symbol)
+            except AttributeError:
+                self._generation = -1
+                raise
+        return attrs
+
+    def __call__(self, *args, **kwargs):
+        self._current()
+        return self._target(*args, **kwargs)
+
+    def __getattr__(self, name):
+        attrs = self._current()
+        try:
+            return attrs[name]
+        except KeyError:
+            value = attrs[name] = getattr(self._target, name)
+            return value
+
+    def __repr__(self):
+        return '<SymbolProxy of {!r}>'.format(self._target)
+
+
+class FutureTimeoutError(Exception):
+    pass
+
+
+class Future(object):
+    """
+    The result of an operation running in another thread; a subset of the concurrent.futures.Future interface, so that
+    event loops that know how to wait for those (e.g. tornado) can wait for it without blocking
+    """
+
+    def __init__(self):
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+        self._result = None
+        self._error = None
+        self._callbacks = list()
+
+    def done(self):
+        return self._done.is_set()
+
+    def result(self, timeout=None):
+        if not self._done.wait(timeout):
+            raise FutureTimeoutError()
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+    def exception(self, timeout=None):
+        if not self._done.wait(timeout):
+            raise FutureTimeoutError()
+        return self._error
+
+    def add_done_callback(self, fn):
+        """
+        fn receives the future; it is called right away if the future is done, in the completing thread otherwise
+        """
+        with self._lock:
+            if not self._done.is_set():
+                self._callbacks.append(fn)
+                return
+        fn(self)
+
+    def _complete(self, result, error):
+        with self._lock:
+            self._result, self._error = result, error
+            self._done.set()
+            callbacks, self._callbacks = self._callbacks, list()
+        for fn in callbacks:
+            try:
+                fn(self)
+            except Exception:
+                continue
+
+    def set_result(self, result):
+        self._complete(result, None)
+
+    def set_exception(self, error):
+        self._complete(None, error)
+
+
+class ThreadExecutor(object):
+    """
+    Runs the submitted functions in up to <max_workers> daemon threads; a worker keeps taking the queued functions and
+    exits when there are none left, so that bursts of submissions share the threads
+    """
+
+    def __init__(self, max_workers=1):
+        self.max_workers = max_workers
+        self._queue = collections.deque()
+        self._lock = threading.Lock()
+        self._num_workers = 0
+        self._pid = os.getpid()
+
+    def submit(self, fn, *args, **kwargs):
+        """
+
+        Returns:
+            Future:
+        """
+        future = Future()
+        with self._lock:
+            if self._pid != os.getpid():
+                # the workers of the parent do not exist in the child
+                self._pid, self._num_workers = os.getpid(), 0
+            self._queue.append((future, fn, args, kwargs))
+            if self._num_workers >= self.max_workers:
+                return future
+            self._num_workers += 1
+        t = threading.Thread(target=self._work, name='hotswapping-executor')
+        t.daemon = True
+        t.start()
+        return future
+
+    def _work(self):
+        while True:
+            with self._lock:
+                if not self._queue:
+                    self._num_workers -= 1
+                    return
+                future, fn, args, kwargs = self._queue.popleft()
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except Exception, e:
+                future.set_exception(e)
+
+
+class AsyncSymbolGetter(object):
+    """
+    Wraps a getter for callers that must not block, such as event loop callbacks and coroutines: get_all() returns a
+    Future instead of a dictionary
+
+    Once a module is live the future is already done: the symbols are resolved from the live module, and a renewal
+    that is due (directory scans, DAO round trips, import) is submitted to the executor without the caller waiting for
+    it. Only the first callers, before any module is live, wait for the renewal. The callers arriving while a renewal
+    is in flight share it rather than each submitting their own, and no renewal is submitted for the live module
+    within <spacing> seconds of the last one, since MaxAge keeps a descriptor due once it is older than max_age
+    """
+
+    def __init__(self, getter, executor=None, spacing=1.0):
+        """
+
+        Args:
+            getter (BaseSymbolGetter):
+            executor (object): optional; anything with a concurrent.futures style submit(), e.g. a ThreadPoolExecutor;
+                a ThreadExecutor by default
+            spacing (float): seconds
+        """
+        self.getter = getter
+        self.executor = executor if executor is not None else ThreadExecutor()
+        self.spacing = spacing
+        self._lock = threading.RLock()
+        self._inflight = None
+
+        # monotonic() time at which the last renewal completed
+        self._renewed_at = None
+
+    def _renew(self):
+        getter = self.getter
+        if getter.reloader is None and getter.due():
+            getter.refresh()
+        getter._load_live()
+
+    def renewal(self):
+        """
+
+        Returns:
+            Future: the renewal in flight, submitted if there is none
+        """
+        with self._lock:
+            inflight = self._inflight
+            if inflight is None:
+                inflight = self._inflight = self.executor.submit(self._renew)
+                inflight.add_done_callback(self._clear)
+            return inflight
+
+    def _clear(self, future):
+        with self._lock:
+            if self._inflight is future:
+                self._inflight = None
+            self._renewed_at = monotonic()
+
     def get_all(self, symbols):
         """
 
@@ -412,45 +3904,567 @@ class SymbolGetter(object):
             symbols (list):
 
         Returns:
-            dict: a dictionary whose keys are the symbols, whose values are those imported objects
+            Future: of what BaseSymbolGetter.get_all() returns
         """
-        _ = renew(self.m, self.search_rule, self.timer_rule)
-        if _ is not None:
-            unload(self.m)
-            self.m = _
-        d = dict()
-        for symbol in symbols:
-            o = getattr(load(self.m), symbol, None)
-            if o is not None:
-                d[symbol] = o
-        return d
+        getter = self.getter
+        ret = Future()
+        if getter._live[1] is not None:
+            renewed_at = self._renewed_at
+            if getter.reloader is None and (renewed_at is None or monotonic() - renewed_at >= self.spacing) and \
+                    getter.due():
+                self.renewal()
+            ret.set_result(getter._resolve(symbols))
+            return ret
 
-    def __del__(self):
-        unload(self.m)
+        def _(renewal):
+            try:
+                renewal.result()
+                ret.set_result(getter._resolve(symbols))
+            except Exception, e:
+                ret.set_exception(e)
 
+        self.renewal().add_done_callback(_)
+        return ret
 
-class SymbolGetterPackageDao(object):
+    def __call__(self, symbol):
+        """
 
-    def __init__(self, package, dao, max_age=3600):
-        self.m = create_descriptor_from_package_dao(package, dao)
-        self.search_rule = NewerPackageVersion(dao)
-        self.timer_rule = MaxAge(max_age=max_age)
+        Returns:
+            Future: of the symbol, None if it is not found
+        """
+        ret = Future()
 
-    def __call__(self, symbol):
-        return self.get_all([symbol, ]).get(symbol)
+        def _(d):
+            error = d.exception()
+            if error is not None:
+                ret.set_exception(error)
+            else:
+                ret.set_result(d.result().get(symbol))
+
+        self.get_all([symbol, ]).add_done_callback(_)
+        return ret
+
+
+class VersionSlot(object):
+    """
+    One resident version of a CanarySymbolGetter, with its share of the calls and its call statistics; the statistics
+    are updated under a lock of their own, since the calls come from the request threads
+    """
+
+    def __init__(self, m, module, weight, found=None):
+        """
+
+        Args:
+            m (ModuleDescriptor):
+            module (types.ModuleType):
+            weight (float): share of the calls routed to this version
+            found (object): optional, the search result this version was created from (see CanarySymbolGetter)
+        """
+        self.m = m
+        self.module = module
+        self.weight = weight
+        self.found = found
+        self.symbols = dict()
+        self.calls = 0
+        self.errors = 0
+        self.latency = 0.0
+        self._lock = threading.Lock()
 
     def get_all(self, symbols):
-        op = RenewPackageModule(self.search_rule, self.timer_rule)
-        _ = op.renew(self.m)
-        if _ is not None:
-            unload(self.m)
-            self.m = _
         d = dict()
         for symbol in symbols:
-            o = getattr(load(self.m), symbol, None)
+            try:
+                o = self.symbols[symbol]
+            except KeyError:
+                o = self.symbols[symbol] = getattr(self.module, symbol, None)
             if o is not None:
                 d[symbol] = o
         return d
 
+    def record(self, latency, error):
+        """
+
+        Returns:
+            int: the number of calls, this one included
+        """
+        with self._lock:
+            self.calls += 1
+            self.latency += latency
+            if error:
+                self.errors += 1
+            return self.calls
+
+    def error_rate(self):
+        return self.errors / float(self.calls) if self.calls else 0.0
+
+    def mean_latency(self):
+        return self.latency / self.calls if self.calls else 0.0
+
+    def stats(self):
+        with self._lock:
+            return dict(fs_path=self.m.fs_path, version_meta=self.m.version_meta, weight=self.weight,
+                        calls=self.calls, errors=self.errors, mean_latency=self.mean_latency())
+
+
+class CanarySymbolGetter(object):
+    """
+    Keeps several versions of a module loaded side by side (in isolated mode, see load()) and routes each call to one
+    of them
+
+    The first version is the stable one. Each newer version found by the renewer starts as a canary receiving
+    <canary_weight> of the calls, chosen at random or by hashing a caller supplied key (so that a given key sticks to
+    a version). Calls made through invoke() are timed and their errors counted per version: a canary whose error rate
+    exceeds <max_error_rate> (or whose mean latency exceeds <max_latency_ratio> times the stable one) after
+    <min_calls> calls is rolled back and never tried again; a healthy canary is promoted to stable after
+    <promote_after> calls, and the versions older than it are unloaded
+
+    A rejected version stays the newest one found by the search rule, so its search result is remembered as well and
+    refresh() returns before creating a descriptor for it (a DaoI.resolve() call for a package)
+    """
+
+    def __init__(self, renewer, m, canary_weight=0.01, max_versions=2, min_calls=100, promote_after=1000,
+                 max_error_rate=0.01, max_latency_ratio=None, smoke_check=None):
+        """
+
+        Args:
+            renewer (RenewInterface): e.g. RenewFSModule(NewerSemanticVersion(True), MaxAge(60)) or
+                RenewPackageModule(NewerPackageVersion(dao), MaxAge(60))
+            m (ModuleDescriptor): the stable version
+            canary_weight (float): share of the calls routed to each canary
+            max_versions (int): the stable version included; the oldest canary makes room for a newer one
+            min_calls (int): calls needed before a canary can be rolled back
+            promote_after (int): calls needed before a canary can be promoted
+            max_error_rate (float):
+            max_latency_ratio (float): optional
+            smoke_check (function): optional, see stage()
+        """
+        self.renewer = renewer
+        self.canary_weight = canary_weight
+        self.max_versions = max_versions
+        self.min_calls = min_calls
+        self.promote_after = promote_after
+        self.max_error_rate = max_error_rate
+        self.max_latency_ratio = max_latency_ratio
+        self.smoke_check = smoke_check
+        self.rejected = set()
+        self._rejected_found = set()
+        self._lock = threading.RLock()
+
+        # stable version first, then the canaries from the oldest to the newest; published as a whole
+        self._slots = (VersionSlot(m, load(m, isolated=True), 1.0), )
+
+    @property
+    def slots(self):
+        return self._slots
+
+    def stats(self):
+        """
+
+        Returns:
+            list: a dictionary of statistics per resident version, stable version first
+        """
+        return [slot.stats() for slot in self._slots]
+
+    def route(self, key=None):
+        """
+
+        Args:
+            key (object): optional; calls with the same key go to the same version
+
+        Returns:
+            VersionSlot:
+        """
+        slots = self._slots
+        if len(slots) == 1:
+            return slots[0]
+        if key is None:
+            point = random.random()
+        else:
+            point = (zlib.crc32(str(key)) & 0xffffffff) / 4294967296.0
+        threshold = 0.0
+        for slot in reversed(slots[1:]):
+            threshold += slot.weight
+            if point < threshold:
+                return slot
+        return slots[0]
+
+    def refresh(self, blocking=True):
+        """
+        Look for a version newer than the newest resident one and load it as a canary
+
+        Returns:
+            bool: True if a canary was added
+        """
+        if not self._lock.acquire(blocking):
+            return False
+        try:
+            newest = self._slots[-1].m
+            if not self.renewer.timer_rule.retire(newest):
+                return False
+            found = _search(self.renewer.search_rule, newest)
+            found_key = self._found_key(found)
+            if found_key in self._rejected_found:
+                newest.deprecated = False
+                return False
+            new_m = self.renewer.renew_with(newest, found)
+            if new_m is None:
+                return False
+            newest.deprecated = False
+            key = new_m.fs_path, new_m.fs_mtime
+            if key in self.rejected:
+                self._rejected_found.add(found_key)
+                return False
+            mod_ = stage(None, new_m, self.smoke_check, isolated=True)
+            if mod_ is None:
+                self.rejected.add(key)
+                self._rejected_found.add(found_key)
+                return False
+            slots = self._slots
+            if len(slots) >= self.max_versions:
+                for slot in slots[1: len(slots) - self.max_versions + 2]:
+                    unload(slot.m)
+                slots = slots[:1] + slots[len(slots) - self.max_versions + 2:]
+            self._slots = slots + (VersionSlot(new_m, mod_, self.canary_weight, found=found_key), )
+            return True
+        finally:
+            self._lock.release()
+
+    def _found_key(self, found):
+        """
+        A path found by a file system search rule can be modified in place, so it is paired with its mtime; a package
+        name is immutable
+
+        Args:
+            found (str): what the search rule returned
+
+        Returns:
+            object:
+        """
+        if not found or not isinstance(self.renewer, RenewFSModule):
+            return found
+        try:
+            return found, os.path.getmtime(found)
+        except OSError, e:
+            return found, None
+
+    def get_all(self, symbols, key=None):
+        """
+
+        Args:
+            symbols (list):
+            key (object): optional, see route()
+
+        Returns:
+            dict: the symbols found in the version the call was routed to
+        """
+        if self.renewer.timer_rule.due(self._slots[-1].m):
+            self.refresh(blocking=False)
+        return self.route(key).get_all(symbols)
+
+    def __call__(self, symbol, key=None):
+        return self.get_all([symbol, ], key=key).get(symbol)
+
+    def invoke(self, symbol, args=(), kwargs=None, key=None):
+        """
+        Call a symbol of the routed version and account for its latency and outcome
+
+        Args:
+            symbol (str):
+            args (tuple):
+            kwargs (dict):
+            key (object): optional, see route()
+
+        Returns:
+            object: what the symbol returned
+        """
+        if self.renewer.timer_rule.due(self._slots[-1].m):
+            self.refresh(blocking=False)
+        slot = self.route(key)
+        func = slot.get_all([symbol, ]).get(symbol)
+        if func is None:
+            raise AttributeError('{} not found in {}'.format(symbol, slot.m.fs_path))
+        start = time.time()
+        error = True
+        try:
+            ret = func(*args, **(kwargs or dict()))
+            error = False
+            return ret
+        finally:
+            self.record(slot, time.time() - start, error)
+
+    def record(self, slot, latency, error):
+        """
+        Account for a call made to the given version, then promote or roll back the canary if it is due; the getter
+        lock is only taken then, when the canary is unhealthy or has had <promote_after> calls
+
+        Args:
+            slot (VersionSlot):
+            latency (float): seconds
+            error (bool):
+        """
+        calls = slot.record(latency, error)
+        if calls < self.min_calls or slot is self._slots[0]:
+            return
+        if calls >= self.promote_after or not self.healthy(slot):
+            self.evaluate(slot)
+
+    def healthy(self, slot):
+        if slot.error_rate() > self.max_error_rate:
+            return False
+        stable = self._slots[0]
+        if self.max_latency_ratio is not None and stable.calls:
+            return slot.mean_latency() <= stable.mean_latency() * self.max_latency_ratio
+        return True
+
+    def evaluate(self, slot):
+        """
+
+        Args:
+            slot (VersionSlot): a canary
+
+        Returns:
+            str: 'promoted', 'rolled back' or '' if nothing was done
+        """
+        with self._lock:
+            slots = self._slots
+            if slot not in slots[1:]:
+                return ''
+            if not self.healthy(slot):
+                self._slots = tuple(_ for _ in slots if _ is not slot)
+                self.rejected.add((slot.m.fs_path, slot.m.fs_mtime))
+                if slot.found:
+                    self._rejected_found.add(slot.found)
+                unload(slot.m)
+                return 'rolled back'
+            if slot.calls < self.promote_after:
+                return ''
+            i = slots.index(slot)
+            for retired in slots[:i]:
+                unload(retired.m)
+            slot.weight = 1.0
+            self._slots = slots[i:]
+            return 'promoted'
+
     def __del__(self):
-        unload(self.m)
+        for slot in self._slots:
+            unload(slot.m)
+
+
+class RenewalManager(object):
+    """
+    A registry of getters that are renewed together by tick()
+
+    The registered getters whose descriptors are retired are grouped by SearchRuleI.group_key(); each group is
+    searched once (one directory scan per version root, one DaoI.get_all() per package base name) and the result is
+    fanned out to the getters of the group. Getters are held by weak references
+
+    For prefork servers: preload() imports the current modules in the master before fork, and after_fork() is called
+    in each worker. With <stagger>, a new version found by a tick is swapped in by a later tick, after a delay derived
+    from the process id, so that the workers do not all re-import at the same moment
+    """
+
+    def __init__(self, stagger=0.0):
+        """
+
+        Args:
+            stagger (float): seconds; the swaps are spread over this window
+        """
+        self._getters = weakref.WeakSet()
+        self._lock = threading.Lock()
+        self.stagger = stagger
+
+        # getter => (new module descriptor, time at which to swap it in)
+        self._pending = weakref.WeakKeyDictionary()
+
+    def register(self, getter):
+        """
+
+        Args:
+            getter (BaseSymbolGetter):
+        """
+        with self._lock:
+            self._getters.add(getter)
+
+    def unregister(self, getter):
+        with self._lock:
+            self._getters.discard(getter)
+
+    def preload(self):
+        """
+        Import the current module of every registered getter
+
+        Returns:
+            int: number of getters whose module is imported
+        """
+        with self._lock:
+            getters = list(self._getters)
+        num_loaded = 0
+        for getter in getters:
+            try:
+                if getattr(getter, 'preload', None) is not None and getter.preload():
+                    num_loaded += 1
+            except Exception:
+                continue
+        return num_loaded
+
+    def after_fork(self):
+        """
+        To be called in the child process: the locks may have been held by a thread that does not exist in the child.
+        Resets the process-wide locks (see after_fork()), and those of the getters, their snapshots, their shared
+        registries and their caching daos
+        """
+        after_fork()
+        self._lock = threading.Lock()
+        reset = set()
+        for getter in list(self._getters):
+            if hasattr(getter, '_lock'):
+                getter._lock = threading.RLock()
+            rule = getattr(getter, 'search_rule', None)
+            for o in (getattr(getter, 'snapshot', None), getattr(rule, 'registry', None),
+                      getattr(getattr(rule, 'search_rule', rule), 'dao', None)):
+                if getattr(o, 'after_fork', None) is not None and id(o) not in reset:
+                    reset.add(id(o))
+                    o.after_fork()
+
+    def delay(self):
+        """
+
+        Returns:
+            float: seconds between finding a new version and swapping it in, in [0, stagger); it differs from one
+                process to another even though they fork from the same parent
+        """
+        if self.stagger <= 0:
+            return 0.0
+        return self.stagger * (zlib.crc32(str(os.getpid())) & 0xffffffff) / 4294967296.0
+
+    def _swap(self, getter, new_m):
+        if self.stagger <= 0:
+            return getter.swap(new_m)
+        self._pending[getter] = (new_m, time.time() + self.delay())
+        return False
+
+    def _swap_pending(self):
+        num_swapped = 0
+        now = time.time()
+        for getter, (new_m, swap_time) in list(self._pending.items()):
+            if swap_time > now:
+                continue
+            del self._pending[getter]
+            try:
+                if getter.swap(new_m):
+                    num_swapped += 1
+            except Exception:
+                continue
+        return num_swapped
+
+    def tick(self):
+        """
+        Renew all the registered getters once; a getter that raises does not prevent the others from being renewed.
+        A getter that is being renewed by another thread is skipped
+
+        Returns:
+            int: number of getters that swapped in a new module
+        """
+        with self._lock:
+            getters = list(self._getters)
+        num_swapped = self._swap_pending()
+        groups = collections.OrderedDict()
+        locked = list()
+        try:
+            for getter in getters:
+                try:
+                    if getter in self._pending:
+                        continue
+                    if not hasattr(getter, 'renewer'):
+                        if getter.refresh():
+                            num_swapped += 1
+                        continue
+                    if not getter.due() or not getter._lock.acquire(False):
+                        continue
+                    locked.append(getter)
+                    op = getter.renewer()
+                    m = getter.m
+                    if not op.timer_rule.retire(m):
+                        continue
+                    key = op.search_rule.group_key(m)
+                    if key is None:
+                        key = None, id(getter)
+                    groups.setdefault(key, list()).append((getter, op, m))
+                except Exception:
+                    continue
+            for members in groups.values():
+                try:
+                    num_swapped += self._renew_group(members, self._swap)
+                except Exception:
+                    continue
+        finally:
+            for getter in locked:
+                getter._lock.release()
+        return num_swapped
+
+    @staticmethod
+    def _renew_group(members, swap):
+        op = members[0][1]
+        ms = [m for _, _, m in members]
+        num_swapped = 0
+        for (getter, _, _), new_m in zip(members, op.renew_with_many(ms, _search_many(op.search_rule, ms))):
+            if new_m is not None and swap(getter, new_m):
+                num_swapped += 1
+        return num_swapped
+
+
+class BackgroundReloader(RenewalManager):
+    """
+    A daemon thread that periodically renews every registered getter, so that directory scans, unloading and
+    importing happen off the request path
+
+    The thread is started on the first registration
+    """
+
+    def __init__(self, interval=1.0, stagger=0.0):
+        """
+
+        Args:
+            interval (float): seconds between two ticks
+            stagger (float): see RenewalManager
+        """
+        super(BackgroundReloader, self).__init__(stagger=stagger)
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def register(self, getter):
+        super(BackgroundReloader, self).register(getter)
+        self.start()
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name='hotswapping-reloader')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stopped.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+
+    def after_fork(self):
+        """
+        To be called in the child process, where the thread of the parent does not exist; restarts it
+        """
+        super(BackgroundReloader, self).after_fork()
+        self._stopped = threading.Event()
+        self._thread = None
+        if len(self._getters):
+            self.start()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.tick()
+
+
+BACKGROUND_RELOADER = BackgroundReloader()
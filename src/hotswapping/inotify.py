@@ -0,0 +1,110 @@
+"""
+a minimal ctypes binding of the Linux inotify API, as used by hotswapping.InotifyWatcher
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import struct
+
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_EVENT = struct.Struct('iIII')
+
+_libc = None
+
+
+def _get_libc():
+    global _libc
+    if _libc is None:
+        _libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+    return _libc
+
+
+def available():
+    """
+
+    Returns:
+        bool: True if the C library exposes the inotify API
+    """
+    try:
+        libc = _get_libc()
+    except OSError:
+        return False
+    return hasattr(libc, 'inotify_init1') and hasattr(libc, 'inotify_add_watch')
+
+
+def _raise_errno():
+    e = ctypes.get_errno()
+    raise OSError(e, os.strerror(e))
+
+
+def init():
+    """
+
+    Returns:
+        int: a non-blocking inotify file descriptor
+    """
+    fd = _get_libc().inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+    if fd < 0:
+        _raise_errno()
+    return fd
+
+
+def add_watch(fd, path, mask):
+    """
+
+    Args:
+        fd (int): inotify file descriptor
+        path (str):
+        mask (int): IN_* flags
+
+    Returns:
+        int: the watch descriptor
+    """
+    wd = _get_libc().inotify_add_watch(fd, path, mask)
+    if wd < 0:
+        _raise_errno()
+    return wd
+
+
+def read_events(fd, buf_size=65536):
+    """
+
+    Args:
+        fd (int): inotify file descriptor
+        buf_size (int):
+
+    Returns:
+        list: (wd, mask, cookie, name) tuples; empty if there is no pending event
+    """
+    try:
+        buf = os.read(fd, buf_size)
+    except OSError, e:
+        if e.errno in (errno.EAGAIN, errno.EINTR):
+            return list()
+        raise
+    events = list()
+    offset = 0
+    while offset + _EVENT.size <= len(buf):
+        wd, mask, cookie, length = _EVENT.unpack_from(buf, offset)
+        offset += _EVENT.size
+        name = buf[offset: offset + length].rstrip('\0')
+        offset += length
+        events.append((wd, mask, cookie, name))
+    return events
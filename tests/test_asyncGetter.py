@@ -0,0 +1,103 @@
+
+import os
+import threading
+import unittest
+
+import hotswapping
+
+
+class GatedExecutor(hotswapping.ThreadExecutor):
+
+    def __init__(self):
+        super(GatedExecutor, self).__init__()
+        self.submitted = 0
+        self.gate = threading.Event()
+
+    def submit(self, fn, *args, **kwargs):
+        self.submitted += 1
+
+        def _():
+            self.gate.wait(5)
+            return fn(*args, **kwargs)
+
+        return super(GatedExecutor, self).submit(_)
+
+
+class TestAsyncSymbolGetter(unittest.TestCase):
+
+    def setUp(self):
+        self.module_path = os.path.abspath(
+            os.path.join(os.path.dirname(__file__), 'testdata', '1.0.2', 'foobar.py')
+        )
+        self.executor = GatedExecutor()
+
+    def test_steadyState_expectDoneRightAway(self):
+        getter = hotswapping.SymbolGetter(self.module_path, max_age=3600)
+        getter('FOOBAR')
+        sut = hotswapping.AsyncSymbolGetter(getter, self.executor)
+        future = sut('FOOBAR')
+        self.assertTrue(future.done())
+        self.assertEqual(3, future.result())
+        self.assertEqual(0, self.executor.submitted)
+
+    def test_concurrentCallers_expectOneRenewal(self):
+        getter = hotswapping.SymbolGetter(self.module_path, max_age=3600)
+        getter('FOOBAR')
+        getter.timer_rule.max_age = -1
+        sut = hotswapping.AsyncSymbolGetter(getter, self.executor)
+        futures = [sut('FOOBAR') for _ in range(10)]
+        self.assertTrue(all(future.done() for future in futures))
+        self.assertEqual([3] * 10, [future.result() for future in futures])
+        self.assertEqual(1, self.executor.submitted)
+        renewal = sut.renewal()
+        self.executor.gate.set()
+        renewal.result(5)
+        self.assertEqual(39, sut('FOOBAR').result())
+
+    def test_noLiveModule_expectCallersWaitForOneRenewal(self):
+        getter = hotswapping.SymbolGetter(self.module_path, max_age=-1)
+        sut = hotswapping.AsyncSymbolGetter(getter, self.executor)
+        futures = [sut('FOOBAR') for _ in range(10)]
+        self.assertFalse(any(future.done() for future in futures))
+        self.executor.gate.set()
+        self.assertEqual([39] * 10, [future.result(5) for future in futures])
+        self.assertEqual(1, self.executor.submitted)
+
+    def test_renewalFails_expectExceptionPropagated(self):
+        getter = hotswapping.SymbolGetter(self.module_path, max_age=-1)
+
+        def _(blocking=True):
+            raise RuntimeError()
+
+        getter.refresh = _
+        self.executor.gate.set()
+        future = hotswapping.AsyncSymbolGetter(getter, self.executor).get_all(['FOOBAR'])
+        self.assertIsInstance(future.exception(5), RuntimeError)
+        self.assertRaises(RuntimeError, future.result)
+
+    def test_noNewerVersion_expectRenewalsSpaced(self):
+        getter = hotswapping.SymbolGetter(self.module_path.replace('1.0.2', '2.1.0'), max_age=-1)
+        getter('FOOBAR')
+        self.executor.gate.set()
+        sut = hotswapping.AsyncSymbolGetter(getter, self.executor, spacing=3600)
+        sut.renewal().result(5)
+        self.assertEqual([39] * 200, [sut('FOOBAR').result(0) for _ in range(200)])
+        self.assertEqual(1, self.executor.submitted)
+
+    def test_threadExecutor_expectWorkerReused(self):
+        executor = hotswapping.ThreadExecutor()
+        gate = threading.Event()
+        executor.submit(gate.wait, 5)
+        futures = [executor.submit(lambda: threading.current_thread().ident) for _ in range(50)]
+        gate.set()
+        self.assertEqual(1, len(set(future.result(5) for future in futures)))
+
+    def test_timeout_expectFutureTimeoutError(self):
+        future = hotswapping.Future()
+        self.assertRaises(hotswapping.FutureTimeoutError, future.result, 0.01)
+        future.set_result(1)
+        self.assertEqual(1, future.result(0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import hotswapping
+
+
+class TestBytecodeCache(unittest.TestCase):
+
+    def setUp(self):
+        testdata = os.path.join(os.path.dirname(__file__), 'testdata')
+        self.v1 = os.path.abspath(os.path.join(testdata, '1.0.2', 'foobar.py'))
+        self.v2 = os.path.abspath(os.path.join(testdata, '2.1.0', 'foobar.py'))
+        self.cache_dir = tempfile.mkdtemp()
+        self.cache = hotswapping.BYTECODE_CACHE = hotswapping.BytecodeCache(self.cache_dir)
+
+    def tearDown(self):
+        hotswapping.BYTECODE_CACHE = None
+        shutil.rmtree(self.cache_dir)
+
+    def test_reload_expectCompiledOnce(self):
+        for _ in range(3):
+            m = hotswapping.create_descriptor_from_fs(self.v1)
+            self.assertEqual(3, hotswapping.load(m).FOOBAR)
+            self.assertEqual(0, hotswapping.sys.modules['foobar'].Doer().do())
+            self.assertEqual(3, hotswapping.unload(m))
+        self.assertEqual(3, self.cache.misses)
+        self.assertEqual(6, self.cache.hits)
+        self.assertEqual(3, len(os.listdir(self.cache_dir)))
+        self.assertNotIn(self.cache, hotswapping.sys.meta_path)
+
+    def test_isolated_expectSiblingsCached(self):
+        for _ in range(2):
+            m = hotswapping.create_descriptor_from_fs(self.v2)
+            self.assertEqual(39, hotswapping.load(m, isolated=True).FOOBAR)
+            hotswapping.unload(m)
+        self.assertEqual(4, self.cache.misses)
+        self.assertEqual(4, self.cache.hits)
+
+    def test_sharedDirectory_expectEntriesReused(self):
+        m = hotswapping.create_descriptor_from_fs(self.v1)
+        hotswapping.load(m)
+        hotswapping.unload(m)
+        other = hotswapping.BYTECODE_CACHE = hotswapping.BytecodeCache(self.cache_dir)
+        m = hotswapping.create_descriptor_from_fs(self.v1)
+        hotswapping.load(m)
+        hotswapping.unload(m)
+        self.assertEqual((0, 3), (other.misses, other.hits))
+
+    def test_tooManyEntries_expectLeastRecentlyUsedPruned(self):
+        self.cache.max_entries = 2
+        m = hotswapping.create_descriptor_from_fs(self.v1)
+        hotswapping.load(m)
+        hotswapping.unload(m)
+        self.assertEqual(2, len(os.listdir(self.cache_dir)))
+
+    def test_coldLoad_expectDirectoryScannedOnce(self):
+        prune = self.cache.prune
+        pruned = list()
+        self.cache.prune = lambda: pruned.append(prune())
+        m = hotswapping.create_descriptor_from_fs(self.v2)
+        hotswapping.load(m, isolated=True)
+        hotswapping.unload(m)
+        self.assertEqual(4, self.cache.misses)
+        self.assertEqual([0], pruned)
+        self.cache.prune_every = 1
+        m = hotswapping.create_descriptor_from_fs(self.v1)
+        hotswapping.load(m)
+        hotswapping.unload(m)
+        self.assertEqual(1 + self.cache.misses - 4, len(pruned))
+
+    def test_sourceModified_expectRecompiled(self):
+        root = tempfile.mkdtemp()
+        try:
+            path = os.path.join(root, 'hsbytecode.py')
+            for value in ('1', '22'):
+                with open(path, 'w') as f:
+                    f.write('VALUE = {}\n'.format(value))
+                m = hotswapping.create_descriptor_from_fs(path)
+                self.assertEqual(int(value), hotswapping.load(m).VALUE)
+                hotswapping.unload(m)
+            self.assertEqual(2, self.cache.misses)
+        finally:
+            shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    unittest.main()
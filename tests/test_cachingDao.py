@@ -0,0 +1,128 @@
+
+import threading
+import time
+import unittest
+
+import hotswapping
+
+import packageFoo
+
+
+class CountingDao(packageFoo.PackageFoo):
+
+    def __init__(self):
+        self.calls = list()
+
+    def get_all(self, base_name, **kwargs):
+        self.calls.append(('get_all', base_name))
+        return super(CountingDao, self).get_all(base_name, **kwargs)
+
+    def resolve(self, packages):
+        self.calls.append(('resolve', tuple(packages)))
+        return super(CountingDao, self).resolve(packages)
+
+    def split(self, package):
+        self.calls.append(('split', package))
+        return super(CountingDao, self).split(package)
+
+
+class TestLruCache(unittest.TestCase):
+
+    def test_expectLeastRecentlyUsedEvicted(self):
+        cache = hotswapping.LruCache(max_size=2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        self.assertEqual((True, 1), cache.get('a'))
+        cache.put('c', 3)
+        self.assertEqual((False, None), cache.get('b'))
+        self.assertEqual((True, 1), cache.get('a'))
+        self.assertEqual(2, len(cache))
+
+    def test_expired_expectNotFound(self):
+        cache = hotswapping.LruCache(ttl=-1)
+        cache.put('a', 1)
+        self.assertEqual((False, None), cache.get('a'))
+        self.assertEqual(0, len(cache))
+
+
+class TestCachingDao(unittest.TestCase):
+
+    def setUp(self):
+        self.dao = CountingDao()
+        self.sut = hotswapping.CachingDao(self.dao)
+
+    def test_getAll_expectMemoized(self):
+        self.assertEqual(['doom-1.0', 'doom-1.1', 'doom-1.2'], self.sut.get_all('doom'))
+        self.assertEqual(['doom-1.0', 'doom-1.1', 'doom-1.2'], self.sut.get_all('doom'))
+        self.assertEqual([('get_all', 'doom')], self.dao.calls)
+        self.assertEqual(1, self.sut.hits['get_all'])
+        self.assertEqual(1, self.sut.misses['get_all'])
+
+    def test_expired_expectFetchedAgain(self):
+        self.sut.caches['get_all'].ttl = -1
+        self.sut.get_all('doom')
+        self.sut.get_all('doom')
+        self.assertEqual(2, self.sut.misses['get_all'])
+
+    def test_resolve_expectOnlyMissingPackagesFetched(self):
+        self.assertEqual(['/vol/doom/1.0/main.py'], self.sut.resolve(['doom-1.0']))
+        self.assertEqual(['/vol/doom/1.1/main.py', '/vol/doom/1.0/main.py'],
+                         self.sut.resolve(['doom-1.1', 'doom-1.0']))
+        self.assertEqual([('resolve', ('doom-1.0', )), ('resolve', ('doom-1.1', ))], self.dao.calls)
+
+    def test_splitAndCompare_expectMemoized(self):
+        self.assertEqual(('doom', '1.0'), tuple(self.sut.split('doom-1.0')))
+        self.sut.split('doom-1.0')
+        self.assertEqual(1, self.sut.compare_packages('doom-1.2', 'doom-1.0'))
+        self.assertEqual(1, self.sut.compare_packages('doom-1.2', 'doom-1.0'))
+        self.assertEqual(1, self.sut.hits['split'])
+        self.assertEqual(1, self.sut.hits['compare_packages'])
+
+    def test_concurrentLookups_expectOneInFlightCall(self):
+        entered = threading.Event()
+        release = threading.Event()
+        get_all = self.dao.get_all
+
+        def _(base_name, **kwargs):
+            entered.set()
+            release.wait(5)
+            return get_all(base_name, **kwargs)
+
+        self.dao.get_all = _
+        results = list()
+        threads = [threading.Thread(target=lambda: results.append(self.sut.get_all('doom'))) for _ in range(8)]
+        threads[0].start()
+        entered.wait(5)
+        for t in threads[1:]:
+            t.start()
+        deadline = time.time() + 5
+        while self.sut.hits['get_all'] < 7 and time.time() < deadline:
+            time.sleep(0.001)
+        release.set()
+        for t in threads:
+            t.join()
+        self.assertEqual(1, len(self.dao.calls))
+        self.assertEqual(8, len(results))
+        self.assertEqual(1, self.sut.misses['get_all'])
+
+    def test_failure_expectNotCached(self):
+
+        def _(base_name, **kwargs):
+            raise IOError()
+
+        self.dao.get_all = _
+        self.assertRaises(IOError, self.sut.get_all, 'doom')
+        self.assertRaises(IOError, self.sut.get_all, 'doom')
+        self.assertEqual(2, self.sut.misses['get_all'])
+
+    def test_searchRule_expectPackageServiceHitOnce(self):
+        rule = hotswapping.NewerPackageVersion(self.sut)
+        m = hotswapping.ModuleDescriptor()
+        m.version_meta = dict(base_name='doom', version='1.0', package='doom-1.0')
+        for _ in range(10):
+            self.assertEqual('doom-1.2', rule.search(m))
+        self.assertEqual([('get_all', 'doom')], self.dao.calls)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import hotswapping
+
+
+class TestCanarySymbolGetter(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.renewer = hotswapping.RenewFSModule(hotswapping.NewerSemanticVersion(check_existence=True),
+                                                 hotswapping.MaxAge(3600))
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def publish(self, version, body):
+        os.mkdir(os.path.join(self.root, version))
+        path = os.path.join(self.root, version, 'hscanary.py')
+        with open(path, 'w') as f:
+            f.write(body)
+        return path
+
+    def create_getter(self, **kwargs):
+        m = hotswapping.create_descriptor_from_fs(self.publish('1.0.0', 'def run():\n    return 1\n'))
+        getter = hotswapping.CanarySymbolGetter(self.renewer, m, **kwargs)
+        self.publish('2.0.0', 'def run():\n    return 2\n')
+        self.renewer.timer_rule.max_age = -1
+        self.assertTrue(getter.refresh())
+        self.renewer.timer_rule.max_age = 3600
+        return getter
+
+    def test_newVersion_expectLoadedAsCanary(self):
+        getter = self.create_getter()
+        self.assertEqual(['1.0.0', '2.0.0'], [os.path.basename(os.path.dirname(slot.m.fs_path))
+                                              for slot in getter.slots])
+        self.assertNotIn('hscanary', hotswapping.sys.modules)
+        self.assertFalse(getter.slots[0].m.deprecated)
+
+    def test_routeByKey_expectStickyAndWeighted(self):
+        getter = self.create_getter(canary_weight=0.2)
+        for key in xrange(50):
+            self.assertIs(getter.route(key), getter.route(key))
+        num_canary = sum(1 for key in xrange(2000) if getter.route(key) is getter.slots[1])
+        self.assertTrue(300 < num_canary < 500, num_canary)
+
+    def test_healthyCanary_expectPromoted(self):
+        getter = self.create_getter(canary_weight=0.5, min_calls=10, promote_after=20)
+        stable_namespace = getter.slots[0].m.namespace
+        for key in xrange(200):
+            getter.invoke('run', key=key)
+        self.assertEqual(1, len(getter.slots))
+        self.assertEqual(2, getter.invoke('run'))
+        self.assertNotIn(stable_namespace, hotswapping.sys.modules)
+
+    def test_concurrentCalls_expectEveryCallCountedAndNoEvaluationBelowThresholds(self):
+        getter = self.create_getter(min_calls=10, promote_after=100000, max_error_rate=0.0)
+        evaluated = list()
+        getter.evaluate = lambda slot: evaluated.append(slot)
+        canary = getter.slots[1]
+
+        def call():
+            for _ in xrange(1000):
+                getter.record(canary, 0.001, False)
+
+        threads = [threading.Thread(target=call) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(8000, canary.stats()['calls'])
+        self.assertEqual([], evaluated)
+        getter.record(canary, 0.001, True)
+        self.assertEqual([canary], evaluated)
+
+    def test_failingCanary_expectRolledBackAndNotRetried(self):
+        m = hotswapping.create_descriptor_from_fs(self.publish('1.0.0', 'def run():\n    return 1\n'))
+        getter = hotswapping.CanarySymbolGetter(self.renewer, m, canary_weight=0.5, min_calls=10)
+        self.publish('2.0.0', 'def run():\n    raise ValueError()\n')
+        self.renewer.timer_rule.max_age = -1
+        for key in xrange(200):
+            try:
+                self.assertEqual(1, getter.invoke('run', key=key))
+            except ValueError:
+                pass
+        self.assertEqual(1, len(getter.slots))
+        self.assertEqual(1, getter.invoke('run'))
+        self.assertEqual(1, len(getter.rejected))
+
+
+    def test_rolledBackCanaryStillNewest_expectNoDescriptorCreated(self):
+        m = hotswapping.create_descriptor_from_fs(self.publish('1.0.0', 'def run():\n    return 1\n'))
+        getter = hotswapping.CanarySymbolGetter(self.renewer, m, canary_weight=0.5, min_calls=10)
+        self.publish('2.0.0', 'def run():\n    raise ValueError()\n')
+        self.renewer.timer_rule.max_age = -1
+        for key in xrange(200):
+            try:
+                getter.invoke('run', key=key)
+            except ValueError:
+                pass
+        self.assertEqual(1, len(getter.slots))
+        created = list()
+        create_descriptor_from_fs = hotswapping.create_descriptor_from_fs
+        hotswapping.create_descriptor_from_fs = lambda path: created.append(path)
+        try:
+            for key in xrange(10):
+                self.assertEqual(1, getter.invoke('run', key=key))
+        finally:
+            hotswapping.create_descriptor_from_fs = create_descriptor_from_fs
+        self.assertEqual([], created)
+
+    def test_rejectedVersionModifiedInPlace_expectRetried(self):
+        m = hotswapping.create_descriptor_from_fs(self.publish('1.0.0', 'def run():\n    return 1\n'))
+        getter = hotswapping.CanarySymbolGetter(self.renewer, m, smoke_check=lambda mod_: mod_.run())
+        path = self.publish('2.0.0', 'def run():\n    raise ValueError()\n')
+        self.renewer.timer_rule.max_age = -1
+        self.assertFalse(getter.refresh())
+        self.assertFalse(getter.refresh())
+        with open(path, 'w') as f:
+            f.write('def run():\n    return 2\n')
+        os.utime(path, (0, 0))
+        self.assertTrue(getter.refresh())
+
+
+if __name__ == '__main__':
+    unittest.main()
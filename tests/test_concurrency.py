@@ -0,0 +1,86 @@
+
+import os
+import threading
+import unittest
+
+import hotswapping
+
+
+class FlipFlop(hotswapping.SearchRuleI):
+    """
+    Always finds the "other" version, so that every due renewal swaps
+    """
+
+    def __init__(self, lhs, rhs):
+        self.lhs = lhs
+        self.rhs = rhs
+        self.num_searches = 0
+
+    def search(self, m):
+        self.num_searches += 1
+        return self.rhs if m.fs_path == self.lhs else self.lhs
+
+
+class TestConcurrentSwap(unittest.TestCase):
+
+    def setUp(self):
+        testdata = os.path.join(os.path.dirname(__file__), 'testdata')
+        self.v1 = os.path.abspath(os.path.join(testdata, '1.0.2', 'foobar.py'))
+        self.v2 = os.path.abspath(os.path.join(testdata, '2.1.0', 'foobar.py'))
+
+    def test_manyThreadsForcedRenewals_expectConsistentGenerations(self):
+        getter = hotswapping.SymbolGetter(self.v1, max_age=-1)
+        getter.search_rule = FlipFlop(self.v1, self.v2)
+        expected = {(3, 0), (39, 1)}
+        errors = list()
+        seen = set()
+
+        def worker():
+            try:
+                for _ in range(300):
+                    d = getter.get_all(['FOOBAR', 'Doer'])
+                    pair = (d['FOOBAR'], d['Doer']().do())
+                    if pair not in expected:
+                        errors.append(pair)
+                    seen.add(pair)
+            except Exception, e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker) for _ in range(16)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertFalse(errors)
+        self.assertEqual(expected, seen)
+        self.assertTrue(getter.search_rule.num_searches > 1)
+        self.assertNotIn(os.path.dirname(self.v1), hotswapping.sys.path)
+        self.assertNotIn(os.path.dirname(self.v2), hotswapping.sys.path)
+
+    def test_renewalInProgress_expectReaderNotBlocked(self):
+        getter = hotswapping.SymbolGetter(self.v1, max_age=3600)
+        getter.search_rule = FlipFlop(self.v1, self.v2)
+        self.assertEqual(3, getter('FOOBAR'))
+        getter.timer_rule.max_age = -1
+        result = list()
+        with getter._lock:
+            t = threading.Thread(target=lambda: result.append(getter('FOOBAR')))
+            t.start()
+            t.join(5)
+            self.assertEqual([3], result)
+        self.assertEqual(39, getter('FOOBAR'))
+
+
+class TestMaxAgeDue(unittest.TestCase):
+
+    def test_expectNoSideEffect(self):
+        m = hotswapping.create_descriptor_from_fs(
+            os.path.join(os.path.dirname(__file__), 'testdata', '1.0.2', 'foobar.py')
+        )
+        self.assertTrue(hotswapping.MaxAge(-1).due(m))
+        self.assertFalse(hotswapping.MaxAge(3600).due(m))
+        self.assertFalse(m.deprecated)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import hotswapping
+
+
+class TestContentStore(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        for version, value in (('1.0.0', 1), ('2.0.0', 2)):
+            os.mkdir(os.path.join(self.root, version))
+            with open(os.path.join(self.root, version, 'hsstore_top.py'), 'w') as f:
+                f.write('import hsstore_shared\nVALUE = {}\n'.format(value))
+            with open(os.path.join(self.root, version, 'hsstore_shared.py'), 'w') as f:
+                f.write('SHARED = 1\n')
+        self.store = hotswapping.CONTENT_STORE = hotswapping.ContentStore()
+
+    def tearDown(self):
+        hotswapping.CONTENT_STORE = None
+        shutil.rmtree(self.root)
+        for name in ('hsstore_top', 'hsstore_shared'):
+            hotswapping.sys.modules.pop(name, None)
+
+    def descriptor(self, version):
+        return hotswapping.create_descriptor_from_fs(os.path.join(self.root, version, 'hsstore_top.py'))
+
+    def test_digest_expectFileHashedOnce(self):
+        path = os.path.join(self.root, '1.0.0', 'hsstore_shared.py')
+        self.assertEqual(self.store.digest(path), self.store.digest(path))
+        self.assertEqual(1, self.store.num_hashed)
+
+    def test_identicalFile_expectCompiledOnce(self):
+        for version in ('1.0.0', '2.0.0'):
+            m = self.descriptor(version)
+            self.assertEqual(int(version[0]), hotswapping.load(m).VALUE)
+            self.assertEqual(2, hotswapping.unload(m))
+        self.assertEqual(3, self.store.misses)
+        self.assertEqual(1, self.store.hits)
+
+    def test_identicalVersion_expectSwapSkipped(self):
+        shutil.copytree(os.path.join(self.root, '1.0.0'), os.path.join(self.root, '1.0.1'))
+        old_m = self.descriptor('1.0.0')
+        old_top = hotswapping.load(old_m)
+        new_m = self.descriptor('1.0.1')
+        self.assertTrue(self.store.identical(old_m, new_m))
+        self.assertFalse(self.store.identical(old_m, self.descriptor('2.0.0')))
+        self.assertIs(old_top, hotswapping.stage(old_m, new_m))
+        self.assertEqual(2, self.store.misses)
+        self.assertEqual(0, hotswapping.unload(old_m))
+        self.assertEqual(2, hotswapping.unload(new_m))
+
+    def test_getter_expectIdenticalVersionAdopted(self):
+        getter = hotswapping.SymbolGetter(os.path.join(self.root, '1.0.0', 'hsstore_top.py'), max_age=3600,
+                                          isolated=True)
+        shared = getter('hsstore_shared')
+        shutil.copytree(os.path.join(self.root, '1.0.0'), os.path.join(self.root, '1.5.0'))
+        shutil.rmtree(os.path.join(self.root, '2.0.0'))
+        getter.timer_rule.max_age = -1
+        self.assertIs(shared, getter('hsstore_shared'))
+        self.assertTrue(getter.m.fs_path.endswith('1.5.0/hsstore_top.py'))
+
+
+if __name__ == '__main__':
+    unittest.main()
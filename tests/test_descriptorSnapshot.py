@@ -0,0 +1,141 @@
+
+import json
+import os
+import shutil
+import signal
+import tempfile
+import unittest
+
+import hotswapping
+
+from test_importFromPackage import TESTDATA, TestDataDao
+
+
+class TestDescriptorSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.dir_ = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir_, 'snapshot.json')
+        self.dao = TestDataDao()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir_)
+
+    def test_noSnapshot_expectResolvedAndRecorded(self):
+        snapshot = hotswapping.DescriptorSnapshot(self.path)
+        getter = hotswapping.SymbolGetterPackageDao('foobar-1.0.2', self.dao, max_age=-1, snapshot=snapshot)
+        self.assertEqual(1, snapshot.misses)
+        self.assertEqual(39, getter('FOOBAR'))
+        self.assertTrue(snapshot.wait(5))
+        with open(self.path) as f:
+            entry = json.load(f)['entries']['package:foobar-1.0.2']
+        self.assertEqual('foobar-2.1.0', entry['version_meta']['package'])
+
+    def test_restart_expectNoResolveBeforeServing(self):
+        snapshot = hotswapping.DescriptorSnapshot(self.path)
+        for package in ('foobar-1.0.2', 'foobarImplChainsaw-1.0.2'):
+            hotswapping.SymbolGetterPackageDao(package, self.dao, max_age=-1, snapshot=snapshot).renew()
+        snapshot.save()
+        del self.dao.resolve_calls[:]
+        snapshot = hotswapping.DescriptorSnapshot(self.path, verify=False)
+        getters = [hotswapping.SymbolGetterPackageDao(p, self.dao, max_age=3600, snapshot=snapshot)
+                   for p in ('foobar-1.0.2', 'foobarImplChainsaw-1.0.2')]
+        self.assertEqual([], self.dao.resolve_calls)
+        self.assertEqual(2, snapshot.hits)
+        self.assertEqual(3, getters[0]('FOOBAR'))
+
+    def test_verify_expectOneResolvePerDao(self):
+        snapshot = hotswapping.DescriptorSnapshot(self.path)
+        for package in ('foobar-1.0.2', 'foobarImplChainsaw-1.0.2'):
+            hotswapping.SymbolGetterPackageDao(package, self.dao, max_age=3600, snapshot=snapshot)
+        self.assertTrue(snapshot.wait(5))
+        del self.dao.resolve_calls[:]
+        snapshot = hotswapping.DescriptorSnapshot(self.path)
+        getters = [hotswapping.SymbolGetterPackageDao(p, self.dao, max_age=3600, snapshot=snapshot)
+                   for p in ('foobar-1.0.2', 'foobarImplChainsaw-1.0.2')]
+        self.assertTrue(snapshot.wait(5))
+        self.assertEqual([['foobar-1.0.2', 'foobarImplChainsaw-1.0.2']], self.dao.resolve_calls)
+        self.assertEqual(0, snapshot.stale)
+        self.assertEqual(3, getters[0]('FOOBAR'))
+
+    def writeStale(self, **entries):
+        entry = dict(fs_path=os.path.join(TESTDATA, '2.1.0', 'foobar.py'),
+                     fs_mtime=int(os.stat(os.path.join(TESTDATA, '2.1.0', 'foobar.py')).st_mtime),
+                     version_meta=dict(base_name='foobar', version='1.0.2', package='foobar-1.0.2'))
+        entries['package:foobar-1.0.2'] = entry
+        with open(self.path, 'w') as f:
+            json.dump(dict(format=1, entries=entries), f)
+
+    def test_staleSnapshot_expectMovedToResolved(self):
+        self.writeStale()
+        snapshot = hotswapping.DescriptorSnapshot(self.path)
+        getter = hotswapping.SymbolGetterPackageDao('foobar-1.0.2', self.dao, max_age=3600, snapshot=snapshot)
+        self.assertEqual(1, snapshot.hits)
+        self.assertTrue(snapshot.wait(5))
+        self.assertEqual(1, snapshot.stale)
+        self.assertEqual(3, getter('FOOBAR'))
+
+    def test_checkedBeforeGetterConstructed_expectMovedToResolved(self):
+
+        class Snapshot(hotswapping.DescriptorSnapshot):
+
+            def restore(self, *args, **kwargs):
+                m = super(Snapshot, self).restore(*args, **kwargs)
+                self.wait(5)
+                return m
+
+        self.writeStale()
+        snapshot = Snapshot(self.path)
+        getter = hotswapping.SymbolGetterPackageDao('foobar-1.0.2', self.dao, max_age=3600, snapshot=snapshot)
+        self.assertEqual(1, snapshot.stale)
+        self.assertEqual(3, getter('FOOBAR'))
+
+    def test_packageGoneFromDao_expectOthersChecked(self):
+        path = os.path.join(TESTDATA, '1.0.2', 'foobarImplChainsaw.py')
+        self.writeStale(**{'package:foobarImplChainsaw-1.0.2': dict(
+            fs_path=path, fs_mtime=int(os.stat(path).st_mtime),
+            version_meta=dict(base_name='foobarImplChainsaw', version='1.0.2', package='foobarImplChainsaw-1.0.2')
+        )})
+        resolve = self.dao.resolve
+        self.dao.resolve = lambda packages: [] if 'foobarImplChainsaw-1.0.2' in packages else resolve(packages)
+        snapshot = hotswapping.DescriptorSnapshot(self.path)
+        getters = [hotswapping.SymbolGetterPackageDao(p, self.dao, max_age=3600, snapshot=snapshot)
+                   for p in ('foobar-1.0.2', 'foobarImplChainsaw-1.0.2')]
+        self.assertTrue(snapshot.wait(5))
+        self.assertEqual(1, snapshot.stale)
+        self.assertEqual(3, getters[0]('FOOBAR'))
+        self.assertEqual(path, getters[1].m.fs_path)
+
+    def test_lockHeldAtFork_expectChildNotBlocked(self):
+        manager = hotswapping.RenewalManager()
+        snapshot = hotswapping.DescriptorSnapshot(self.path)
+        getter = hotswapping.SymbolGetterPackageDao('foobar-1.0.2', self.dao, max_age=-1, reloader=manager,
+                                                    snapshot=snapshot)
+        self.assertTrue(snapshot.wait(5))
+        with snapshot._lock:
+            pid = os.fork()
+            if pid == 0:
+                status = 1
+                try:
+                    signal.alarm(5)
+                    manager.after_fork()
+                    if manager.tick() == 1 and snapshot.wait(5):
+                        status = 0
+                finally:
+                    os._exit(status)
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(0, status)
+
+    def test_changedOrCorruptedFile_expectIgnored(self):
+        snapshot = hotswapping.DescriptorSnapshot(self.path)
+        module_path = os.path.join(TESTDATA, '1.0.2', 'foobar.py')
+        snapshot.record('path:{}'.format(module_path), hotswapping.create_descriptor_from_fs(module_path))
+        snapshot.entries['path:{}'.format(module_path)]['fs_mtime'] -= 1
+        self.assertIsNone(snapshot.descriptor('path:{}'.format(module_path)))
+        with open(self.path, 'w') as f:
+            f.write('{"format": 1, "entr')
+        self.assertEqual(dict(), hotswapping.DescriptorSnapshot(self.path).entries)
+
+
+if __name__ == '__main__':
+    unittest.main()
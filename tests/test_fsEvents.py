@@ -0,0 +1,137 @@
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+import hotswapping
+
+
+def wait_for(predicate, timeout=3.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def write_module(path, value, mtime=None):
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, 'w') as f:
+        f.write('VALUE = {}\n'.format(value))
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+
+class WatcherTestMixin(object):
+
+    def create_watcher(self):
+        raise NotImplementedError()
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.module_path = os.path.join(self.root, '1.0.0', 'hsfsevents.py')
+        write_module(self.module_path, 1)
+        self.watcher = self.create_watcher()
+
+    def tearDown(self):
+        self.watcher.close()
+        shutil.rmtree(self.root)
+
+    def test_newVersionDirectory_expectRootChanged(self):
+        self.watcher.watch(self.root)
+        self.assertEqual(0, self.watcher.generation(self.root)[0])
+        os.mkdir(os.path.join(self.root, '1.1.0'))
+        self.assertTrue(wait_for(lambda: self.watcher.generation(self.root)[0] > 0))
+
+    def test_moduleRewritten_expectFileChanged(self):
+        self.watcher.watch(self.module_path)
+        write_module(self.module_path, 2, mtime=time.time() + 10)
+        self.assertTrue(wait_for(lambda: self.watcher.generation(self.module_path)[0] > 0))
+
+
+class TestPollingWatcher(WatcherTestMixin, unittest.TestCase):
+
+    def create_watcher(self):
+        return hotswapping.PollingWatcher(interval=0.01)
+
+
+@unittest.skipUnless(hotswapping.inotify.available(), 'inotify is not available')
+class TestInotifyWatcher(WatcherTestMixin, unittest.TestCase):
+
+    def create_watcher(self):
+        return hotswapping.InotifyWatcher()
+
+    def test_unrelatedFile_expectModuleUnchanged(self):
+        self.watcher.watch(self.module_path)
+        write_module(os.path.join(self.root, '1.0.0', 'other.py'), 1)
+        self.assertTrue(wait_for(lambda: self.watcher.generation(os.path.dirname(self.module_path))[0] > 0))
+        self.assertEqual(0, self.watcher.generation(self.module_path)[0])
+
+
+class TestFsEvents(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.module_path = os.path.join(self.root, '1.0.0', 'hsfsevents.py')
+        write_module(self.module_path, 1)
+        self.watcher = hotswapping.PollingWatcher(interval=0.01)
+        self.rule = hotswapping.FsEvents(self.watcher, settle=0.0)
+        self.m = hotswapping.create_descriptor_from_fs(self.module_path)
+
+    def tearDown(self):
+        self.watcher.close()
+        shutil.rmtree(self.root)
+        sys.modules.pop('hsfsevents', None)
+
+    def test_firstSeen_expectRetiredOnce(self):
+        self.assertTrue(self.rule.due(self.m))
+        self.assertTrue(self.rule.retire(self.m))
+        self.assertFalse(self.rule.due(self.m))
+        self.assertFalse(self.rule.retire(self.m))
+
+    def test_nothingChanged_expectNotRetired(self):
+        self.rule.retire(self.m)
+        self.m.deprecated = False
+        time.sleep(0.05)
+        self.assertFalse(self.rule.due(self.m))
+        self.assertFalse(self.rule.retire(self.m))
+        self.assertFalse(self.m.deprecated)
+
+    def test_newVersion_expectRetiredOnce(self):
+        self.rule.retire(self.m)
+        write_module(os.path.join(self.root, '1.1.0', 'hsfsevents.py'), 2)
+        self.assertTrue(wait_for(lambda: self.rule.due(self.m)))
+        self.assertTrue(self.rule.retire(self.m))
+        self.assertTrue(self.m.deprecated)
+        self.assertFalse(self.rule.retire(self.m))
+
+    def test_changeNotSettled_expectNotRetired(self):
+        self.rule.settle = 3600
+        self.rule.retire(self.m)
+        write_module(self.module_path, 2, mtime=time.time() + 10)
+        self.assertTrue(wait_for(lambda: self.watcher.generation(self.module_path)[0] > 0))
+        self.assertFalse(self.rule.retire(self.m))
+
+    def test_modifiedInPlace_expectSamePathFound(self):
+        search_rule = hotswapping.NewerVersionOrModified(check_existence=True)
+        self.assertFalse(search_rule.search(self.m))
+        write_module(self.module_path, 2, mtime=time.time() + 10)
+        self.assertEqual(self.module_path, search_rule.search(self.m))
+
+    def test_symbolGetterWithWatcher_expectRenewedOnEvents(self):
+        getter = hotswapping.SymbolGetter(self.module_path, watcher=self.watcher)
+        getter.timer_rule.settle = 0.0
+        self.assertEqual(1, getter('VALUE'))
+        write_module(os.path.join(self.root, '1.1.0', 'hsfsevents.py'), 2)
+        self.assertTrue(wait_for(lambda: getter('VALUE') == 2))
+        write_module(os.path.join(self.root, '1.1.0', 'hsfsevents.py'), 3, mtime=time.time() + 10)
+        self.assertTrue(wait_for(lambda: getter('VALUE') == 3))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,86 @@
 
+import os
 import unittest
 
+import hotswapping
 
 
+TESTDATA = os.path.abspath(os.path.join(os.path.dirname(__file__), 'testdata'))
+
+
+class TestDataDao(hotswapping.DaoI):
+    """
+    Serves the testdata directory as packages, e.g. foobar-1.0.2 => testdata/1.0.2/foobar.py; counts the round trips
+    """
+
+    def __init__(self):
+        self.get_all_calls = list()
+        self.resolve_calls = list()
+
+    def get_all(self, base_name, **kwargs):
+        self.get_all_calls.append(base_name)
+        return ['{}-{}'.format(base_name, v) for v in sorted(os.listdir(TESTDATA))]
+
+    def resolve(self, packages):
+        self.resolve_calls.append(list(packages))
+        return [os.path.join(TESTDATA, v, '{}.py'.format(n)) for n, v in (self.split(p) for p in packages)]
+
+    def split(self, package):
+        return tuple(package.rsplit('-', 1))
+
+    def compare_packages(self, lhs, rhs):
+        return hotswapping.NewerSemanticVersion.compare_versions(self.split(lhs)[1], self.split(rhs)[1])
+
+
+class TestSymbolGetterPackageDao(unittest.TestCase):
+
+    def setUp(self):
+        self.dao = TestDataDao()
+
+    def test_expectRenewed(self):
+        getter = hotswapping.SymbolGetterPackageDao('foobar-1.0.2', self.dao, max_age=-1)
+        self.assertEqual(39, getter('FOOBAR'))
+        self.assertEqual('foobar-2.1.0', getter.m.version_meta['package'])
+
+    def test_timerRuleGiven_expectMaxAgeIgnored(self):
+        timer_rule = hotswapping.MaxAge(3600)
+        getter = hotswapping.SymbolGetterPackageDao('foobar-1.0.2', self.dao, max_age=-1, timer_rule=timer_rule)
+        self.assertIs(timer_rule, getter.renewer().timer_rule)
+        getter('FOOBAR')
+        self.assertEqual('foobar-1.0.2', getter.m.version_meta['package'])
+
+    def test_createDescriptors_expectOneResolve(self):
+        ms = hotswapping.create_descriptors_from_package_dao(
+            ['foobar-1.0.2', 'foobar-2.1.0', 'foobar-9.9.9'], self.dao
+        )
+        self.assertEqual(1, len(self.dao.resolve_calls))
+        self.assertEqual(['1.0.2', '2.1.0'], [m.version_meta['version'] for m in ms[:2]])
+        self.assertIsNone(ms[2])
+
+    def test_manyGetters_expectOneGetAllPerBaseNameAndOneResolve(self):
+        manager = hotswapping.RenewalManager()
+        getters = [hotswapping.SymbolGetterPackageDao(p, self.dao, max_age=-1, reloader=manager)
+                   for p in ['foobar-1.0.2'] * 3 + ['foobarImplChainsaw-1.0.2'] * 2]
+        del self.dao.resolve_calls[:]
+        self.assertEqual(5, manager.tick())
+        self.assertEqual(['foobar', 'foobarImplChainsaw'], sorted(self.dao.get_all_calls))
+        self.assertEqual([['foobar-2.1.0', 'foobarImplChainsaw-2.1.0']], self.dao.resolve_calls)
+        self.assertEqual(5, len(set(id(getter.m) for getter in getters)))
+        self.assertEqual(39, getters[0]('FOOBAR'))
+        self.assertEqual(9, getters[-1]('num'))
+
+
+    def test_unresolvablePackageInTick_expectOthersRenewed(self):
+        manager = hotswapping.RenewalManager()
+        getters = [hotswapping.SymbolGetterPackageDao(p, self.dao, max_age=-1, reloader=manager)
+                   for p in ('foobar-1.0.2', 'foobarImplChainsaw-1.0.2')]
+        resolve = self.dao.resolve
+        self.dao.resolve = lambda packages: [] if 'foobarImplChainsaw-2.1.0' in packages else resolve(packages)
+        self.assertEqual(1, manager.tick())
+        self.assertEqual('foobar-2.1.0', getters[0].m.version_meta['package'])
+        self.assertEqual('foobarImplChainsaw-1.0.2', getters[1].m.version_meta['package'])
+        self.assertEqual(39, getters[0]('FOOBAR'))
+
 
 if __name__ == '__main__':
     unittest.main()
-
@@ -1,5 +1,8 @@
 
 import os
+import shutil
+import tempfile
+import threading
 
 import hotswapping
 
@@ -87,6 +90,37 @@ class TestLoadUnload(unittest.TestCase):
         # should not throw even though module wicked has irregular __file__ field
         hotswapping.unload(m)
 
+    def test_load_expectIntroducedModulesRecorded(self):
+        m = hotswapping.create_descriptor_from_fs(self.module_path)
+        hotswapping.load(m)
+        try:
+            self.assertEqual(['foobar', 'foobarImplChainsaw', 'foobarImplRocket'], sorted(m.loaded_modules))
+        finally:
+            hotswapping.unload(m)
+
+    def test_alreadyImported_expectNothingRecorded(self):
+        m = hotswapping.create_descriptor_from_fs(self.module_path)
+        hotswapping.load(m)
+        other = hotswapping.create_descriptor_from_fs(self.module_path)
+        hotswapping.load(other)
+        self.assertIsNone(other.loaded_modules)
+
+        # falls back to scanning sys.modules
+        self.assertEqual(3, hotswapping.unload(other))
+        self.assertEqual(0, hotswapping.unload(m))
+
+    def test_unload_expectOnlyRecordedModulesVisited(self):
+        m = hotswapping.create_descriptor_from_fs(self.module_path)
+        hotswapping.load(m)
+        stranger = hotswapping.types.ModuleType('stranger')
+        stranger.__file__ = os.path.join(os.path.dirname(self.module_path), 'stranger.py')
+        hotswapping.sys.modules['stranger'] = stranger
+        try:
+            self.assertEqual(3, hotswapping.unload(m))
+            self.assertIn('stranger', hotswapping.sys.modules)
+        finally:
+            del hotswapping.sys.modules['stranger']
+
 
 class TestSymbolGetter(unittest.TestCase):
 
@@ -112,6 +146,287 @@ class TestSymbolGetter(unittest.TestCase):
         self.assertTrue(d['Doer'])
         self.assertNotIn('not_there', d)
 
+    def test_liveModule_expectLoadedOnce(self):
+        getter = hotswapping.SymbolGetter(self.module_path, max_age=3600)
+        num_loads = [0]
+        load = hotswapping.load
+
+        def _(m, **kwargs):
+            num_loads[0] += 1
+            return load(m, **kwargs)
+
+        hotswapping.load = _
+        try:
+            for _ in range(3):
+                self.assertEqual(3, getter('FOOBAR'))
+                self.assertTrue(getter('Doer'))
+        finally:
+            hotswapping.load = load
+        self.assertEqual(1, num_loads[0])
+
+    def test_renewed_expectSymbolCacheDropped(self):
+        getter = hotswapping.SymbolGetter(self.module_path, max_age=3600)
+        self.assertEqual(3, getter('FOOBAR'))
+        getter.timer_rule.max_age = -1
+        self.assertEqual(39, getter('FOOBAR'))
+
+
+class TestStagedSwap(unittest.TestCase):
+
+    def setUp(self):
+        testdata = os.path.join(os.path.dirname(__file__), 'testdata')
+        self.v1 = os.path.abspath(os.path.join(testdata, '1.0.2', 'foobar.py'))
+        self.v2 = os.path.abspath(os.path.join(testdata, '2.1.0', 'foobar.py'))
+
+    def test_stage_expectOldModulesDropped(self):
+        old_m = hotswapping.create_descriptor_from_fs(self.v1)
+        hotswapping.load(old_m)
+        new_m = hotswapping.create_descriptor_from_fs(self.v2)
+        self.assertEqual(39, hotswapping.stage(old_m, new_m).FOOBAR)
+        self.assertEqual(39, hotswapping.sys.modules['foobar'].FOOBAR)
+        self.assertEqual(0, hotswapping.unload(old_m))
+        self.assertEqual(4, hotswapping.unload(new_m))
+
+    def test_smokeCheckFails_expectOldModulesRestored(self):
+        old_m = hotswapping.create_descriptor_from_fs(self.v1)
+        hotswapping.load(old_m)
+        new_m = hotswapping.create_descriptor_from_fs(self.v2)
+        try:
+            self.assertIsNone(hotswapping.stage(old_m, new_m, smoke_check=lambda mod_: mod_.FOOBAR < 10))
+            self.assertEqual(3, hotswapping.sys.modules['foobar'].FOOBAR)
+            self.assertNotIn('foobarImplShotgun', hotswapping.sys.modules)
+        finally:
+            hotswapping.unload(old_m)
+
+    def test_smokeCheckRaises_expectRejected(self):
+
+        def _(mod_):
+            raise RuntimeError()
+
+        new_m = hotswapping.create_descriptor_from_fs(self.v2)
+        self.assertIsNone(hotswapping.stage(None, new_m, smoke_check=_))
+        self.assertNotIn('foobar', hotswapping.sys.modules)
+
+    def test_getterRejectsNewVersion_expectOldOneServedAndNotRetried(self):
+        checked = list()
+
+        def _(mod_):
+            checked.append(mod_)
+            return mod_.FOOBAR < 10
+
+        getter = hotswapping.SymbolGetter(self.v1, max_age=3600, smoke_check=_)
+        self.assertEqual(3, getter('FOOBAR'))
+        getter.timer_rule.max_age = -1
+        for _ in range(3):
+            self.assertEqual(3, getter('FOOBAR'))
+        self.assertEqual(1, len(checked))
+        self.assertFalse(getter.m.deprecated)
+
+    def test_smokeCheck_expectRunWithoutImportLock(self):
+        acquired = list()
+
+        def try_acquire():
+            acquired.append(hotswapping._IMPORT_LOCK.acquire(False))
+            if acquired[-1]:
+                hotswapping._IMPORT_LOCK.release()
+
+        def _(mod_):
+            t = threading.Thread(target=try_acquire)
+            t.start()
+            t.join()
+            return True
+
+        new_m = hotswapping.create_descriptor_from_fs(self.v2)
+        self.assertEqual(39, hotswapping.stage(None, new_m, smoke_check=_).FOOBAR)
+        hotswapping.unload(new_m)
+        self.assertEqual([True], acquired)
+
+    def test_rejectionExpired_expectRetried(self):
+        failures = [True]
+
+        def _(mod_):
+            return not (failures and failures.pop())
+
+        getter = hotswapping.SymbolGetter(self.v1, max_age=3600, smoke_check=_)
+        self.assertEqual(3, getter('FOOBAR'))
+        getter.timer_rule.max_age = -1
+        self.assertEqual(3, getter('FOOBAR'))
+        getter.reject_for = 0
+        self.assertEqual(39, getter('FOOBAR'))
+        self.assertEqual(dict(), getter.rejected)
+
+    def test_newVersionFailsToImport_expectOldOneServed(self):
+        root = tempfile.mkdtemp()
+        try:
+            for version, body in (('1.0.0', 'VALUE = 1\n'), ('2.0.0', 'raise ImportError()\n')):
+                os.mkdir(os.path.join(root, version))
+                with open(os.path.join(root, version, 'hsbroken.py'), 'w') as f:
+                    f.write(body)
+            getter = hotswapping.SymbolGetter(os.path.join(root, '1.0.0', 'hsbroken.py'), max_age=3600)
+            self.assertEqual(1, getter('VALUE'))
+            getter.timer_rule.max_age = -1
+            self.assertEqual(1, getter('VALUE'))
+            self.assertEqual(1, hotswapping.sys.modules['hsbroken'].VALUE)
+        finally:
+            shutil.rmtree(root)
+            hotswapping.sys.modules.pop('hsbroken', None)
+
+
+class TestIsolatedLoad(unittest.TestCase):
+
+    def setUp(self):
+        testdata = os.path.join(os.path.dirname(__file__), 'testdata')
+        self.v1 = os.path.abspath(os.path.join(testdata, '1.0.2', 'foobar.py'))
+        self.v2 = os.path.abspath(os.path.join(testdata, '2.1.0', 'foobar.py'))
+
+    def test_twoVersions_expectResidentSideBySide(self):
+        sys_path = list(hotswapping.sys.path)
+        m1 = hotswapping.create_descriptor_from_fs(self.v1)
+        m2 = hotswapping.create_descriptor_from_fs(self.v2)
+        try:
+            self.assertEqual(3, hotswapping.load(m1, isolated=True).FOOBAR)
+            self.assertEqual(39, hotswapping.load(m2, isolated=True).FOOBAR)
+            self.assertEqual(sys_path, hotswapping.sys.path)
+            self.assertNotIn('foobar', hotswapping.sys.modules)
+            self.assertTrue(m1.namespace.startswith('_hotswapping_1_0_2_'))
+            self.assertEqual(3, hotswapping.sys.modules[m1.namespace + '.foobar'].FOOBAR)
+        finally:
+            self.assertEqual(4, hotswapping.unload(m1))
+        self.assertNotIn(m1.namespace + '.foobar', hotswapping.sys.modules)
+        self.assertNotIn(m1.namespace + '.types', hotswapping.sys.modules)
+        self.assertEqual(39, hotswapping.sys.modules[m2.namespace + '.foobar'].FOOBAR)
+        self.assertEqual(5, hotswapping.unload(m2))
+
+    def test_loadTwice_expectSameModule(self):
+        m = hotswapping.create_descriptor_from_fs(self.v2)
+        try:
+            self.assertIs(hotswapping.load(m, isolated=True), hotswapping.load(m, isolated=True))
+        finally:
+            hotswapping.unload(m)
+
+    def test_isolatedGetter_expectRenewed(self):
+        getter = hotswapping.SymbolGetter(self.v1, max_age=3600, isolated=True)
+        self.assertEqual(3, getter('FOOBAR'))
+        old_namespace = getter.m.namespace
+        getter.timer_rule.max_age = -1
+        self.assertEqual(39, getter('FOOBAR'))
+        self.assertNotIn(old_namespace, hotswapping.sys.modules)
+        self.assertNotIn('foobar', hotswapping.sys.modules)
+
+    def test_absoluteImport_expectSiblingsInNamespace(self):
+        root = tempfile.mkdtemp()
+        try:
+            dir_ = os.path.join(root, '1.0.0')
+            os.makedirs(os.path.join(dir_, 'hsabs_pkg'))
+            for name, body in (('hsabs_top.py', 'from __future__ import absolute_import\nimport json\nimport hsabs_sib\n'
+                                                'import hsabs_pkg.sub\nVALUE = hsabs_sib.VALUE + hsabs_pkg.sub.VALUE\n'),
+                               ('hsabs_sib.py', 'VALUE = 1\n'),
+                               (os.path.join('hsabs_pkg', '__init__.py'), ''),
+                               (os.path.join('hsabs_pkg', 'sub.py'), 'VALUE = 10\n')):
+                with open(os.path.join(dir_, name), 'w') as f:
+                    f.write(body)
+            m = hotswapping.create_descriptor_from_fs(os.path.join(dir_, 'hsabs_top.py'))
+            self.assertEqual(11, hotswapping.load(m, isolated=True).VALUE)
+            self.assertNotIn('hsabs_sib', hotswapping.sys.modules)
+            self.assertIn(m.namespace + '.hsabs_pkg.sub', hotswapping.sys.modules)
+            self.assertEqual(5, hotswapping.unload(m))
+        finally:
+            shutil.rmtree(root)
+
+
+class TestIncrementalStage(unittest.TestCase):
+    """
+    hsinc_top imports hsinc_a and hsinc_b, hsinc_a imports hsinc_c; only hsinc_c differs between the two versions
+    """
+
+    FILES = {
+        'hsinc_top.py': 'import hsinc_a\nimport hsinc_b\n',
+        'hsinc_a.py': 'from hsinc_c import VALUE\n',
+        'hsinc_b.py': 'VALUE = 2\n',
+    }
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        for version, value in (('1.0.0', 1), ('2.0.0', 10)):
+            os.mkdir(os.path.join(self.root, version))
+            files = dict(self.FILES)
+            files['hsinc_c.py'] = 'VALUE = {}\n'.format(value)
+            for fn, body in files.items():
+                with open(os.path.join(self.root, version, fn), 'w') as f:
+                    f.write(body)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+        for name in ('hsinc_top', 'hsinc_a', 'hsinc_b', 'hsinc_c'):
+            hotswapping.sys.modules.pop(name, None)
+
+    def descriptor(self, version):
+        return hotswapping.create_descriptor_from_fs(os.path.join(self.root, version, 'hsinc_top.py'))
+
+    def test_load_expectDependencyGraphRecorded(self):
+        m = self.descriptor('1.0.0')
+        hotswapping.load(m, record_graph=True)
+        try:
+            self.assertEqual({'hsinc_top': set(['hsinc_a', 'hsinc_b']), 'hsinc_a': set(['hsinc_c']),
+                              'hsinc_b': set(), 'hsinc_c': set()}, m.dependencies)
+            self.assertEqual('hsinc_c.py', m.sources['hsinc_c'][0])
+        finally:
+            hotswapping.unload(m)
+
+    def test_loadByDefault_expectNothingRecorded(self):
+        m = self.descriptor('1.0.0')
+        real_import = hotswapping.__builtin__.__import__
+        imports = list()
+
+        def _(*args, **kwargs):
+            imports.append(args[0])
+            return real_import(*args, **kwargs)
+
+        hotswapping.__builtin__.__import__ = _
+        try:
+            hotswapping.load(m)
+            self.assertIn('hsinc_a', imports)
+            self.assertIs(_, hotswapping.__builtin__.__import__)
+            self.assertIsNone(m.sources)
+        finally:
+            hotswapping.__builtin__.__import__ = real_import
+            hotswapping.unload(m)
+
+    def test_stage_expectOnlyChangedModulesAndDependentsExecuted(self):
+        for isolated in (False, True):
+            old_m = self.descriptor('1.0.0')
+            old_top = hotswapping.load(old_m, isolated=isolated, record_graph=True)
+            new_m = self.descriptor('2.0.0')
+            new_top = hotswapping.stage(old_m, new_m, isolated=isolated, incremental=True)
+            try:
+                self.assertEqual(10, new_top.hsinc_a.VALUE)
+                self.assertIs(old_top.hsinc_b, new_top.hsinc_b)
+                self.assertIsNot(old_top.hsinc_a, new_top.hsinc_a)
+                self.assertEqual(set(['hsinc_top', 'hsinc_a', 'hsinc_b', 'hsinc_c']), set(new_m.sources))
+            finally:
+                self.assertEqual(4, hotswapping.unload(new_m) - (1 if isolated else 0))
+            self.assertEqual(0, hotswapping.unload(old_m))
+
+    def test_nothingChanged_expectNothingExecuted(self):
+        other = os.path.join(self.root, '1.0.1')
+        shutil.copytree(os.path.join(self.root, '1.0.0'), other)
+        old_m = self.descriptor('1.0.0')
+        old_top = hotswapping.load(old_m, record_graph=True)
+        new_m = self.descriptor('1.0.1')
+        try:
+            self.assertIs(old_top, hotswapping.stage(old_m, new_m, incremental=True))
+        finally:
+            self.assertEqual(4, hotswapping.unload(new_m))
+
+    def test_incrementalGetter_expectNewValue(self):
+        getter = hotswapping.SymbolGetter(os.path.join(self.root, '1.0.0', 'hsinc_top.py'), max_age=3600,
+                                          incremental=True)
+        b = getter('hsinc_b')
+        self.assertEqual(1, getter('hsinc_a').VALUE)
+        getter.timer_rule.max_age = -1
+        self.assertEqual(10, getter('hsinc_a').VALUE)
+        self.assertIs(b, getter('hsinc_b'))
+
 
 if __name__ == '__main__':
     unittest.main()
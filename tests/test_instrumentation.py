@@ -0,0 +1,67 @@
+
+import os
+import unittest
+
+import hotswapping
+
+
+class TestInstrumentation(unittest.TestCase):
+
+    def setUp(self):
+        self.module_path = os.path.abspath(
+            os.path.join(os.path.dirname(__file__), 'testdata', '1.0.2', 'foobar.py')
+        )
+        self.module = 'fs:{}/*/foobar.py'.format(os.path.dirname(os.path.dirname(self.module_path)))
+        self.sink = hotswapping.DictSink()
+        self.events = list()
+        hotswapping.INSTRUMENTATION = hotswapping.Instrumentation(
+            [self.sink, hotswapping.CallbackSink(self.events.append)]
+        )
+
+    def tearDown(self):
+        hotswapping.INSTRUMENTATION = None
+
+    def test_swap_expectOperationsMeasured(self):
+        getter = hotswapping.SymbolGetter(self.module_path, max_age=3600)
+        self.assertEqual(3, getter('FOOBAR'))
+        getter.timer_rule.max_age = -1
+        self.assertEqual(39, getter('FOOBAR'))
+        snapshot = self.sink.snapshot()
+        self.assertEqual({self.module: '2.1.0'}, snapshot['versions'])
+        self.assertEqual({self.module: 1}, snapshot['swaps'])
+        operations = snapshot['operations']
+        for op in ('renew', 'search', 'load', 'unload'):
+            self.assertTrue(operations[op, self.module]['count'] >= 1, op)
+        self.assertEqual(3, operations['unload', self.module]['items'])
+        self.assertEqual(['serving', 'swap'], [e['kind'] for e in self.events if e['kind'] != 'observe'])
+
+    def test_prometheus_expectTextExposition(self):
+        m = hotswapping.create_descriptor_from_fs(self.module_path)
+        hotswapping.load(m)
+        hotswapping.unload(m)
+        text = self.sink.prometheus()
+        labels = 'op="unload",module="{}"'.format(self.module)
+        self.assertIn('# TYPE hotswapping_operation_seconds histogram\n', text)
+        self.assertIn('hotswapping_operation_seconds_bucket{{{},le="+Inf"}} 1\n'.format(labels), text)
+        self.assertIn('hotswapping_operation_items_total{{{}}} 3\n'.format(labels), text)
+
+    def test_failingSink_expectOperationUnaffected(self):
+
+        def _(event):
+            raise RuntimeError()
+
+        hotswapping.INSTRUMENTATION = hotswapping.Instrumentation([hotswapping.CallbackSink(_)])
+        m = hotswapping.create_descriptor_from_fs(self.module_path)
+        self.assertEqual(3, hotswapping.load(m).FOOBAR)
+        self.assertEqual(3, hotswapping.unload(m))
+
+    def test_disabled_expectNothingRecorded(self):
+        hotswapping.INSTRUMENTATION = None
+        m = hotswapping.create_descriptor_from_fs(self.module_path)
+        hotswapping.load(m)
+        hotswapping.unload(m)
+        self.assertEqual(dict(), self.sink.snapshot()['operations'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -35,5 +35,58 @@ class TestProxy(unittest.TestCase):
         self.assertEqual(1, p.do())
 
 
+class TestModuleProxy(unittest.TestCase):
+
+    def setUp(self):
+        self.module_path = os.path.abspath(
+            os.path.join(os.path.dirname(__file__), 'testdata', '1.0.2', 'foobar.py')
+        )
+
+    def test_expectCurrentVersion(self):
+        getter = hotswapping.SymbolGetter(self.module_path, max_age=3600)
+        proxy = getter.proxy()
+        self.assertEqual(3, proxy.FOOBAR)
+        self.assertEqual(0, proxy.Doer().do())
+        getter.timer_rule.max_age = -1
+        self.assertEqual(39, proxy.FOOBAR)
+        self.assertEqual(1, proxy.Doer().do())
+
+    def test_sameGeneration_expectAttributeResolvedOnce(self):
+        reloader = hotswapping.RenewalManager()
+        getter = hotswapping.SymbolGetter(self.module_path, max_age=-1, reloader=reloader)
+        proxy = getter.proxy()
+        self.assertEqual(3, proxy.FOOBAR)
+        getter._live[1].FOOBAR = 4
+        self.assertEqual(3, proxy.FOOBAR)
+        self.assertEqual(1, reloader.tick())
+        self.assertEqual(39, proxy.FOOBAR)
+
+    def test_missingAttribute_expectAttributeError(self):
+        proxy = hotswapping.SymbolGetter(self.module_path, max_age=3600).proxy()
+        self.assertRaises(AttributeError, getattr, proxy, 'not_there')
+        self.assertRaises(AttributeError, setattr, proxy, 'not_there', 1)
+
+
+class TestSymbolProxy(unittest.TestCase):
+
+    def setUp(self):
+        self.module_path = os.path.abspath(
+            os.path.join(os.path.dirname(__file__), 'testdata', '1.0.2', 'foobar.py')
+        )
+
+    def test_expectCurrentVersionCalled(self):
+        getter = hotswapping.SymbolGetter(self.module_path, max_age=3600)
+        doer = getter.proxy('Doer')
+        self.assertEqual(0, doer().do())
+        self.assertTrue(doer.do)
+        getter.timer_rule.max_age = -1
+        self.assertEqual(1, doer().do())
+
+    def test_missingSymbol_expectAttributeError(self):
+        proxy = hotswapping.SymbolGetter(self.module_path, max_age=3600).proxy('not_there')
+        self.assertRaises(AttributeError, proxy)
+        self.assertRaises(AttributeError, proxy)
+
+
 if __name__ == '__main__':
     unittest.main()
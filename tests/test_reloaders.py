@@ -0,0 +1,212 @@
+
+import os
+import signal
+import threading
+import time
+import unittest
+
+import hotswapping
+
+
+class TestBackgroundReloader(unittest.TestCase):
+
+    def setUp(self):
+        self.module_path = os.path.abspath(
+            os.path.join(os.path.dirname(__file__), 'testdata', '1.0.2', 'foobar.py')
+        )
+
+    def test_registeredGetter_expectNotRenewedOnCall(self):
+        reloader = hotswapping.BackgroundReloader(interval=3600)
+        try:
+            getter = hotswapping.SymbolGetter(self.module_path, max_age=-1, reloader=reloader)
+            self.assertEqual(3, getter('FOOBAR'))
+            self.assertEqual(3, getter('FOOBAR'))
+            self.assertEqual(1, reloader.tick())
+            self.assertEqual(39, getter('FOOBAR'))
+            self.assertEqual(0, reloader.tick())
+        finally:
+            reloader.stop()
+
+    def test_expectRenewedByThread(self):
+        reloader = hotswapping.BackgroundReloader(interval=0.01)
+        try:
+            getter = hotswapping.SymbolGetter(self.module_path, max_age=0.05, reloader=reloader)
+            self.assertEqual(0, getter('Doer')().do())
+            time.sleep(0.3)
+            self.assertEqual(1, getter('Doer')().do())
+        finally:
+            reloader.stop()
+
+    def test_failingGetter_expectOthersRefreshed(self):
+
+        class _(object):
+
+            def refresh(self):
+                raise RuntimeError()
+
+        reloader = hotswapping.BackgroundReloader(interval=3600)
+        try:
+            broken = _()
+            reloader.register(broken)
+            getter = hotswapping.SymbolGetter(self.module_path, max_age=-1, reloader=reloader)
+            self.assertEqual(1, reloader.tick())
+            self.assertEqual(39, getter('FOOBAR'))
+        finally:
+            reloader.stop()
+
+    def test_getterCollected_expectUnregistered(self):
+        reloader = hotswapping.BackgroundReloader(interval=3600)
+        try:
+            hotswapping.SymbolGetter(self.module_path, max_age=-1, reloader=reloader)
+            self.assertEqual(0, reloader.tick())
+        finally:
+            reloader.stop()
+
+
+class TestRenewalManager(unittest.TestCase):
+
+    def setUp(self):
+        self.module_path = os.path.abspath(
+            os.path.join(os.path.dirname(__file__), 'testdata', '1.0.2', 'foobar.py')
+        )
+        self.iter_dir = hotswapping.NewerSemanticVersion.iter_dir
+        self.listed = list()
+
+        def _(dir_path):
+            self.listed.append(dir_path)
+            return self.iter_dir(dir_path)
+
+        hotswapping.NewerSemanticVersion.iter_dir = staticmethod(_)
+
+    def tearDown(self):
+        hotswapping.NewerSemanticVersion.iter_dir = staticmethod(self.iter_dir)
+
+    def test_gettersSharingVersionRoot_expectOneScan(self):
+        manager = hotswapping.RenewalManager()
+        getters = [hotswapping.SymbolGetter(self.module_path, max_age=-1, reloader=manager) for _ in range(20)]
+        self.assertEqual(20, manager.tick())
+        self.assertEqual(1, len(self.listed))
+        for getter in getters:
+            self.assertEqual(39, getter('FOOBAR'))
+        self.assertEqual(0, manager.tick())
+
+    def test_gettersNotDue_expectNoScan(self):
+        manager = hotswapping.RenewalManager()
+        getters = [hotswapping.SymbolGetter(self.module_path, max_age=3600, reloader=manager) for _ in range(5)]
+        self.assertEqual(0, manager.tick())
+        self.assertFalse(self.listed)
+        self.assertEqual(3, getters[0]('FOOBAR'))
+
+    def test_getterBeingRenewed_expectSkipped(self):
+        manager = hotswapping.RenewalManager()
+        getter = hotswapping.SymbolGetter(self.module_path, max_age=-1, reloader=manager)
+        locked = threading.Event()
+        done = threading.Event()
+
+        def _():
+            with getter._lock:
+                locked.set()
+                done.wait(5)
+
+        t = threading.Thread(target=_)
+        t.start()
+        locked.wait(5)
+        try:
+            self.assertEqual(0, manager.tick())
+        finally:
+            done.set()
+            t.join()
+        self.assertEqual(1, manager.tick())
+
+
+class TestPrefork(unittest.TestCase):
+
+    def setUp(self):
+        self.module_path = os.path.abspath(
+            os.path.join(os.path.dirname(__file__), 'testdata', '1.0.2', 'foobar.py')
+        )
+
+    def test_preload_expectNoImportOnCall(self):
+        manager = hotswapping.RenewalManager()
+        getters = [hotswapping.SymbolGetter(self.module_path, max_age=3600, reloader=manager) for _ in range(3)]
+        self.assertEqual(3, manager.preload())
+        load = hotswapping.load
+
+        def _(m, **kwargs):
+            raise AssertionError()
+
+        hotswapping.load = _
+        try:
+            for getter in getters:
+                self.assertEqual(3, getter('FOOBAR'))
+        finally:
+            hotswapping.load = load
+
+    def test_preloadedBeforeFork_expectSharedByChild(self):
+        reloader = hotswapping.BackgroundReloader(interval=3600)
+        try:
+            getter = hotswapping.SymbolGetter(self.module_path, max_age=3600, reloader=reloader)
+            reloader.preload()
+            pid = os.fork()
+            if pid == 0:
+                status = 1
+                try:
+                    hotswapping.load = None
+                    reloader.after_fork()
+                    if getter('FOOBAR') == 3 and reloader._thread.is_alive():
+                        status = 0
+                finally:
+                    os._exit(status)
+            _, status = os.waitpid(pid, 0)
+            self.assertEqual(0, status)
+        finally:
+            reloader.stop()
+
+    def test_lockHeldAtFork_expectChildNotBlocked(self):
+        hotswapping.CONTENT_STORE = hotswapping.ContentStore()
+        held, release = threading.Event(), threading.Event()
+
+        def _():
+            with hotswapping._IMPORT_LOCK, hotswapping.CONTENT_STORE._lock:
+                held.set()
+                release.wait()
+
+        t = threading.Thread(target=_)
+        t.start()
+        try:
+            held.wait()
+            manager = hotswapping.RenewalManager()
+            getter = hotswapping.SymbolGetter(self.module_path, max_age=-1, reloader=manager)
+            pid = os.fork()
+            if pid == 0:
+                status = 1
+                try:
+                    signal.alarm(5)
+                    manager.after_fork()
+                    if manager.tick() == 1 and getter('FOOBAR') == 39:
+                        status = 0
+                finally:
+                    os._exit(status)
+            _, status = os.waitpid(pid, 0)
+            self.assertEqual(0, status)
+        finally:
+            release.set()
+            t.join()
+            hotswapping.CONTENT_STORE = None
+
+    def test_stagger_expectSwapDeferred(self):
+        manager = hotswapping.RenewalManager(stagger=3600)
+        self.assertTrue(0 <= manager.delay() < 3600)
+        manager.delay = lambda: 0.05
+        getter = hotswapping.SymbolGetter(self.module_path, max_age=-1, reloader=manager)
+        self.assertEqual(3, getter('FOOBAR'))
+        self.assertEqual(0, manager.tick())
+        self.assertEqual(0, manager.tick())
+        self.assertEqual(3, getter('FOOBAR'))
+        time.sleep(0.1)
+        self.assertEqual(1, manager.tick())
+        self.assertEqual(39, getter('FOOBAR'))
+
+
+if __name__ == '__main__':
+    unittest.main()
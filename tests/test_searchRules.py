@@ -1,4 +1,6 @@
 
+import os
+
 import hotswapping
 
 import unittest
@@ -66,6 +68,49 @@ class TestNewerSemanticVersion(unittest.TestCase):
         self.rule.iter_dir = _
         self.assertFalse(self.rule.search(m))
 
+    def test_directoryUnchanged_expectListedOnce(self):
+        m = MockModuleDescriptor('/dir/mo/1.0.0/f.py')
+        listed = list()
+
+        def _(d):
+            listed.append(d)
+            return iter([('1.2.0', '/dir/mo/1.2.0'),
+                         ('1.0.0', '/dir/mo/1.0.0')])
+
+        self.rule.iter_dir = _
+        self.rule.dir_signature = lambda d: (123.0, 4)
+        self.assertEqual('/dir/mo/1.2.0/f.py', self.rule.search(m))
+        self.assertEqual('/dir/mo/1.2.0/f.py', self.rule.search(m))
+        self.assertEqual(['/dir/mo'], listed)
+        self.rule.dir_signature = lambda d: (124.0, 5)
+        self.assertEqual('/dir/mo/1.2.0/f.py', self.rule.search(m))
+        self.assertEqual(['/dir/mo', '/dir/mo'], listed)
+
+    def test_directoryNotStatable_expectNotCached(self):
+        m = MockModuleDescriptor('/dir/mo/1.0.0/f.py')
+        listed = list()
+
+        def _(d):
+            listed.append(d)
+            return iter([('1.2.0', '/dir/mo/1.2.0')])
+
+        self.rule.iter_dir = _
+        self.rule.search(m)
+        self.rule.search(m)
+        self.assertEqual(2, len(listed))
+
+    def test_index_expectSortedVersions(self):
+        testdata = os.path.join(os.path.dirname(__file__), 'testdata')
+        index = self.rule.index(testdata)
+        self.assertEqual(['1.0.2', '2.1.0'], [fn for _, fn, _ in index.sorted()])
+        self.assertEqual((2, 1, 0), index.max()[0])
+        self.assertIs(index, self.rule.index(testdata))
+
+    def test_parseVersion(self):
+        self.assertEqual((1, 0, 2), hotswapping.parse_version('1.0.2'))
+        self.assertEqual((1, 0, 0), hotswapping.parse_version('01.000.0'))
+        self.assertIsNone(hotswapping.parse_version('.git'))
+
 
 class TestNewPackageVersion(unittest.TestCase):
 
@@ -92,6 +137,21 @@ class TestNewPackageVersion(unittest.TestCase):
         new_package = self.sut.search(m)
         self.assertFalse(new_package)
 
+    def test_searchMany_expectOneGetAllPerBaseName(self):
+        base_names = list()
+        get_all = self.dao.get_all
+
+        def _(base_name, **kwargs):
+            base_names.append(base_name)
+            return get_all(base_name, **kwargs)
+
+        self.dao.get_all = _
+        ms = [hotswapping.create_descriptor_from_package_dao(p, self.dao, fs_creator=self._create_fake_m)
+              for p in ('doom-1.0', 'doom-1.1', 'doom-1.2')]
+        self.assertEqual(['doom-1.2', 'doom-1.2', None], self.sut.search_many(ms))
+        self.assertEqual(['doom'], base_names)
+        self.assertEqual(self.sut.group_key(ms[0]), self.sut.group_key(ms[2]))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,139 @@
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import hotswapping
+
+from test_importFromPackage import TestDataDao
+
+
+class TestSharedRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.dir_ = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir_, 'registry')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir_)
+
+    def test_publish_expectSeenByOtherRegistry(self):
+        writer = hotswapping.SharedRegistry(self.path, num_slots=8)
+        reader = hotswapping.SharedRegistry(self.path, num_slots=8)
+        self.assertIsNone(reader.read('doom'))
+        self.assertEqual(1, writer.publish('doom', 'doom-1.0'))
+        self.assertEqual(1, writer.publish('doom', 'doom-1.0'))
+        self.assertEqual(2, writer.publish('doom', 'doom-1.1'))
+        self.assertEqual((2, 'doom-1.1'), reader.read('doom')[:2])
+
+    def test_collidingKeys_expectKeptApart(self):
+        registry = hotswapping.SharedRegistry(self.path, num_slots=2)
+        registry.publish('a', '1')
+        registry.publish('b', '2')
+        self.assertIsNone(registry.publish('c', '3'))
+        self.assertEqual(['1', '2', None], [(registry.read(k) or (None, None))[1] for k in 'abc'])
+
+    def test_claim_expectOneSearcherPerInterval(self):
+        lhs = hotswapping.SharedRegistry(self.path)
+        rhs = hotswapping.SharedRegistry(self.path)
+        self.assertTrue(lhs.claim('doom', 60))
+        self.assertFalse(rhs.claim('doom', 60))
+        self.assertTrue(rhs.claim('doom', -1))
+
+    def test_mismatchingLayout_expectRefused(self):
+        hotswapping.SharedRegistry(self.path, num_slots=8)
+        self.assertRaises(ValueError, hotswapping.SharedRegistry, self.path, num_slots=16)
+
+    def test_publishedByOtherProcess_expectSeen(self):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                hotswapping.SharedRegistry(self.path).publish('doom', 'doom-1.2')
+            finally:
+                os._exit(0)
+        os.waitpid(pid, 0)
+        self.assertEqual('doom-1.2', hotswapping.SharedRegistry(self.path).read('doom')[1])
+
+    def test_afterFork_expectOwnDescriptor(self):
+        registry = hotswapping.SharedRegistry(self.path)
+        fd = registry._fd
+        pid = os.fork()
+        if pid == 0:
+            try:
+                registry.after_fork()
+                registry.publish('doom', 'doom-1.3' if registry._fd != fd else 'doom-1.2')
+            finally:
+                os._exit(0)
+        os.waitpid(pid, 0)
+        self.assertEqual('doom-1.3', registry.read('doom')[1])
+
+
+class TestSharedSearch(unittest.TestCase):
+
+    def setUp(self):
+        self.dir_ = tempfile.mkdtemp()
+        self.module_path = os.path.abspath(
+            os.path.join(os.path.dirname(__file__), 'testdata', '1.0.2', 'foobar.py')
+        )
+        self.iter_dir = hotswapping.NewerSemanticVersion.iter_dir
+        self.listed = list()
+
+        def _(dir_path):
+            self.listed.append(dir_path)
+            return self.iter_dir(dir_path)
+
+        hotswapping.NewerSemanticVersion.iter_dir = staticmethod(_)
+
+    def tearDown(self):
+        hotswapping.NewerSemanticVersion.iter_dir = staticmethod(self.iter_dir)
+        shutil.rmtree(self.dir_)
+
+    def test_workers_expectOneSearchAndSameVersion(self):
+        path = os.path.join(self.dir_, 'registry')
+        getters = [hotswapping.SymbolGetter(self.module_path, max_age=3600,
+                                            registry=hotswapping.SharedRegistry(path))
+                   for _ in range(4)]
+        for getter in getters:
+            getter.search_rule.interval = 60
+            getter.timer_rule.max_age = -1
+            self.assertEqual(39, getter('FOOBAR'))
+        self.assertEqual(1, len(self.listed))
+
+    def test_upToDate_expectNothingFound(self):
+        path = os.path.join(self.dir_, 'registry')
+        rule = hotswapping.SharedSearch(hotswapping.NewerSemanticVersion(), hotswapping.SharedRegistry(path))
+        m = hotswapping.create_descriptor_from_fs(self.module_path)
+        found = rule.search(m)
+        self.assertTrue(found.endswith('2.1.0/foobar.py'))
+        self.assertIsNone(rule.search(hotswapping.create_descriptor_from_fs(found)))
+        self.assertEqual(1, len(self.listed))
+
+    def test_aheadOfRegistry_expectNotDowngraded(self):
+        path = os.path.join(self.dir_, 'registry')
+        root = os.path.join(self.dir_, 'm')
+        for version in ('1.0.0', '2.0.0'):
+            os.makedirs(os.path.join(root, version))
+            with open(os.path.join(root, version, 'm.py'), 'w') as f:
+                f.write('\n')
+        os.rename(os.path.join(root, '2.0.0'), os.path.join(self.dir_, '2.0.0'))
+        lhs = hotswapping.SharedSearch(hotswapping.NewerSemanticVersion(), hotswapping.SharedRegistry(path), 60)
+        self.assertEqual('', lhs.search(hotswapping.create_descriptor_from_fs(os.path.join(root, '1.0.0', 'm.py'))))
+        os.rename(os.path.join(self.dir_, '2.0.0'), os.path.join(root, '2.0.0'))
+        rhs = hotswapping.SharedSearch(hotswapping.NewerSemanticVersion(), hotswapping.SharedRegistry(path), 60)
+        self.assertIsNone(rhs.search(hotswapping.create_descriptor_from_fs(os.path.join(root, '2.0.0', 'm.py'))))
+
+    def test_packageAheadOfRegistry_expectNotDowngraded(self):
+        dao = TestDataDao()
+        registry = hotswapping.SharedRegistry(os.path.join(self.dir_, 'registry'))
+        registry.claim('package:foobar', 60)
+        registry.publish('package:foobar', 'foobar-1.0.2')
+        rule = hotswapping.SharedSearch(hotswapping.NewerPackageVersion(dao), registry, 60)
+        self.assertIsNone(rule.search(hotswapping.create_descriptor_from_package_dao('foobar-2.1.0', dao)))
+        m = hotswapping.create_descriptor_from_package_dao('foobar-1.0.2', dao)
+        registry.publish('package:foobar', 'foobar-2.1.0')
+        self.assertEqual('foobar-2.1.0', rule.search(m))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,4 +1,6 @@
 
+import os
+
 import hotswapping
 
 import unittest
@@ -29,5 +31,102 @@ class TestMaxAge(unittest.TestCase):
         self.assertFalse(self.m.deprecated)
 
 
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestScheduledRules(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.monotonic = hotswapping.monotonic
+        hotswapping.monotonic = self.clock
+        self.m = MockModuleDescriptor(1)
+
+    def tearDown(self):
+        hotswapping.monotonic = self.monotonic
+
+    def test_jitteredMaxAge_expectIntervalWithinJitter(self):
+        rule = hotswapping.JitteredMaxAge(100, jitter=0.2)
+        intervals = [rule.interval(0) for _ in range(100)]
+        self.assertTrue(all(80 <= _ <= 120 for _ in intervals))
+        self.assertTrue(len(set(intervals)) > 1)
+
+    def test_backoffMaxAge_expectIntervalsGrowUpToMax(self):
+        rule = hotswapping.BackoffMaxAge(10, factor=2, max_interval=50)
+        self.assertEqual([10, 20, 40, 50, 50], [rule.interval(n) for n in range(5)])
+
+    def test_backoffMaxAge_expectRetiredOnSchedule(self):
+        rule = hotswapping.BackoffMaxAge(10, factor=2)
+        self.assertFalse(rule.due(self.m))
+        self.clock.now += 10
+        self.assertTrue(rule.due(self.m))
+        self.assertTrue(rule.retire(self.m))
+        self.assertTrue(self.m.deprecated)
+        self.clock.now += 19
+        self.assertFalse(rule.retire(self.m))
+        self.clock.now += 1
+        self.assertTrue(rule.retire(self.m))
+
+    def test_minSpacing_expectRetiredOncePerSpacing(self):
+        rule = hotswapping.MinSpacing(hotswapping.MaxAge(-1), 5)
+        self.assertTrue(rule.retire(self.m))
+        self.clock.now += 4
+        self.assertFalse(rule.due(self.m))
+        self.assertFalse(rule.retire(self.m))
+        self.clock.now += 1
+        self.assertTrue(rule.retire(self.m))
+
+
+class TestSearchesPerCalls(unittest.TestCase):
+    """
+    A getter already serving the newest version, called once per second for 100 seconds
+    """
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.monotonic = hotswapping.monotonic
+        hotswapping.monotonic = self.clock
+        self.module_path = os.path.abspath(
+            os.path.join(os.path.dirname(__file__), 'testdata', '2.1.0', 'foobar.py')
+        )
+
+    def tearDown(self):
+        hotswapping.monotonic = self.monotonic
+
+    def count_searches(self, timer_rule):
+        getter = hotswapping.SymbolGetter(self.module_path, timer_rule=timer_rule)
+        search = getter.search_rule.search
+        searches = [0]
+
+        def _(m):
+            searches[0] += 1
+            return search(m)
+
+        getter.search_rule.search = _
+        for _ in range(100):
+            self.assertEqual(39, getter('FOOBAR'))
+            self.clock.now += 1
+        return searches[0]
+
+    def test_maxAgeExpired_expectSearchOnEveryCall(self):
+        self.assertEqual(100, self.count_searches(hotswapping.MaxAge(-1)))
+
+    def test_minSpacing_expectSearchEveryTenCalls(self):
+        self.assertEqual(10, self.count_searches(hotswapping.MinSpacing(hotswapping.MaxAge(-1), 10)))
+
+    def test_jitteredMaxAge_expectSearchAboutEveryTenCalls(self):
+        self.assertTrue(8 <= self.count_searches(hotswapping.JitteredMaxAge(10, jitter=0.2)) <= 12)
+
+    def test_backoff_expectSearchesLogarithmic(self):
+        # due after 1, 3, 7, 15, 31, 63 seconds
+        self.assertEqual(6, self.count_searches(hotswapping.BackoffMaxAge(1, factor=2)))
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,91 @@
+
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+import hotswapping
+
+import packageFoo
+
+
+class TestVersionSchemes(unittest.TestCase):
+
+    def assertOrdered(self, scheme, versions):
+        shuffled = list(versions)
+        random.shuffle(shuffled)
+        self.assertEqual(versions, sorted(shuffled, key=scheme.key))
+        for v in versions:
+            self.assertIsNotNone(scheme.key(v), v)
+
+    def test_semver_expectSpecPrecedence(self):
+        self.assertOrdered(hotswapping.SEMVER, [
+            '1.0.0-alpha', '1.0.0-alpha.1', '1.0.0-alpha.beta', '1.0.0-beta', '1.0.0-beta.2', '1.0.0-beta.11',
+            '1.0.0-rc.1', '1.0.0', '1.0.1', '1.10.0', '2.0.0',
+        ])
+        self.assertEqual(hotswapping.SEMVER.key('1.0.0+build.5'), hotswapping.SEMVER.key('1.0.0'))
+        self.assertIsNone(hotswapping.SEMVER.key('1.0'))
+        self.assertIsNone(hotswapping.SEMVER.key('01.0.0'))
+
+    def test_pep440_expectSpecOrdering(self):
+        self.assertOrdered(hotswapping.PEP440, [
+            '1.0.dev456', '1.0a1', '1.0a2.dev456', '1.0a12.dev456', '1.0a12', '1.0b1.dev456', '1.0b2',
+            '1.0b2.post345.dev456', '1.0b2.post345', '1.0rc1.dev456', '1.0rc1', '1.0', '1.0+abc.5', '1.0+abc.7',
+            '1.0+5', '1.0.post456.dev34', '1.0.post456', '1.1.dev1', '1!0.1',
+        ])
+        self.assertEqual(hotswapping.PEP440.key('1.0.0'), hotswapping.PEP440.key('1.0'))
+        self.assertEqual(hotswapping.PEP440.key('1.0-alpha-1'), hotswapping.PEP440.key('1.0a1'))
+        self.assertIsNone(hotswapping.PEP440.key('1.0-foo'))
+
+    def test_calver_expectChronologicalOrder(self):
+        self.assertOrdered(hotswapping.CALVER, ['23.12', '2024.01', '2024.1.1', '2024.01.15', '2024-02', '2024.10'])
+        self.assertIsNone(hotswapping.CALVER.key('2024.13'))
+
+    def test_key_expectParsedOnce(self):
+        scheme = hotswapping.SemVer()
+        parsed = list()
+        parse = scheme.parse
+        scheme.parse = lambda s: parsed.append(s) or parse(s)
+        self.assertEqual('1.10.0', scheme.newest(['1.2.0', '1.10.0', 'junk', '1.9.9']))
+        self.assertEqual('1.10.0', scheme.newest(['1.2.0', '1.10.0', 'junk', '1.9.9']))
+        self.assertEqual(4, len(parsed))
+
+    def test_splitPath_expectLastVersionComponent(self):
+        self.assertEqual(('/vol/1.0/doom', '2.0rc1', 'lib/main.py'),
+                         hotswapping.PEP440.split_path('/vol/1.0/doom/2.0rc1/lib/main.py'))
+        self.assertIsNone(hotswapping.PEP440.split_path('/vol/doom/main.py'))
+
+
+class TestSearchWithScheme(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        for version in ('1.0', '1.1rc1', '1.1', '1.2.dev0', 'junk'):
+            os.mkdir(os.path.join(self.root, version))
+            with open(os.path.join(self.root, version, 'main.py'), 'w') as f:
+                f.write('\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_newerSemanticVersion_expectNewestInScheme(self):
+        rule = hotswapping.NewerSemanticVersion(check_existence=True, scheme=hotswapping.PEP440)
+        m = hotswapping.create_descriptor_from_fs(os.path.join(self.root, '1.1rc1', 'main.py'))
+        self.assertEqual(os.path.join(self.root, '1.2.dev0', 'main.py'), rule.search(m))
+        m = hotswapping.create_descriptor_from_fs(os.path.join(self.root, '1.2.dev0', 'main.py'))
+        self.assertEqual('', rule.search(m))
+
+    def test_newerPackageVersion_expectMaxSelectedByKey(self):
+        dao = packageFoo.PackageFoo()
+        dao.get_all = lambda base_name, **kwargs: ['doom-1.10', 'doom-1.9', 'doom-1.2']
+        rule = hotswapping.NewerPackageVersion(dao, scheme=hotswapping.PEP440)
+        m = hotswapping.ModuleDescriptor()
+        m.version_meta = dict(base_name='doom', version='1.2', package='doom-1.2')
+        self.assertEqual('doom-1.10', rule.search(m))
+        m.version_meta = dict(base_name='doom', version='1.10', package='doom-1.10')
+        self.assertIsNone(rule.search(m))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import hotswapping
+
+import packageFoo
+
+
+class TestVersionSpec(unittest.TestCase):
+
+    def select(self, spec, versions):
+        keys = sorted(spec.scheme.key(v) for v in versions)
+        i = spec.select(keys)
+        return None if i is None else [v for v in versions if spec.scheme.key(v) == keys[i]][0]
+
+    def test_range_expectNewestWithin(self):
+        spec = hotswapping.VersionSpec('>=1.0,<2')
+        self.assertEqual('1.9.3', self.select(spec, ['0.9.0', '1.0.0', '1.9.3', '2.0.0', '2.1.0']))
+        self.assertIsNone(self.select(spec, ['0.9.0', '2.0.0']))
+
+    def test_compatibleRelease_expectSameMajor(self):
+        spec = hotswapping.VersionSpec('~=1.4', scheme=hotswapping.PEP440)
+        self.assertEqual('1.9', self.select(spec, ['1.3', '1.4', '1.9', '2.0.dev1', '2.0']))
+        spec = hotswapping.VersionSpec('~=1.4.5', scheme=hotswapping.SEMVER)
+        self.assertEqual('1.4.9', self.select(spec, ['1.4.4', '1.4.9', '1.5.0-rc.1', '1.5.0']))
+
+    def test_exclude_expectSkipped(self):
+        spec = hotswapping.VersionSpec('==1.*,!=1.9.3', exclude=['1.9.2'])
+        self.assertEqual('1.2.0', self.select(spec, ['1.2.0', '1.9.2', '1.9.3', '2.0.0']))
+        self.assertFalse(spec.allows(hotswapping.STRICT_VERSION.key('1.9.2')))
+        self.assertTrue(spec.allows(hotswapping.STRICT_VERSION.key('1.2.0')))
+
+    def test_prereleases_expectSkippedUnlessAllowed(self):
+        versions = ['1.0', '1.1rc1']
+        self.assertEqual('1.0', self.select(hotswapping.VersionSpec('', scheme=hotswapping.PEP440), versions))
+        spec = hotswapping.VersionSpec('', scheme=hotswapping.PEP440, prereleases=True)
+        self.assertEqual('1.1rc1', self.select(spec, versions))
+
+    def test_partialVersion_expectPaddedRelease(self):
+        for scheme in (hotswapping.STRICT_VERSION, hotswapping.SEMVER):
+            allows = lambda spec, v: hotswapping.VersionSpec(spec, scheme=scheme).allows(scheme.key(v))
+            self.assertFalse(allows('>1.0', '1.0.0'))
+            self.assertTrue(allows('>1.0', '1.0.1'))
+            self.assertTrue(allows('<=1.0', '1.0.0'))
+            self.assertFalse(allows('<=1.0', '1.0.1'))
+            self.assertTrue(allows('==1.0', '1.0.0'))
+            self.assertFalse(allows('==1.0', '1.0.1'))
+            self.assertFalse(allows('!=1.0', '1.0.0'))
+            self.assertTrue(allows('!=1.0', '1.0.1'))
+            self.assertFalse(hotswapping.VersionSpec('', exclude=['1'], scheme=scheme).allows(scheme.key('1.0.0')))
+        self.assertRaises(ValueError, hotswapping.VersionSpec, '==2024', scheme=hotswapping.CALVER)
+
+    def test_invalidClause_expectValueError(self):
+        self.assertRaises(ValueError, hotswapping.VersionSpec, '>=doom')
+        self.assertRaises(ValueError, hotswapping.VersionSpec, '=>1.0')
+        self.assertRaises(ValueError, hotswapping.VersionSpec, '~=1')
+
+
+class TestConstrainedSearch(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        for version in ('1.0.0', '1.1.0', '1.2.0', '2.0.0'):
+            os.mkdir(os.path.join(self.root, version))
+            with open(os.path.join(self.root, version, 'main.py'), 'w') as f:
+                f.write('\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def path(self, version):
+        return os.path.join(self.root, version, 'main.py')
+
+    def test_constrainedVersion_expectNewestAllowed(self):
+        rule = hotswapping.ConstrainedVersion('>=1.0,<2', exclude=['1.2.0'], check_existence=True)
+        self.assertEqual(self.path('1.1.0'), rule.search(hotswapping.create_descriptor_from_fs(self.path('1.0.0'))))
+        self.assertEqual('', rule.search(hotswapping.create_descriptor_from_fs(self.path('1.1.0'))))
+
+    def test_currentExcluded_expectMovedBack(self):
+        rule = hotswapping.ConstrainedVersion('<2', exclude=['1.2.0'])
+        self.assertEqual(self.path('1.1.0'), rule.search(hotswapping.create_descriptor_from_fs(self.path('1.2.0'))))
+        self.assertEqual(self.path('1.1.0'), rule.search(hotswapping.create_descriptor_from_fs(self.path('2.0.0'))))
+
+    def test_constrainedPackageVersion_expectNewestAllowed(self):
+        dao = packageFoo.PackageFoo()
+        dao.get_all = lambda base_name, **kwargs: ['doom-1.10', 'doom-2.0', 'doom-1.9', 'doom-1.2']
+        rule = hotswapping.ConstrainedPackageVersion(dao, '~=1.2', exclude=['1.10'], scheme=hotswapping.PEP440)
+        m = hotswapping.ModuleDescriptor()
+        m.version_meta = dict(base_name='doom', version='1.2', package='doom-1.2')
+        self.assertEqual('doom-1.9', rule.search(m))
+        m.version_meta = dict(base_name='doom', version='1.9', package='doom-1.9')
+        self.assertIsNone(rule.search(m))
+        self.assertEqual(1, len(rule.indexes))
+
+
+if __name__ == '__main__':
+    unittest.main()